@@ -0,0 +1,7 @@
+"""
+Benchmarks for the backend
+
+Run from the backend directory, e.g.
+
+    python -m benchmarks.bench_mock_query
+"""
@@ -0,0 +1,81 @@
+"""
+Contact export: whole CSV in memory vs the streamed export
+
+For one tenant of synthetic contacts in the mock database, compares what
+export_contacts did before (to_list, build the CSV in a StringIO, wrap it
+in a JSON response) with contact_export.py streaming CSV, NDJSON and gzip
+CSV: time to the first byte, total time and peak Python memory
+(tracemalloc, measured in a second pass).
+
+    python -m benchmarks.bench_contact_export [contacts]    # default: 200000
+"""
+import asyncio
+import csv
+import io
+import sys
+import time
+import tracemalloc
+
+from benchmarks.data import make_contacts
+from mock_db import AsyncMockClient, MockClient
+from serialization import BSONJSONResponse
+import contact_export
+
+QUERY = {"user_id": "user_0"}
+
+
+async def before(collection):
+    contacts = await collection.find(QUERY).to_list(length=None)
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=contact_export.EXPORT_FIELDS)
+    writer.writeheader()
+    for contact in contacts:
+        writer.writerow(contact_export.csv_row(contact))
+    body = BSONJSONResponse({"success": True, "format": "csv", "count": len(contacts), "data": output.getvalue()}).body
+    yield body
+
+
+def streamed(format, compression=None):
+    def run(collection):
+        return contact_export.export_chunks(collection, QUERY, format, compression)
+    return run
+
+
+async def consume(chunks):
+    start = time.perf_counter()
+    first = None
+    size = 0
+    async for chunk in chunks:
+        if first is None:
+            first = time.perf_counter() - start
+        size += len(chunk)
+    return first, time.perf_counter() - start, size
+
+
+async def main(n):
+    client = MockClient(seed=False)
+    contacts = make_contacts(n, tenants=1)
+    for contact in contacts:
+        contact["user_id"] = "user_0"
+    client["bench"]["contacts"].insert_many(contacts)
+    collection = AsyncMockClient(client)["bench"]["contacts"]
+    print(f"📦 {n:,} contacts")
+
+    print(f"  {'':<16} {'first byte':>11} {'total':>10} {'size':>10} {'peak memory':>12}")
+    for label, run in (
+        ("before (JSON)", before),
+        ("csv", streamed("csv")),
+        ("ndjson", streamed("ndjson")),
+        ("csv + gzip", streamed("csv", "gzip")),
+    ):
+        first, total, size = await consume(run(collection))
+        tracemalloc.start()
+        await consume(run(collection))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"  {label:<16} {first * 1000:8.1f} ms {total * 1000:7.0f} ms "
+              f"{size / 2**20:7.1f} MiB {peak / 2**20:9.1f} MiB")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000))
@@ -0,0 +1,97 @@
+"""
+Contact import throughput: per-row round trips vs batched insert_many
+
+Imports synthetic rows (10% of them repeating an existing or earlier
+phone) the way import_contacts used to (find_one + insert_one per row)
+and with contact_import.py, and reports rows per second. Runs on the mock
+database, and also against MongoDB when a URL is given (it uses and drops
+a `bench_import` database):
+
+    python -m benchmarks.bench_contact_import [rows] [mongodb://localhost:27017]
+"""
+import asyncio
+import os
+import sys
+import time
+
+os.environ["MONGODB_DB_NAME"] = "bench_import"
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from benchmarks.data import make_contacts
+from database import Database
+from indexes import ensure_indexes, ensure_indexes_async
+from mock_db import AsyncMockClient, MockClient
+import contact_import
+import search_index
+
+USER = "user_0"
+
+
+def make_rows(n):
+    rows = []
+    for i, contact in enumerate(make_contacts(n, tenants=1)):
+        row = {key: contact[key] for key in ("name", "phone", "email", "tags", "status")}
+        if i % 10 == 9:
+            row["phone"] = rows[i // 2]["phone"]    # duplicate of an earlier row
+        rows.append(row)
+    return rows
+
+
+async def per_row(rows):
+    """import_contacts before: a find_one and an insert_one per row"""
+    collection = Database.get_async_database()["contacts"]
+    now = "2024-01-01T00:00:00"
+    imported = 0
+    for contact_data in rows:
+        doc = contact_import.build_contact(contact_data, USER, now)
+        if await collection.find_one({"phoneE164": doc["phoneE164"], "user_id": USER}):
+            continue
+        await collection.insert_one(doc)
+        await search_index.index_contacts([doc])
+        imported += 1
+    return imported
+
+
+async def batched(rows):
+    return (await contact_import.import_contacts(USER, rows)).imported
+
+
+async def fresh_mock():
+    client = MockClient(seed=False)
+    ensure_indexes(client["bench_import"])
+    Database._swap_clients(client, AsyncMockClient(client))
+
+
+async def fresh_mongo(url):
+    client = AsyncIOMotorClient(url)
+    await client.drop_database("bench_import")
+    await ensure_indexes_async(client["bench_import"])
+    Database._swap_clients(None, client)
+    return client
+
+
+async def main(n, url=None):
+    rows = make_rows(n)
+    print(f"📦 {n:,} rows")
+    backends = [("mock", fresh_mock)]
+    if url:
+        backends.append(("mongodb", lambda: fresh_mongo(url)))
+    for backend, fresh in backends:
+        for label, run in (("per row", per_row), ("batched", batched)):
+            client = await fresh()
+            start = time.perf_counter()
+            imported = await run(rows)
+            elapsed = time.perf_counter() - start
+            print(f"  {backend:<8} {label:<8} {elapsed:8.2f} s  {n / elapsed:10,.0f} rows/s  ({imported:,} imported)")
+            if client is not None:
+                await client.drop_database("bench_import")
+                client.close()
+    Database._swap_clients(None, None)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 50000,
+        sys.argv[2] if len(sys.argv) > 2 else None,
+    ))
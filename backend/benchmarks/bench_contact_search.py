@@ -0,0 +1,71 @@
+"""
+Contact search: unanchored $regex scan vs the search token index
+
+Builds one tenant of synthetic contacts in the mock database, indexes them
+with search_index.py and times type-ahead queries both ways. Against
+MongoDB the token lookups are covered index scans on
+contact_search.user_token_name_id; run `python indexes.py report` to
+check the plans.
+
+    python -m benchmarks.bench_contact_search [contacts]    # default: 50000
+"""
+import asyncio
+import re
+import sys
+import time
+
+from benchmarks.data import make_contacts
+from database import Database
+from indexes import ensure_indexes
+from mock_db import AsyncMockClient, MockClient
+import search_index
+
+REPEAT = 3
+QUERIES = ["s", "sar", "sarah j", "johnson", "garcia5", "555", "555) 012-3", "0123", "michael.chen1"]
+
+
+def regex_filter(query):
+    return {"user_id": "user_0", "$or": [
+        {"name": {"$regex": re.escape(query), "$options": "i"}},
+        {"phone": {"$regex": re.escape(query), "$options": "i"}},
+        {"email": {"$regex": re.escape(query), "$options": "i"}},
+    ]}
+
+
+async def main(n):
+    client = MockClient(seed=False)
+    db = client["bench"]
+    ensure_indexes(db)
+    contacts = make_contacts(n, tenants=1)
+    for contact in contacts:
+        contact["user_id"] = "user_0"
+    start = time.perf_counter()
+    db["contacts"].insert_many(contacts)
+    db[search_index.SEARCH_COLLECTION].insert_many([search_index.search_document(c) for c in contacts])
+    print(f"📦 {n:,} contacts indexed in {time.perf_counter() - start:.1f}s")
+
+    Database._swap_clients(client, AsyncMockClient(client))
+    # Warm up: the mock builds sorted indexes on first use
+    await search_index.search("user_0", "a", limit=50)
+    list(db["contacts"].find({"user_id": "user_0"}).sort("name", 1).limit(1))
+
+    print(f"  {'query':<16} {'regex scan':>12} {'token index':>12}  matches (regex / ranked)")
+    for query in QUERIES:
+        # What /contacts?search= did before: count, then the first page by name
+        regex_ms = float("inf")
+        for _ in range(REPEAT):
+            start = time.perf_counter()
+            total = db["contacts"].count_documents(regex_filter(query))
+            list(db["contacts"].find(regex_filter(query)).sort("name", 1).limit(50))
+            regex_ms = min(regex_ms, (time.perf_counter() - start) * 1000)
+        token_ms = float("inf")
+        for _ in range(REPEAT):
+            start = time.perf_counter()
+            ranked, truncated = await search_index.search("user_0", query)
+            token_ms = min(token_ms, (time.perf_counter() - start) * 1000)
+        print(f"  {query!r:<16} {regex_ms:9.2f} ms {token_ms:9.2f} ms  {total} / {len(ranked)}{'+' if truncated else ''}")
+    Database._swap_clients(None, None)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000))
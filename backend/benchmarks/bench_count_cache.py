@@ -0,0 +1,72 @@
+"""
+/contacts totals: count_documents on every page vs the count cache
+
+Times the `total` of a filtered contact list for one large tenant on the
+mock database: counted every time, served from count_cache.py, and
+recounted after a write invalidates it.
+
+    python -m benchmarks.bench_count_cache [contacts]    # default: 200000
+"""
+import asyncio
+import sys
+import time
+
+from benchmarks.data import make_contacts
+from database import Database
+from indexes import ensure_indexes
+from mock_db import AsyncMockClient, MockClient
+import count_cache
+import repositories
+
+REPEAT = 20
+QUERIES = [
+    {"user_id": "user_0"},
+    {"user_id": "user_0", "status": "Active"},
+    {"user_id": "user_0", "status": "Active", "tags": "VIP"},
+]
+
+
+async def timed(fn):
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = await fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+async def main(n):
+    client = MockClient(seed=False)
+    db = client["bench"]
+    ensure_indexes(db)
+    contacts = make_contacts(n, tenants=1)
+    for contact in contacts:
+        contact["user_id"] = "user_0"
+    db["contacts"].insert_many(contacts)
+    Database._swap_clients(client, AsyncMockClient(client))
+    collection = repositories.contacts.collection
+    print(f"📦 {n:,} contacts in one tenant")
+
+    print(f"  {'filter':<40} {'uncached':>10} {'cached':>10} {'after write':>12}")
+    for query in QUERIES:
+        uncached, total = await timed(lambda: collection.count_documents(query))
+        cached, _ = await timed(lambda: repositories.contacts.count(query))
+
+        async def after_write():
+            count_cache.counts.invalidate("contacts", "user_0")
+            return await repositories.contacts.count(query)
+        invalidated, _ = await timed(after_write)
+        label = ", ".join(f"{k}={v}" for k, v in query.items())
+        print(f"  {label:<40} {uncached:7.2f} ms {cached:7.3f} ms {invalidated:9.2f} ms  ({total:,})")
+
+    async def estimate():
+        count_cache.counts.clear()
+        return await repositories.contacts.count({"user_id": "user_0", "tags": "VIP"}, estimate=True)
+    estimated, (total, approximate) = await timed(estimate)
+    shown = f"{count_cache.COUNT_ESTIMATE_LIMIT:,}+" if total is None else f"{total:,}{'~' if approximate else ''}"
+    print(f"  estimate=true, tags=VIP (uncached)      {estimated:7.2f} ms  ({shown})")
+    Database._swap_clients(None, None)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000))
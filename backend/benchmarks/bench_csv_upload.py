@@ -0,0 +1,74 @@
+"""
+Memory of a contact import body: JSON array vs streamed CSV upload
+
+/contacts/import needs the whole file as one JSON array, parsed into
+memory before the first row is inserted. /contacts/import/upload reads
+the spooled CSV back one chunk at a time (contact_import.read_csv). This
+writes N synthetic contacts both ways to temporary files and reports the
+peak Python memory of turning each into import rows (no database):
+
+    python -m benchmarks.bench_csv_upload [rows]
+"""
+import asyncio
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.data import make_contacts
+import contact_import
+
+FIELDS = ("name", "phone", "email", "tags", "status")
+
+
+def write_files(n, directory):
+    csv_path = os.path.join(directory, "contacts.csv")
+    json_path = os.path.join(directory, "contacts.json")
+    with open(csv_path, "w", newline="") as csv_file, open(json_path, "w") as json_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(FIELDS)
+        json_file.write('{"contacts": [')
+        for i, contact in enumerate(make_contacts(n, tenants=1)):
+            row = {key: contact[key] for key in FIELDS}
+            writer.writerow([",".join(row["tags"]) if key == "tags" else row[key] for key in FIELDS])
+            json_file.write(("," if i else "") + json.dumps(row))
+        json_file.write("]}")
+    return csv_path, json_path
+
+
+async def json_body(path):
+    with open(path, "rb") as f:
+        rows = json.loads(f.read())["contacts"]
+    return sum(1 for _ in rows)
+
+
+async def csv_upload(path):
+    with open(path, "rb") as f:
+        return sum([1 async for _ in contact_import.read_csv(f)])
+
+
+async def measure(label, run, path):
+    tracemalloc.start()
+    start = time.perf_counter()
+    rows = await run(path)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    size = os.path.getsize(path)
+    print(f"  {label:<12} {size / 2**20:7.1f} MiB file  {rows:>9,} rows  "
+          f"peak {peak / 2**20:8.1f} MiB  {elapsed:6.2f} s")
+
+
+async def main(n):
+    print(f"📦 {n:,} contacts")
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path, json_path = write_files(n, directory)
+        await measure("json array", json_body, json_path)
+        await measure("csv upload", csv_upload, csv_path)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500000))
@@ -0,0 +1,83 @@
+"""
+Interactive latency while a background export job runs
+
+Loads one tenant of synthetic contacts into the mock database and times a
+stream of /contacts-style page reads (repositories.contacts.list) on the
+same event loop, alone and next to a running export job. Latency is
+measured from when each read was due, so time spent waiting for the
+export to give up the event loop counts.
+
+Mock reads never wait on I/O, so ExportWorker's is_busy pause (which lets
+requests waiting on MongoDB finish first) does not come into play here;
+this shows the cost of the export's own event loop time.
+
+    python -m benchmarks.bench_export_jobs [contacts]    # default: 200000
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("EXPORT_DIR", tempfile.mkdtemp())
+
+from benchmarks.data import make_contacts
+from database import Database
+from indexes import ensure_indexes
+from mock_db import AsyncMockClient, MockClient
+import export_jobs
+import repositories
+
+READS = 300
+
+
+async def interactive():
+    """Page reads 5 ms apart; returns per-read latencies in ms"""
+    latencies = []
+    for i in range(READS):
+        due = time.perf_counter() + 0.005
+        await asyncio.sleep(0.005)
+        await repositories.contacts.list(
+            {"user_id": "user_0", "status": "Active"}, sort=[("name", 1)], skip=(i % 20) * 50, limit=50
+        )
+        latencies.append((time.perf_counter() - due) * 1000)
+    return latencies
+
+
+async def run(label, worker):
+    job = None
+    if worker is not None:
+        worker.start()
+        job = await worker.submit("user_0", "csv", "gzip")
+        await asyncio.sleep(0.05)
+    latencies = sorted(await interactive())
+    progress = ""
+    if job is not None:
+        doc = await export_jobs._collection().find_one({"id": job["id"]})
+        progress = f"  export {doc['status']}, {doc['processed']:,} rows"
+        await worker.stop()
+    p95 = latencies[int(len(latencies) * 0.95)]
+    print(f"  {label:<16} p50 {statistics.median(latencies):6.2f} ms  p95 {p95:6.2f} ms  "
+          f"max {latencies[-1]:7.2f} ms{progress}")
+
+
+async def main(n):
+    client = MockClient(seed=False)
+    db = client["bench"]
+    ensure_indexes(db)
+    contacts = make_contacts(n, tenants=1)
+    for contact in contacts:
+        contact["user_id"] = "user_0"
+    db["contacts"].insert_many(contacts)
+    Database._swap_clients(client, AsyncMockClient(client))
+    await repositories.contacts.list({"user_id": "user_0"}, sort=[("name", 1)], limit=1)
+    print(f"📦 {n:,} contacts, {READS} page reads")
+
+    await run("no export", None)
+    await run("export running", export_jobs.ExportWorker())
+    Database._swap_clients(None, None)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000))
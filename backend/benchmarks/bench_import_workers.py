@@ -0,0 +1,110 @@
+"""
+CSV import parsing throughput by worker count
+
+Writes N synthetic contacts to a temporary CSV file and parses and
+validates it the way /contacts/import/upload does, without writing to a
+database: serially (contact_import.read_csv + prepare_rows) and in
+import_pool ranges on 2, 4, ... worker processes. Then imports the file
+into the mock database with import_pool.import_csv to show the stages it
+reports. The speedup is bounded by the cores available (os.cpu_count()):
+
+    python -m benchmarks.bench_import_workers [rows] [workers,...]
+"""
+import asyncio
+import csv
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.data import make_contacts
+from database import Database
+from indexes import ensure_indexes
+from mock_db import AsyncMockClient, MockClient
+import contact_import
+import import_pool
+
+USER = "user_0"
+NOW = "2024-01-01T00:00:00"
+FIELDS = ("name", "phone", "email", "tags", "status")
+
+
+def write_csv(n, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        for contact in make_contacts(n, tenants=1):
+            writer.writerow([",".join(contact["tags"]) if key == "tags" else contact[key] for key in FIELDS])
+
+
+async def serial(path):
+    rows = 0
+    with open(path, "rb") as f:
+        chunk = []
+        async for row in contact_import.read_csv(f):
+            chunk.append(row)
+            if len(chunk) == contact_import.IMPORT_CHUNK_SIZE:
+                contact_import.prepare_rows(chunk, rows, USER, NOW)
+                rows += len(chunk)
+                chunk = []
+        contact_import.prepare_rows(chunk, rows, USER, NOW)
+        return rows + len(chunk)
+
+
+async def parallel(path, pool, workers):
+    loop = asyncio.get_running_loop()
+    rows = 0
+    with open(path, "rb") as f:
+        columns = import_pool.read_header(f)
+        pending = []
+        while True:
+            _, data = import_pool.read_range(f)
+            if not data:
+                break
+            pending.append(loop.run_in_executor(pool, import_pool.parse_range, data, columns, USER, NOW))
+        for future in pending:
+            rows += (await future)[2]
+    return rows
+
+
+async def main(n, worker_counts):
+    print(f"📦 {n:,} contacts, {os.cpu_count()} CPUs")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "contacts.csv")
+        write_csv(n, path)
+        print(f"  {os.path.getsize(path) / 2**20:.1f} MiB, ranges of {import_pool.IMPORT_RANGE_BYTES / 2**20:.0f} MiB")
+
+        baseline = None
+        for workers in worker_counts:
+            if workers <= 1:
+                start = time.perf_counter()
+                rows = await serial(path)
+            else:
+                pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+                # Start the workers before timing
+                list(pool.map(abs, range(workers)))
+                start = time.perf_counter()
+                rows = await parallel(path, pool, workers)
+                pool.shutdown()
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"  parse  {workers:>2} workers {elapsed:8.2f} s  {rows / elapsed:10,.0f} rows/s  "
+                  f"x{baseline / elapsed:.2f}")
+
+        client = MockClient(seed=False)
+        ensure_indexes(client["bench_import"])
+        Database._swap_clients(client, AsyncMockClient(client))
+        with open(path, "rb") as f:
+            result = await import_pool.import_csv(USER, f, workers=max(worker_counts))
+        import_pool.shutdown()
+        Database._swap_clients(None, None)
+        print(f"  import stages: {result.stages or 'serial (file smaller than two ranges or one worker)'}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 300000,
+        [int(w) for w in sys.argv[2].split(",")] if len(sys.argv) > 2 else [1, 2, 4],
+    ))
@@ -0,0 +1,75 @@
+"""
+Bulk write paths of MockCollection at realistic sizes
+
+Mirrors the bulk contact operations in main.py (tag / status / delete over a
+selection of ids), webhook tagging and seeding via insert_many, plus the
+equivalent loop of single-document calls for comparison.
+
+    python -m benchmarks.bench_mock_bulk [sizes]    # default: 100000,1000000
+"""
+import sys
+import time
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from benchmarks.data import make_contacts
+from indexes import INDEX_SPECS
+from mock_db import MockCollection
+
+
+def timed(label, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"  {label:<50} {(time.perf_counter() - start) * 1000:10.1f} ms")
+    return result
+
+
+def build(size):
+    collection = MockCollection("contacts", make_contacts(size))
+    for spec in INDEX_SPECS["contacts"]:
+        collection.create_index(spec["keys"], **{k: v for k, v in spec.items() if k != "keys"})
+    return collection
+
+
+def run(size):
+    print(f"\n📦 {size:,} contacts")
+    collection = build(size)
+    tenant = "user_3"
+    # /contacts/bulk sends a selection of ids for one tenant
+    ids = [str(i) for i in range(4, size, 10)][:1000]
+    selection = {"id": {"$in": ids}, "user_id": tenant}
+
+    timed("bulk tag 1,000 ($addToSet $each)", lambda: collection.update_many(
+        selection, {"$addToSet": {"tags": {"$each": ["Hot", "VIP"]}}}))
+    timed("same, update_one per id", lambda: [
+        collection.update_one({"id": i, "user_id": tenant}, {"$addToSet": {"tags": {"$each": ["Warm"]}}})
+        for i in ids
+    ])
+    result = timed(f"status for whole tenant ($set, {size // 10:,} docs)", lambda: collection.update_many(
+        {"user_id": tenant}, {"$set": {"status": "Inactive"}}))
+    assert result.modified_count > 0
+    timed("usage counters ($inc, bulk_write 1,000 UpdateOne)", lambda: collection.bulk_write(
+        [UpdateOne({"id": i, "user_id": tenant}, {"$inc": {"usageCount": 1}}) for i in ids]))
+    timed("bulk delete 1,000 (delete_many)", lambda: collection.delete_many(selection))
+
+    # Re-import: 10,000 rows, 10% of them duplicates of existing contacts
+    rows = make_contacts(10000, seed=7)
+    for i, row in enumerate(rows):
+        row["id"] = f"import-{i}"
+        row["phone"] = f"import-{i}" if i % 10 else collection.find_one({"id": str(i + 1)})["phone"]
+        row["user_id"] = f"user_{i % 10}"
+
+    def import_rows():
+        try:
+            collection.insert_many(rows, ordered=False)
+        except BulkWriteError as e:
+            return e.details
+    details = timed("insert_many 10,000 (ordered=False, 10% dups)", import_rows)
+    print(f"  {'':<50} {details['nInserted']:,} inserted, {len(details['writeErrors']):,} duplicates")
+
+
+if __name__ == "__main__":
+    sizes = [int(s) for s in (sys.argv[1] if len(sys.argv) > 1 else "100000,1000000").split(",")]
+    for size in sizes:
+        run(size)
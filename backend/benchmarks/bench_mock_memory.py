@@ -0,0 +1,67 @@
+"""
+Memory held by a MockCollection with the dict vs columnar storage engines
+
+Documents follow the seed_data.py schemas (benchmarks/data.py). Memory is
+what tracemalloc still sees allocated once the collection is built and the
+generated input documents are gone, with and without the declared indexes.
+A couple of queries are timed as well, since columnar reads go through a
+row proxy.
+
+    python -m benchmarks.bench_mock_memory [sizes]    # default: 100000,1000000
+"""
+import gc
+import sys
+import time
+import tracemalloc
+
+from benchmarks.data import make_contacts, make_messages
+from indexes import INDEX_SPECS
+from mock_db import MockCollection
+
+
+def build(name, make, size, storage, with_indexes):
+    gc.collect()
+    tracemalloc.start()
+    docs = make(size)
+    collection = MockCollection(name, docs, storage=storage)
+    del docs
+    if with_indexes:
+        for spec in INDEX_SPECS[name]:
+            collection.create_index(spec["keys"], **{k: v for k, v in spec.items() if k != "keys"})
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return collection, current, peak
+
+
+def timed(fn, repeat=3):
+    fn()  # warm up: sorted indexes are built on first use
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def run(size):
+    cases = [
+        ("messages", make_messages, lambda c: list(c.find({"phoneNumber": "+1 (555) 000-0007"}).sort("timestamp", 1))),
+        ("contacts", make_contacts, lambda c: list(c.find({"user_id": "user_3", "status": "Active"}).limit(50))),
+    ]
+    for name, make, query in cases:
+        print(f"\n📦 {size:,} {name}")
+        for with_indexes in (False, True):
+            for storage in ("dict", "columnar"):
+                collection, current, peak = build(name, make, size, storage, with_indexes)
+                label = f"{storage}{' + indexes' if with_indexes else ''}"
+                line = f"  {label:<20} {current / size:8.0f} B/doc  {current / 1e6:8.1f} MB  (peak {peak / 1e6:.1f} MB)"
+                if with_indexes:
+                    line += f"  query {timed(lambda: query(collection)):8.2f} ms"
+                print(line)
+                del collection
+                gc.collect()
+
+
+if __name__ == "__main__":
+    sizes = [int(s) for s in (sys.argv[1] if len(sys.argv) > 1 else "100000,1000000").split(",")]
+    for size in sizes:
+        run(size)
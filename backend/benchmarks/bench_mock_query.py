@@ -0,0 +1,95 @@
+"""
+Per-query cost of MockCollection.find on large contact collections
+
+Compares the compiled query path against the previous per-document
+interpretation (uncompiled re.search per document per $or branch), and
+paginated sorts against a full sort.
+
+    python -m benchmarks.bench_mock_query [sizes]    # default: 100000,1000000
+"""
+import re
+import sys
+import time
+
+from benchmarks.data import make_contacts
+from indexes import INDEX_SPECS
+from mock_db import MockCollection
+
+
+def legacy_find(docs, query):
+    """The original MockCollection.find loop, kept for comparison"""
+    filtered = []
+    for item in docs:
+        match = True
+        for k, v in query.items():
+            if k == "$or":
+                or_match = False
+                for cond in v:
+                    for sub_k, sub_v in cond.items():
+                        if "$regex" in sub_v:
+                            if re.search(sub_v["$regex"], item.get(sub_k) or "", re.IGNORECASE):
+                                or_match = True
+                                break
+                if not or_match:
+                    match = False
+            elif isinstance(v, dict) and "$regex" in v:
+                if not re.search(v["$regex"], item.get(k) or "", re.IGNORECASE):
+                    match = False
+            elif item.get(k) != v:
+                match = False
+        if match:
+            filtered.append(item)
+    return filtered
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def search_query(term, tenant):
+    return {
+        "user_id": tenant,
+        "$or": [
+            {"name": {"$regex": term, "$options": "i"}},
+            {"phone": {"$regex": term, "$options": "i"}},
+            {"email": {"$regex": term, "$options": "i"}},
+        ],
+    }
+
+
+def run(size):
+    print(f"\n📦 {size:,} contacts")
+    docs = make_contacts(size)
+    collection = MockCollection("contacts", docs)
+    for spec in INDEX_SPECS["contacts"]:
+        collection.create_index(spec["keys"], **{k: v for k, v in spec.items() if k != "keys"})
+
+    tenant = "user_3"
+    cases = [
+        ("point lookup {id, user_id}", lambda: collection.find_one({"id": str(size // 2), "user_id": f"user_{(size // 2 - 1) % 10}"}), 1000),
+        ("tenant + status", lambda: list(collection.find({"user_id": tenant, "status": "Active"})), 5),
+        ("tenant + tag membership", lambda: list(collection.find({"user_id": tenant, "tags": "VIP"})), 5),
+        ("tenant + $in ids", lambda: list(collection.find({"user_id": tenant, "id": {"$in": [str(i) for i in range(4, 400, 10)]}})), 100),
+        ("search $or/$regex (compiled)", lambda: list(collection.find(search_query("garcia", tenant))), 3),
+        # /contacts page 1 of 50: heap top-k on an unindexed sort field
+        ("tenant page 1, sort createdAt desc", lambda: list(collection.find({"user_id": tenant}).sort("createdAt", -1).limit(50)), 5),
+        ("tenant page 1, full sort baseline", lambda: sorted(collection.find({"user_id": tenant}), key=lambda d: d["createdAt"], reverse=True)[:50], 5),
+        # Indexed sort field: walks the sorted index and stops after 50 hits
+        ("all contacts page 3, sort name", lambda: list(collection.find({}).sort("name", 1).skip(100).limit(50)), 5),
+    ]
+    for name, fn, repeat in cases:
+        ms, result = timed(fn, repeat)
+        count = len(result) if isinstance(result, list) else int(result is not None)
+        print(f"  {name:<34} {ms:10.3f} ms/query  ({count:,} matches)")
+
+    ms, result = timed(lambda: legacy_find(docs, search_query("garcia", tenant)), 1)
+    print(f"  {'search $or/$regex (legacy)':<34} {ms:10.3f} ms/query  ({len(result):,} matches)")
+
+
+if __name__ == "__main__":
+    sizes = [int(s) for s in (sys.argv[1] if len(sys.argv) > 1 else "100000,1000000").split(",")]
+    for size in sizes:
+        run(size)
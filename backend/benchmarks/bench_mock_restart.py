@@ -0,0 +1,69 @@
+"""
+Restart cost of the persistent mock database (MOCK_DB_PATH)
+
+Builds a snapshot holding N messages, then measures a cold restart
+(MockClient() + ensure_indexes), the first query against the messages
+collection (which decodes it from the mapped snapshot), and journal
+append/replay cost.
+
+    python -m benchmarks.bench_mock_restart [messages]    # default: 1000000
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.data import make_messages, phone_for
+
+
+def timed(label, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"  {label:<42} {(time.perf_counter() - start) * 1000:10.1f} ms")
+    return result
+
+
+def run(size):
+    path = tempfile.mkdtemp(prefix="mockdb-")
+    os.environ["MOCK_DB_PATH"] = path
+    # Imported after MOCK_DB_PATH is set
+    from indexes import ensure_indexes
+    from mock_db import MockClient
+
+    phone = phone_for(0)
+    try:
+        print(f"\n📦 {size:,} messages in {path}")
+        client = MockClient()
+        messages = client["whatsapp_business"]["messages"]
+        messages.insert_many(make_messages(size))
+        timed("snapshot on close", client.close)
+        print(f"  {'snapshot size':<42} {os.path.getsize(os.path.join(path, 'snapshot.bin')) / 1e6:10.1f} MB")
+
+        client = timed("restart (MockClient + ensure_indexes)", lambda: _restart(MockClient, ensure_indexes))
+        db = client["whatsapp_business"]
+        timed("first contacts query", lambda: db["contacts"].find_one({"id": "1"}))
+        timed("first messages query (decode + index)", lambda: db["messages"].find_one({"phoneNumber": phone}))
+        timed("10,000 journaled inserts", lambda: [
+            db["messages"].insert_one({"id": f"new-{i}", "phoneNumber": phone, "text": "hi"})
+            for i in range(10000)
+        ])
+        client.db._persistence.close()  # simulate a crash: no snapshot on the way out
+
+        client = timed("restart with 10,000 journal records", lambda: _restart(MockClient, ensure_indexes))
+        db = client["whatsapp_business"]
+        timed("first messages query (decode + replay)", lambda: db["messages"].find_one({"phoneNumber": phone}))
+        assert db["messages"].count_documents({"phoneNumber": phone}) == size // 1000 + 10000
+        client.close()
+    finally:
+        shutil.rmtree(path)
+
+
+def _restart(client_cls, ensure_indexes):
+    client = client_cls()
+    ensure_indexes(client["whatsapp_business"])
+    return client
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
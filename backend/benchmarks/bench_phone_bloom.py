@@ -0,0 +1,127 @@
+"""
+Phone lookups saved by the Bloom filters
+
+Loads N synthetic contacts (10 tenants) into the mock database, builds
+bloom.phone_filters from them, then runs two workloads with the filters
+off and on:
+
+- an import of N/2 rows for one tenant, 90% of them new phones
+  (contact_import.import_contacts, one pre-check query per chunk);
+- N/5 inbound webhook lookups across tenants, 80% of them known phones
+  (find_by_phone unless the filters rule the phone out).
+
+Reports phones looked up, lookups saved, time, and the observed false
+positive rate on absent phones against the configured BLOOM_ERROR_RATE:
+
+    python -m benchmarks.bench_phone_bloom [contacts]
+"""
+import asyncio
+import gc
+import os
+import random
+import sys
+import time
+
+os.environ["MONGODB_DB_NAME"] = "bench_bloom"
+
+from benchmarks.data import make_contacts
+from bloom import BLOOM_ERROR_RATE, PhoneFilters
+from database import Database
+from indexes import ensure_indexes
+from mock_db import AsyncMockClient, MockClient
+from phone_utils import normalize_phone
+import bloom
+import contact_import
+import repositories
+
+USER = "user_0"
+
+
+def new_phone(i):
+    return f"+44 20 {i:08d}"
+
+
+def load(n):
+    client = MockClient(seed=False)
+    db = client["bench_bloom"]
+    ensure_indexes(db)
+    contacts = make_contacts(n, tenants=10)
+    for contact in contacts:
+        contact["phoneE164"] = normalize_phone(contact["phone"])
+    db["contacts"].insert_many(contacts)
+    Database._swap_clients(client, AsyncMockClient(client))
+    return contacts
+
+
+def use_filters(enabled):
+    filters = PhoneFilters(enabled=enabled)
+    # The modules hold their own reference to the singleton
+    bloom.phone_filters = contact_import.phone_filters = filters
+    return filters
+
+
+async def import_workload(contacts, n):
+    own = [c for c in contacts if c["user_id"] == USER]
+    rows = []
+    for i in range(n):
+        if i % 10 == 9:
+            contact = own[i % len(own)]
+            rows.append({"name": contact["name"], "phone": contact["phone"]})
+        else:
+            rows.append({"name": f"Lead {i}", "phone": new_phone(i)})
+    start = time.perf_counter()
+    result = await contact_import.import_contacts(USER, rows)
+    return time.perf_counter() - start, result
+
+
+async def webhook_workload(filters, contacts, n):
+    rng = random.Random(7)
+    phones = [rng.choice(contacts)["phone"] if rng.random() < 0.8 else new_phone(10**7 + i) for i in range(n)]
+    looked_up = 0
+    start = time.perf_counter()
+    for phone in phones:
+        key = normalize_phone(phone)
+        if filters.might_exist(None, key):
+            looked_up += 1
+            if not await repositories.contacts.find_by_phone(phone) and filters.answers(key):
+                filters.false_positive()
+    return time.perf_counter() - start, looked_up
+
+
+async def main(n):
+    print(f"📦 {n:,} contacts")
+    for enabled in (False, True):
+        contacts = load(n)
+        filters = use_filters(enabled)
+        label = "bloom" if enabled else "no filter"
+        if enabled:
+            await filters.rebuild()
+            stats = filters.stats()
+            print(f"  build     {filters.last_rebuild_seconds:.2f} s, {stats['memoryBytes'] / 1024:,.0f} KiB "
+                  f"for {stats['keys']:,} phones")
+
+        elapsed, result = await import_workload(contacts, n // 2)
+        checks = filters.checks
+        looked_up = n // 2 - filters.definitely_new if enabled else n // 2
+        print(f"  import    {label:<10} {elapsed:7.2f} s  {looked_up:>8,} phones looked up  "
+              f"({result.imported:,} imported, {result.skipped:,} skipped)")
+
+        saved_before = filters.definitely_new
+        elapsed, looked_up = await webhook_workload(filters, contacts, n // 5)
+        print(f"  webhook   {label:<10} {elapsed:7.2f} s  {looked_up:>8,} of {n // 5:,} phones looked up")
+        if enabled:
+            stats = filters.stats()
+            print(f"  lookups saved {stats['lookupsSaved']:,} of {stats['checks']:,} checks "
+                  f"(import {saved_before:,} of {checks:,})")
+            rate = sum(new_phone(2 * 10**7 + i) in filters._filters[None] for i in range(100000)) / 100000
+            print(f"  false positives on 100,000 absent phones: {rate:.4%} "
+                  f"(observed in the workloads {stats['observedFalsePositiveRate']:.4%}, "
+                  f"configured {BLOOM_ERROR_RATE:.2%})")
+        # Start the next run from a clean heap
+        Database._swap_clients(None, None)
+        del contacts, result
+        gc.collect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000))
@@ -0,0 +1,92 @@
+"""
+Response serialization cost for large document lists
+
+Compares, for 10k contacts and 10k messages as read from MongoDB (with
+ObjectId _ids):
+
+- before: the recursive mongo_to_dict copy, jsonable_encoder (what FastAPI
+  does to every returned value) and the stdlib JSONResponse;
+- after: main.mongo_to_dict (drops _id, copying only what held one) and BSONJSONResponse (orjson
+  with a BSON default hook), as served through BSONJSONRoute;
+- projected: documents fetched without _id (repositories.py) straight into
+  BSONJSONResponse.
+
+    python -m benchmarks.bench_serialization [documents]    # default: 10000
+"""
+import sys
+import time
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from benchmarks.data import make_contacts, make_messages
+from serialization import BSONJSONResponse
+
+
+def legacy_mongo_to_dict(doc):
+    """mongo_to_dict as it was: rebuilds every document and list"""
+    if doc is None:
+        return None
+    if isinstance(doc, list):
+        return [legacy_mongo_to_dict(item) for item in doc]
+    if isinstance(doc, dict):
+        result = {}
+        for key, value in doc.items():
+            if key == "_id":
+                continue
+            elif isinstance(value, ObjectId):
+                result[key] = str(value)
+            elif isinstance(value, dict):
+                result[key] = legacy_mongo_to_dict(value)
+            elif isinstance(value, list):
+                result[key] = [legacy_mongo_to_dict(item) if isinstance(item, dict) else str(item) if isinstance(item, ObjectId) else item for item in value]
+            else:
+                result[key] = value
+        return result
+    return doc
+
+
+def strip_id(doc):
+    # Same as main.mongo_to_dict (importing main would start the app module)
+    if isinstance(doc, list):
+        items = [strip_id(item) for item in doc]
+        return items if any(new is not old for new, old in zip(items, doc)) else doc
+    if isinstance(doc, dict):
+        result = {key: strip_id(value) for key, value in doc.items() if key != "_id"}
+        if "_id" in doc or any(value is not doc[key] for key, value in result.items()):
+            return result
+    return doc
+
+
+def before(docs):
+    return JSONResponse(jsonable_encoder({"items": [legacy_mongo_to_dict(d) for d in docs]})).body
+
+
+def after(docs):
+    return BSONJSONResponse({"items": [strip_id(d) for d in docs]}).body
+
+
+def projected(docs):
+    return BSONJSONResponse({"items": docs}).body
+
+
+def timed(fn, docs, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn(docs)
+        best = min(best, time.perf_counter() - start)
+    return best, len(body)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    for name, docs in (("contacts", make_contacts(n)), ("messages", make_messages(n))):
+        fetched = [{"_id": ObjectId(), **doc} for doc in docs]
+        print(f"📦 {n:,} {name}")
+        base = None
+        for label, fn, data in (("before", before, fetched), ("after", after, fetched), ("projected", projected, docs)):
+            elapsed, size = timed(fn, data)
+            base = base or elapsed
+            print(f"  {label:<10} {elapsed * 1000:8.1f} ms  {size / 1024:8.0f} KiB  {base / elapsed:5.1f}x")
@@ -0,0 +1,54 @@
+"""
+Cold start cost of the API: import, lifespan startup and first requests
+
+Each measurement runs in a fresh interpreter. Without MONGODB_URL the
+backend points at an unreachable server, so startup includes server
+selection timing out and the fallback to the mock database.
+
+    python -m benchmarks.bench_startup [runs]    # default: 3
+"""
+import json
+import os
+import subprocess
+import sys
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    started = time.perf_counter()
+    client.get("/contacts")
+    first = time.perf_counter()
+    client.get("/contacts")
+    second = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "startup_ms": (started - imported) * 1000,
+    "first_request_ms": (first - started) * 1000,
+    "second_request_ms": (second - first) * 1000,
+}))
+"""
+
+
+def measure(env):
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE], env=env, capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    env = dict(os.environ, DEBUG="True")
+    env.setdefault("MONGODB_URL", "mongodb://127.0.0.1:1")
+    print(f"🚀 {runs} cold starts against {env['MONGODB_URL']}")
+    samples = [measure(env) for _ in range(runs)]
+    for key in samples[0]:
+        values = sorted(sample[key] for sample in samples)
+        print(f"  {key:<20} median {values[len(values) // 2]:8.1f} ms   min {values[0]:8.1f} ms")
@@ -0,0 +1,60 @@
+"""
+Synthetic documents shaped like the seed_data.py schemas
+"""
+import random
+from datetime import datetime, timedelta
+
+FIRST_NAMES = ["Sarah", "Michael", "Emily", "James", "Maria", "David", "Lisa", "Robert", "Jennifer", "William"]
+LAST_NAMES = ["Johnson", "Chen", "Davis", "Wilson", "Garcia", "Brown", "Anderson", "Taylor", "Martinez", "Thomas"]
+TAGS = ["VIP", "Customer", "Lead", "Prospect", "Support", "Enterprise", "Loyal", "New"]
+STATUSES = ["Active", "Active", "Active", "Inactive", "Blocked"]
+MESSAGE_TEXTS = [
+    "Hi! I'm interested in your products.",
+    "Hello! Thank you for reaching out. How can I help you today?",
+    "I'd like to know more about the pricing plans.",
+    "Thanks for the quick response!",
+    "Can we schedule a demo?",
+]
+
+
+def phone_for(i):
+    return f"+1 (555) {i // 10000 % 1000:03d}-{i % 10000:04d}"
+
+
+def make_contacts(n, tenants=10, seed=42):
+    rng = random.Random(seed)
+    now = datetime.now()
+    contacts = []
+    for i in range(n):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        contacts.append({
+            "id": str(i + 1),
+            "user_id": f"user_{i % tenants}",
+            "name": f"{first} {last}",
+            "phone": phone_for(i),
+            "email": f"{first.lower()}.{last.lower()}{i}@email.com",
+            "tags": rng.sample(TAGS, 2),
+            "status": rng.choice(STATUSES),
+            "lastMessage": rng.choice(MESSAGE_TEXTS),
+            "lastMessageTime": (now - timedelta(minutes=rng.randint(0, 100000))).isoformat(),
+            "avatar": f"{first[0]}{last[0]}",
+            "createdAt": (now - timedelta(days=rng.randint(0, 365))).isoformat(),
+        })
+    return contacts
+
+
+def make_messages(n, phones=1000, tenants=10, seed=42):
+    rng = random.Random(seed)
+    now = datetime.now()
+    return [
+        {
+            "id": str(i + 1),
+            "phoneNumber": phone_for(i % phones),
+            "text": rng.choice(MESSAGE_TEXTS),
+            "timestamp": (now - timedelta(seconds=n - i)).isoformat(),
+            "sent": i % 2 == 1,
+            "status": "read",
+            "user_id": f"user_{i % phones % tenants}",
+        }
+        for i in range(n)
+    ]
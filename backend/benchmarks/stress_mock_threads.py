@@ -0,0 +1,138 @@
+"""
+Thread-safety stress test for MockCollection
+
+Many threads insert (letting the collection allocate ids), read pages,
+$inc counters and delete at the same time, then the collection is checked
+for consistency: unique ids, counts that add up, counters equal to the
+number of acknowledged increments, and indexes that agree with a full scan.
+Finally, read-only throughput is measured at increasing thread counts.
+
+    python -m benchmarks.stress_mock_threads [threads] [ops per thread]    # default: 8 2000
+"""
+import random
+import sys
+import threading
+import time
+
+from benchmarks.data import make_contacts
+from indexes import INDEX_SPECS
+from mock_db import MockCollection
+
+
+def build(size):
+    collection = MockCollection("contacts", make_contacts(size))
+    for spec in INDEX_SPECS["contacts"]:
+        collection.create_index(spec["keys"], **{k: v for k, v in spec.items() if k != "keys"})
+    return collection
+
+
+def worker(collection, n, seed, stats, errors):
+    rng = random.Random(seed)
+    try:
+        for i in range(n):
+            op = rng.random()
+            tenant = f"user_{rng.randrange(10)}"
+            if op < 0.3:
+                result = collection.insert_one({"user_id": tenant, "phone": f"t{seed}-{i}", "name": "Stress", "hits": 0})
+                stats["inserted"].append(result.inserted_id)
+            elif op < 0.6:
+                page = list(collection.find({"user_id": tenant}).sort("name", 1).skip(rng.randrange(50)).limit(20))
+                if any(doc["user_id"] != tenant for doc in page):
+                    errors.append("page returned another tenant's contact")
+            elif op < 0.85:
+                target = str(rng.randrange(1, 2000))
+                result = collection.update_one({"id": target}, {"$inc": {"hits": 1}})
+                stats["increments"][target] = stats["increments"].get(target, 0) + result.modified_count
+            else:
+                target = str(rng.randrange(1, 2000))
+                stats["deleted"] += collection.delete_one({"id": target, "hits": {"$exists": False}}).deleted_count
+    except Exception as e:  # surfaced in the report
+        errors.append(repr(e))
+
+
+def check(collection, initial, per_thread_stats, errors):
+    docs = list(collection.find({}))
+    ids = [doc["id"] for doc in docs]
+    inserted = [i for stats in per_thread_stats for i in stats["inserted"]]
+    deleted = sum(stats["deleted"] for stats in per_thread_stats)
+
+    if len(set(inserted)) != len(inserted):
+        errors.append(f"{len(inserted) - len(set(inserted))} duplicate ids allocated")
+    if len(set(ids)) != len(ids):
+        errors.append("duplicate ids stored")
+    if len(docs) != initial + len(inserted) - deleted:
+        errors.append(f"count {len(docs)} != {initial} + {len(inserted)} - {deleted}")
+
+    increments = {}
+    for stats in per_thread_stats:
+        for target, n in stats["increments"].items():
+            increments[target] = increments.get(target, 0) + n
+    by_id = {doc["id"]: doc for doc in docs}
+    for target, n in increments.items():
+        if n and by_id.get(target, {}).get("hits") != n:
+            errors.append(f"id {target}: hits {by_id.get(target, {}).get('hits')} != {n} increments")
+
+    for tenant in (f"user_{i}" for i in range(10)):
+        scanned = sum(1 for doc in docs if doc["user_id"] == tenant)
+        if collection.count_documents({"user_id": tenant}) != scanned:
+            errors.append(f"index count for {tenant} disagrees with scan")
+
+
+def stress(threads, ops):
+    initial = 20000
+    collection = build(initial)
+    per_thread_stats = [{"inserted": [], "increments": {}, "deleted": 0} for _ in range(threads)]
+    errors = []
+    pool = [
+        threading.Thread(target=worker, args=(collection, ops, seed, per_thread_stats[seed], errors))
+        for seed in range(threads)
+    ]
+    # Switch threads far more often than the default 5 ms to shake out races
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    sys.setswitchinterval(switch_interval)
+    check(collection, initial, per_thread_stats, errors)
+
+    print(f"🧵 {threads} threads x {ops:,} mixed ops in {elapsed:.2f}s ({threads * ops / elapsed:,.0f} ops/s)")
+    if errors:
+        print(f"❌ {len(errors)} consistency errors")
+        for error in errors[:20]:
+            print(f"   {error}")
+        return False
+    print("✅ ids unique, counts and counters consistent, indexes match scan")
+    return True
+
+
+def read_scaling(ops):
+    collection = build(100000)
+
+    def reader(seed):
+        rng = random.Random(seed)
+        for _ in range(ops):
+            collection.find_one({"id": str(rng.randrange(1, 100000)), "user_id": f"user_{rng.randrange(10)}"})
+            list(collection.find({"user_id": f"user_{rng.randrange(10)}"}).limit(20))
+
+    print("\n📈 read-only throughput (find_one + 20-doc page)")
+    for threads in (1, 2, 4, 8):
+        pool = [threading.Thread(target=reader, args=(seed,)) for seed in range(threads)]
+        start = time.perf_counter()
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        elapsed = time.perf_counter() - start
+        print(f"  {threads} threads: {threads * ops / elapsed:10,.0f} ops/s")
+
+
+if __name__ == "__main__":
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    ops = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    ok = stress(threads, ops)
+    read_scaling(ops)
+    sys.exit(0 if ok else 1)
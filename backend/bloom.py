@@ -0,0 +1,330 @@
+"""
+Bloom filters of contact phones
+
+Imports and the inbound webhook look every phone up before inserting,
+although most imported phones are new and a lookup that finds nothing
+costs as much as one that does. phone_filters keeps a Bloom filter of
+the E.164 keys (phone_utils.py) of each tenant's contacts, plus one for
+all tenants (the webhook doesn't know the tenant). A phone the filter
+has not seen is certainly not a contact, so the lookup is skipped; a
+phone it has seen is looked up as before and, when it is not there
+after all, counted as a false positive.
+
+The filters are built at startup from the contacts collection, and
+rebuilt whenever the database handlers switch backend (failover). Until
+a build completes every phone "might exist", so nothing is skipped.
+Contacts created through the API are added as they are inserted.
+Deleted contacts stay in the filters, which only costs a lookup.
+
+The filters live in one process and only see that process's writes, so
+a phone inserted by another app worker would be skipped as new. With
+BLOOM_FILTERS=auto (the default) they are only used when the app is
+known to run in a single process: a plain `uvicorn main:app`, without
+WEB_CONCURRENCY above 1, --workers or --reload. Gunicorn workers are
+forked and can't tell how many siblings they have, so the filters stay
+off there. BLOOM_FILTERS=True uses them in any server that isn't known
+to run several processes.
+
+Each filter is built with room for twice its tenant's phones (at least
+BLOOM_INITIAL_CAPACITY) at BLOOM_ERROR_RATE and adds a twice larger
+layer whenever it is full, so the false positive rate stays bounded as
+tenants grow. GET /admin/bloom reports sizes, the
+expected and observed false positive rates and the lookups saved
+(`python -m benchmarks.bench_phone_bloom`).
+"""
+import asyncio
+import hashlib
+import math
+import multiprocessing
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# "auto": only in a single uvicorn process (see single_process_server())
+BLOOM_FILTERS = os.getenv("BLOOM_FILTERS", "auto").lower()
+BLOOM_ERROR_RATE = float(os.getenv("BLOOM_ERROR_RATE", "0.01"))
+BLOOM_INITIAL_CAPACITY = int(os.getenv("BLOOM_INITIAL_CAPACITY", "1024"))
+# Each new layer gets this share of the previous layer's error rate
+TIGHTENING = 0.5
+BATCH_SIZE = 1000
+
+
+class _Layer:
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self.array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    def set(self, h1: int, h2: int):
+        bits, array = self.bits, self.array
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % bits
+            array[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def test(self, h1: int, h2: int) -> bool:
+        bits, array = self.bits, self.array
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % bits
+            if not array[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def false_positive_rate(self) -> float:
+        return (1 - math.exp(-self.hashes * self.count / self.bits)) ** self.hashes
+
+
+def hash_key(key: str) -> Tuple[int, int]:
+    digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+    # Double hashing: bit i is h1 + i * h2 (h2 odd, so never 0)
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+
+class BloomFilter:
+    """Scalable Bloom filter: a new, larger layer is added when the last one is full"""
+
+    def __init__(self, capacity: int = BLOOM_INITIAL_CAPACITY, error_rate: float = BLOOM_ERROR_RATE):
+        self.error_rate = error_rate
+        # The layers' rates sum to at most error_rate
+        self.layers = [_Layer(capacity, error_rate * (1 - TIGHTENING))]
+
+    def add(self, key: str):
+        self.add_hashed(*hash_key(key))
+
+    def add_hashed(self, h1: int, h2: int, check: bool = True):
+        """Add by hash_key(); `check=False` skips the membership test for distinct keys"""
+        if check and self.contains_hashed(h1, h2):
+            return
+        layer = self.layers[-1]
+        if layer.count >= layer.capacity:
+            layer = _Layer(layer.capacity * 2, self.error_rate * (1 - TIGHTENING) * TIGHTENING ** len(self.layers))
+            self.layers.append(layer)
+        layer.set(h1, h2)
+
+    def contains_hashed(self, h1: int, h2: int) -> bool:
+        # The newest layers are the largest
+        for layer in reversed(self.layers):
+            if layer.test(h1, h2):
+                return True
+        return False
+
+    def __contains__(self, key: str) -> bool:
+        return self.contains_hashed(*hash_key(key))
+
+    def __len__(self) -> int:
+        return sum(layer.count for layer in self.layers)
+
+    def memory(self) -> int:
+        return sum(len(layer.array) for layer in self.layers)
+
+    def false_positive_rate(self) -> float:
+        """Expected rate at the current fill"""
+        return 1 - math.prod(1 - layer.false_positive_rate() for layer in self.layers)
+
+
+def app_processes() -> int:
+    """Processes serving the app, as far as this one can tell
+
+    WEB_CONCURRENCY is the default of uvicorn's and gunicorn's --workers;
+    a process started by multiprocessing (uvicorn --workers or --reload)
+    or forked by gunicorn can't see how many siblings it has, so it counts
+    as at least two.
+    """
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if multiprocessing.parent_process() is not None or "gunicorn" in sys.modules:
+        return max(workers, 2)
+    return workers
+
+
+def single_process_server() -> bool:
+    """Whether this process is known to be the only one serving the app (plain uvicorn)"""
+    return app_processes() == 1 and "uvicorn" in sys.modules
+
+
+class PhoneFilters:
+    """Bloom filters of contact phone keys per tenant (None: all tenants)"""
+
+    def __init__(self, enabled: Optional[bool] = None if BLOOM_FILTERS == "auto" else BLOOM_FILTERS == "true"):
+        # None: decided by start(), on only in a single uvicorn process
+        self.auto = enabled is None
+        self.enabled = bool(enabled)
+        self.ready = False
+        self._filters: Dict[Optional[str], BloomFilter] = {}
+        # (tenant, key) added while the filters are being built
+        self._building: Optional[List[Tuple[Optional[str], str]]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._started = False
+        self.checks = 0
+        self.definitely_new = 0
+        self.false_positives = 0
+        self.rebuilds = 0
+        self.last_rebuild_seconds: Optional[float] = None
+
+    @staticmethod
+    def _add_to(filters: Dict[Optional[str], BloomFilter], tenant: Optional[str], key: str):
+        hashed = hash_key(key)
+        for owner in {tenant, None}:
+            if owner not in filters:
+                filters[owner] = BloomFilter()
+            filters[owner].add_hashed(*hashed)
+
+    def add(self, tenant: Optional[str], key: Optional[str]):
+        """A contact of `tenant` with phone key `key` was written"""
+        if not self.enabled or not key:
+            return
+        self._add_to(self._filters, tenant, key)
+        if self._building is not None:
+            self._building.append((tenant, key))
+
+    def answers(self, key: Optional[str]) -> bool:
+        """Whether might_exist() checks `key` rather than letting it through
+
+        Only phones the filters answered for count as false positives.
+        """
+        # Phones without an E.164 key are looked up by their raw text
+        return bool(key) and self.enabled and self.ready
+
+    def might_exist(self, tenant: Optional[str], key: Optional[str]) -> bool:
+        """False if no contact of `tenant` (None: of any tenant) has phone key `key`
+
+        Always True without a key (the filters only hold E.164 keys) or
+        before the filters are built.
+        """
+        if not self.answers(key):
+            return True
+        self.checks += 1
+        bloom = self._filters.get(tenant)
+        if bloom is None or key not in bloom:
+            self.definitely_new += 1
+            return False
+        return True
+
+    def false_positive(self, count: int = 1):
+        """Phones the filters answered for were not found after all"""
+        self.false_positives += count
+
+    def start(self):
+        """Build the filters in the background (app startup)"""
+        # Other workers' inserts would be false negatives
+        if self.auto:
+            self.enabled = single_process_server()
+            if not self.enabled:
+                print("🌸 Phone Bloom filters off: the app may run in several processes")
+        elif self.enabled and app_processes() > 1:
+            print("🌸 Phone Bloom filters off: the app runs in several processes")
+            self.enabled = False
+        self._started = True
+        self._schedule()
+
+    async def stop(self):
+        self._started = False
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def invalidate(self):
+        """The contacts changed behind our back (another backend): rebuild"""
+        self.ready = False
+        self._filters = {}
+        if self._started:
+            self._schedule()
+
+    def _schedule(self):
+        if not self.enabled:
+            return
+        if self._task is not None:
+            self._task.cancel()
+        try:
+            self._task = asyncio.get_running_loop().create_task(self.rebuild())
+        except RuntimeError:
+            # No event loop (scripts): filters stay off
+            self._task = None
+
+    async def rebuild(self):
+        """Build the filters from the contacts collection
+
+        The hashes are collected first so that each filter is sized for
+        twice its tenant's phones: one layer, and room to grow.
+        """
+        from database import get_async_collection
+        from phone_utils import normalize_phone
+
+        started = time.perf_counter()
+        building: List[Tuple[Optional[str], str]] = []
+        self._building = building
+        try:
+            collection = get_async_collection("contacts")
+            if collection is None:
+                return
+            hashes: Dict[Optional[str], List[Tuple[int, int]]] = {None: []}
+            cursor = collection.find({}, {"_id": 0, "user_id": 1, "phone": 1, "phoneE164": 1})
+            loaded = 0
+            async for doc in cursor.batch_size(BATCH_SIZE):
+                # Rows the phone key backfill hasn't reached yet are normalized here
+                key = doc.get("phoneE164") or normalize_phone(doc.get("phone"))
+                if key:
+                    hashed = hash_key(key)
+                    hashes.setdefault(doc.get("user_id"), []).append(hashed)
+                    if doc.get("user_id") is not None:
+                        hashes[None].append(hashed)
+                loaded += 1
+                if loaded % BATCH_SIZE == 0:
+                    await asyncio.sleep(0)
+
+            filters: Dict[Optional[str], BloomFilter] = {}
+            for owner, owned in hashes.items():
+                bloom = filters[owner] = BloomFilter(max(BLOOM_INITIAL_CAPACITY, 2 * len(owned)))
+                for hashed in owned:
+                    # Phones are unique per tenant; across tenants a repeat only overcounts
+                    bloom.add_hashed(*hashed, check=False)
+            for tenant, key in building:
+                self._add_to(filters, tenant, key)
+            self._filters = filters
+            self.ready = True
+            self.rebuilds += 1
+            self.last_rebuild_seconds = time.perf_counter() - started
+            print(f"🌸 Phone Bloom filters built: {loaded} contacts, {len(filters) - 1} "
+                  f"tenants in {self.last_rebuild_seconds:.1f}s")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️  Phone Bloom filter build failed, phones are always looked up: {e}")
+        finally:
+            if self._building is building:
+                self._building = None
+
+    def stats(self, top: int = 10) -> Dict[str, Any]:
+        tenants: List[Dict[str, Any]] = sorted(
+            (
+                {"tenant": tenant, "keys": len(bloom), "layers": len(bloom.layers), "memoryBytes": bloom.memory(),
+                 "expectedFalsePositiveRate": round(bloom.false_positive_rate(), 6)}
+                for tenant, bloom in self._filters.items() if tenant is not None
+            ),
+            key=lambda entry: entry["keys"], reverse=True,
+        )
+        everyone = self._filters.get(None)
+        # Checks that the filters let through for an absent phone
+        absent = self.definitely_new + self.false_positives
+        return {
+            "enabled": self.enabled,
+            "ready": self.ready,
+            "errorRate": BLOOM_ERROR_RATE,
+            "tenants": len(tenants),
+            "keys": len(everyone) if everyone else 0,
+            "memoryBytes": sum(bloom.memory() for bloom in self._filters.values()),
+            "checks": self.checks,
+            "lookupsSaved": self.definitely_new,
+            "falsePositives": self.false_positives,
+            "observedFalsePositiveRate": round(self.false_positives / absent, 6) if absent else None,
+            "expectedFalsePositiveRate": round(everyone.false_positive_rate(), 6) if everyone else None,
+            "rebuilds": self.rebuilds,
+            "lastRebuildSeconds": round(self.last_rebuild_seconds, 3) if self.last_rebuild_seconds is not None else None,
+            "largestTenants": tenants[:top],
+        }
+
+
+phone_filters = PhoneFilters()
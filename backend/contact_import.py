@@ -0,0 +1,315 @@
+"""
+Batched contact import
+
+POST /contacts/import used to run a find_one on the phone and an
+insert_one per row: two round trips per contact. Rows are now handled in
+chunks of IMPORT_CHUNK_SIZE:
+
+1. validate and build the documents, dropping phones repeated earlier in
+   the file (compared by their E.164 key, see phone_utils.py);
+2. one `$in` query for the chunk's phones that the user already has;
+3. one insert_many(ordered=False) for the rest. The (user_id, phoneE164)
+   unique index catches rows that raced with another write; they are
+   reported like any other duplicate while the rest of the chunk goes in.
+
+Every skipped row is reported with its (0-based) row number and reason.
+Only one chunk is held at a time: a phone repeated in a later chunk is
+found by the next pre-check, since the earlier chunk is already inserted.
+
+POST /contacts/import/upload takes a CSV file instead of a JSON array.
+The multipart upload is spooled to a temporary file, and read_csv() reads
+it back one chunk of rows at a time, so memory stays bounded by the chunk
+size however large the file is. Columns are matched to the ContactCreate
+fields by name (see CSV_COLUMNS); other columns go to customFields.
+"""
+import asyncio
+import csv
+import io
+import os
+import uuid
+from datetime import datetime
+from itertools import islice
+from typing import Any, AsyncIterator, BinaryIO, Dict, Iterable, List, Optional, Tuple, Union
+
+from pymongo.errors import BulkWriteError
+
+import search_index
+from bloom import phone_filters
+from count_cache import counts
+from database import get_async_collection
+from models import ContactCreate
+from phone_utils import normalize_phone
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+# Row errors kept in the result (the counts always cover every row)
+MAX_ROW_ERRORS = 1000
+
+# CSV header (lowercase, without spaces, "_" and "-") -> ContactCreate field
+CSV_COLUMNS = {
+    **{field.lower(): field for field in ContactCreate.model_fields},
+    "fullname": "name", "contactname": "name",
+    "phonenumber": "phone", "mobile": "phone", "mobilenumber": "phone",
+    "whatsapp": "phone", "whatsappnumber": "phone", "number": "phone",
+    "emailaddress": "email", "mail": "email",
+    "tag": "tags", "labels": "tags",
+    "note": "notes",
+}
+# Columns of our own CSV export that are not imported
+IGNORED_COLUMNS = {"id", "createdat", "updatedat", "avatar", "lastmessagetime"}
+
+
+class ImportResult:
+    def __init__(self):
+        self.imported = 0
+        self.skipped = 0
+        self.row_errors: List[Dict[str, Any]] = []
+        # Per-stage timings of a parallel CSV import (import_pool.py)
+        self.stages: Dict[str, Any] = {}
+
+    def skip(self, row: int, contact_data: Any, reason: str):
+        self.skipped += 1
+        if len(self.row_errors) < MAX_ROW_ERRORS:
+            name = contact_data.get("name") if isinstance(contact_data, dict) else None
+            self.row_errors.append({"row": row, "name": name, "reason": reason})
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = {
+            "success": True,
+            "imported": self.imported,
+            "skipped": self.skipped,
+            # Readable messages for the first rows, as the endpoint always returned
+            "errors": [
+                f"Skipped {error['name'] or 'contact'} (row {error['row'] + 1}): {error['reason']}"
+                for error in self.row_errors[:10]
+            ],
+            "rowErrors": self.row_errors,
+            "message": f"Imported {self.imported} contacts, skipped {self.skipped}",
+        }
+        if self.stages:
+            result["stages"] = self.stages
+        return result
+
+
+def build_contact(contact_data: Dict[str, Any], user_id: str, now: str) -> Dict[str, Any]:
+    """Contact document for an import row (ValueError if it can't be imported)"""
+    if not isinstance(contact_data, dict):
+        raise ValueError("not a contact object")
+    if not contact_data.get("name") or not contact_data.get("phone"):
+        raise ValueError("missing name or phone")
+    tags = contact_data.get("tags")
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "name": contact_data.get("name"),
+        "phone": contact_data.get("phone"),
+        "phoneE164": normalize_phone(contact_data.get("phone")),
+        "email": contact_data.get("email"),
+        "tags": tags if isinstance(tags, list) else [],
+        "status": contact_data.get("status", "Active"),
+        "customFields": contact_data.get("customFields", {}),
+        "notes": contact_data.get("notes"),
+        "avatar": str(contact_data.get("name", "U"))[:2].upper(),
+        "createdAt": now,
+        "updatedAt": now,
+    }
+
+
+def _column_key(header: str) -> str:
+    return "".join(ch for ch in header.strip().lower() if ch not in " _-")
+
+
+def csv_columns(header: List[str]) -> List[Optional[str]]:
+    """Field of each CSV column: a ContactCreate field, "customFields.<header>" or None"""
+    columns = []
+    for title in header:
+        key = _column_key(title)
+        if key in CSV_COLUMNS and CSV_COLUMNS[key] not in columns:
+            columns.append(CSV_COLUMNS[key])
+        elif key and key not in IGNORED_COLUMNS and key != "customfields":
+            columns.append(f"customFields.{title.strip()}")
+        else:
+            columns.append(None)
+    return columns
+
+
+def csv_contact(values: List[str], columns: List[Optional[str]]) -> Dict[str, Any]:
+    """Import row for one CSV record; empty cells are left out"""
+    contact: Dict[str, Any] = {}
+    custom: Dict[str, str] = {}
+    for field, value in zip(columns, values):
+        value = value.strip()
+        if field is None or not value:
+            continue
+        if field.startswith("customFields."):
+            custom[field[len("customFields."):]] = value
+        elif field == "tags":
+            contact["tags"] = [tag.strip() for tag in value.replace(";", ",").split(",") if tag.strip()]
+        else:
+            contact[field] = value
+    if custom:
+        contact["customFields"] = custom
+    return contact
+
+
+def header_columns(header: Optional[List[str]]) -> List[Optional[str]]:
+    """csv_columns() of a header line; ValueError without a name or phone column"""
+    columns = csv_columns(header or [])
+    if "name" not in columns or "phone" not in columns:
+        raise ValueError("the CSV header needs a name and a phone column")
+    return columns
+
+
+def csv_contacts(records: Iterable[List[str]], columns: List[Optional[str]]) -> Iterable[Dict[str, Any]]:
+    """Import rows of CSV records, skipping blank lines"""
+    for values in records:
+        if any(value.strip() for value in values):
+            yield csv_contact(values, columns)
+
+
+async def read_csv(file: BinaryIO, chunk_size: Optional[int] = None,
+                   columns: Optional[List[Optional[str]]] = None) -> AsyncIterator[Dict[str, Any]]:
+    """Import rows of a CSV file with a header line, read chunk by chunk off the event loop
+
+    With `columns`, the header was already read and `file` is positioned
+    at a record. ValueError if the header has no name or phone column;
+    UnicodeDecodeError or csv.Error if the file is not UTF-8 CSV.
+    """
+    chunk_size = chunk_size or IMPORT_CHUNK_SIZE
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.reader(text)
+        if columns is None:
+            columns = header_columns(await asyncio.to_thread(next, reader, None))
+        while True:
+            records = await asyncio.to_thread(lambda: list(islice(reader, chunk_size)))
+            if not records:
+                return
+            for contact in csv_contacts(records, columns):
+                yield contact
+    finally:
+        # Leave the upload's file open for its owner to close
+        text.detach()
+
+
+async def _chunks(rows: Union[Iterable[Any], AsyncIterator[Any]], chunk_size: int) -> AsyncIterator[List[Any]]:
+    if hasattr(rows, "__aiter__"):
+        chunk = []
+        async for row in rows:
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+        return
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def prepare_rows(rows: Iterable[Any], start: int, user_id: str, now: str) -> Tuple[List[Tuple], List[Tuple]]:
+    """Validate and build a chunk of rows (CPU only, also run in import_pool workers)
+
+    Returns the (row, doc) candidates and the (row, contact_data, reason)
+    rows skipped as invalid or repeated in the chunk.
+    """
+    # Phones seen earlier in this chunk, like the existing-phone check: the
+    # E.164 key, or the raw text of phones that can't be normalized.
+    # Repeats in later chunks are found by that check, so the result
+    # doesn't depend on where chunks (or import_pool ranges) start
+    seen = set()
+    candidates, skipped = [], []
+    for row, contact_data in enumerate(rows, start):
+        try:
+            doc = build_contact(contact_data, user_id, now)
+        except ValueError as e:
+            skipped.append((row, contact_data, str(e)))
+            continue
+        key = doc["phoneE164"] or ("raw", str(doc["phone"]))
+        if key in seen:
+            skipped.append((row, contact_data, "phone repeated in the import"))
+            continue
+        seen.add(key)
+        candidates.append((row, doc))
+    return candidates, skipped
+
+
+async def _import_chunk(collection, user_id: str, rows: List[Any], start: int, now: str, result: ImportResult):
+    candidates, skipped = prepare_rows(rows, start, user_id, now)
+    for row, contact_data, reason in skipped:
+        result.skip(row, contact_data, reason)
+    await write_contacts(collection, user_id, candidates, result)
+
+
+async def write_contacts(collection, user_id: str, candidates: List[Tuple], result: ImportResult):
+    """Insert prepared candidates, skipping phones the user already has"""
+    # Only phones the Bloom filter may have seen are looked up (bloom.py)
+    keys = [doc["phoneE164"] for _, doc in candidates
+            if doc["phoneE164"] and phone_filters.might_exist(user_id, doc["phoneE164"])]
+    # Phones that can't be normalized are matched on their raw text
+    raw = [doc["phone"] for _, doc in candidates if not doc["phoneE164"]]
+    # Keys let through before the filters were built are not false positives
+    answered = {key for key in keys if phone_filters.answers(key)}
+    existing = set()
+    if keys:
+        found = await collection.find(
+            {"user_id": user_id, "phoneE164": {"$in": keys}}, {"_id": 0, "phoneE164": 1}
+        ).to_list(length=None)
+        existing = {doc["phoneE164"] for doc in found}
+        phone_filters.false_positive(len(answered - existing))
+    if raw:
+        found = await collection.find(
+            {"user_id": user_id, "phone": {"$in": raw}}, {"_id": 0, "phone": 1}
+        ).to_list(length=None)
+        existing.update(("raw", str(doc["phone"])) for doc in found)
+
+    batch = []
+    for row, doc in candidates:
+        if (doc["phoneE164"] or ("raw", str(doc["phone"]))) in existing:
+            result.skip(row, doc, "phone already exists")
+        else:
+            batch.append((row, doc))
+    if not batch:
+        return
+
+    failed = set()
+    try:
+        await collection.insert_many([doc for _, doc in batch], ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            row, doc = batch[error["index"]]
+            failed.add(error["index"])
+            reason = "phone already exists" if error.get("code") == 11000 else error.get("errmsg", "write failed")
+            result.skip(row, doc, reason)
+    inserted = [doc for i, (_, doc) in enumerate(batch) if i not in failed]
+    result.imported += len(inserted)
+    for doc in inserted:
+        phone_filters.add(user_id, doc["phoneE164"])
+    await search_index.index_contacts(inserted, new=True)
+
+
+async def import_contacts(user_id: str, rows: Union[Iterable[Any], AsyncIterator[Any]],
+                          chunk_size: Optional[int] = None,
+                          result: Optional[ImportResult] = None, start: int = 0) -> ImportResult:
+    """Insert `rows` (a list or an async iterator) as contacts of `user_id`,
+    skipping invalid and duplicate phones
+
+    Pass `result` to keep the counts of the rows imported before an error
+    raised by `rows`; `start` is the row number of the first row.
+    """
+    collection = get_async_collection("contacts")
+    chunk_size = chunk_size or IMPORT_CHUNK_SIZE
+    result = result if result is not None else ImportResult()
+    imported_before = result.imported
+    now = datetime.now().isoformat()
+    try:
+        async for chunk in _chunks(rows, chunk_size):
+            await _import_chunk(collection, user_id, chunk, start, now, result)
+            start += len(chunk)
+    finally:
+        if result.imported > imported_before:
+            counts.adjust("contacts", user_id, result.imported - imported_before)
+    return result
@@ -0,0 +1,163 @@
+"""
+Cached totals for paginated list endpoints
+
+/contacts and /templates report `total` with every page, and a filtered
+count_documents() costs about as much as the page itself. Counts are
+cached per (collection, tenant, normalized filter) and tagged with the
+tenant's write generation:
+
+- writes call invalidate(), which bumps the generation so every cached
+  count of that tenant is recomputed on next use;
+- inserts and deletes call adjust() instead, which also keeps the
+  tenant's unfiltered total exact by adding the delta;
+- entries expire after COUNT_CACHE_TTL seconds regardless, which bounds
+  staleness from writes made by other workers or scripts.
+
+`estimate=True` trades exactness for a bounded cost on very large
+tenants: the count stops at COUNT_ESTIMATE_LIMIT. Above that the total
+comes from collection stats (estimated_document_count) for queries
+without a filter (not tenant scoped), or from the last known count if
+it is not too old. Otherwise it is unknown: count() returns None and
+page_totals() reports the limit as `totalAtLeast`.
+"""
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+COUNT_CACHE_TTL = float(os.getenv("COUNT_CACHE_TTL", "60"))
+COUNT_CACHE_SIZE = int(os.getenv("COUNT_CACHE_SIZE", "10000"))
+COUNT_ESTIMATE_LIMIT = int(os.getenv("COUNT_ESTIMATE_LIMIT", "10000"))
+# Last known counts older than this are not used as estimates
+STALE_ESTIMATE_TTL = 10 * COUNT_CACHE_TTL
+
+
+def normalize_filter(query: Dict[str, Any]) -> str:
+    """Canonical form of a filter: key order and regex objects don't matter"""
+    return json.dumps(query, sort_keys=True, separators=(",", ":"), default=_encode)
+
+
+def _encode(value: Any) -> Any:
+    pattern = getattr(value, "pattern", None)
+    if pattern is not None:
+        return {"$regex": pattern, "$flags": getattr(value, "flags", 0)}
+    return str(value)
+
+
+class CountCache:
+    """LRU of (count, write generation, time) per (collection, tenant, filter)"""
+
+    def __init__(self, capacity: int = COUNT_CACHE_SIZE, ttl: float = COUNT_CACHE_TTL):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, Optional[str], str], Tuple[int, int, int, float]]" = OrderedDict()
+        # (collection, tenant) -> write generation; tenant None covers queries across tenants
+        self._generations: Dict[Tuple[str, Optional[str]], int] = {}
+        # collection -> epoch, bumped by writes whose tenant is unknown
+        self._epochs: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _stamp(self, name: str, tenant: Optional[str]) -> Tuple[int, int]:
+        return self._generations.get((name, tenant), 0), self._epochs.get(name, 0)
+
+    def stamp(self, name: str, query: Dict[str, Any]) -> Tuple[int, int]:
+        """Write generation to store with a count started now"""
+        return self._stamp(name, query.get("user_id"))
+
+    def get(self, name: str, query: Dict[str, Any], max_age: Optional[float] = None,
+            stale: bool = False) -> Optional[int]:
+        """Cached count, or None; `stale` accepts counts from before later writes"""
+        key = (name, query.get("user_id"), normalize_filter(query))
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        count, generation, epoch, stored = entry
+        fresh = (generation, epoch) == self._stamp(name, key[1])
+        if time.monotonic() - stored > (self.ttl if max_age is None else max_age) or not (fresh or stale):
+            return None
+        self._entries.move_to_end(key)
+        return count
+
+    def put(self, name: str, query: Dict[str, Any], count: int, stamp: Tuple[int, int]):
+        """Store a count; `stamp` is from before it was computed, so a write
+        that raced with the count leaves the entry stale"""
+        if not self.capacity:
+            return
+        key = (name, query.get("user_id"), normalize_filter(query))
+        self._entries[key] = (count, *stamp, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, name: str, tenant: Optional[str] = None):
+        """A write changed documents of `tenant` (None: of any tenant)"""
+        if tenant is None:
+            self._epochs[name] = self._epochs.get(name, 0) + 1
+            return
+        self._generations[(name, tenant)] = self._generations.get((name, tenant), 0) + 1
+        self._generations[(name, None)] = self._generations.get((name, None), 0) + 1
+
+    def adjust(self, name: str, tenant: Optional[str], delta: int):
+        """`delta` documents were inserted (or deleted, if negative) for `tenant`"""
+        # The unfiltered totals stay exact; filtered counts are recomputed
+        totals = [(None, {})] + ([(tenant, {"user_id": tenant})] if tenant is not None else [])
+        adjusted = []
+        for owner, query in totals:
+            key = (name, owner, normalize_filter(query))
+            entry = self._entries.get(key)
+            if entry is not None and entry[1:3] == self._stamp(name, owner):
+                adjusted.append((key, owner, max(0, entry[0] + delta), entry[3]))
+        self.invalidate(name, tenant)
+        for key, owner, total, stored in adjusted:
+            self._entries[key] = (total, *self._stamp(name, owner), stored)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+counts = CountCache()
+
+
+async def count(name: str, collection, query: Dict[str, Any],
+                estimate: bool = False) -> Tuple[Optional[int], bool]:
+    """Number of documents matching `query`, and whether it is an estimate
+
+    None (estimated) when `estimate` stopped counting at COUNT_ESTIMATE_LIMIT
+    and there is nothing to estimate the total from.
+    """
+    cached = counts.get(name, query)
+    if cached is not None:
+        counts.hits += 1
+        return cached, False
+    counts.misses += 1
+    stamp = counts.stamp(name, query)
+
+    if estimate:
+        capped = await collection.count_documents(query, limit=COUNT_ESTIMATE_LIMIT)
+        if capped < COUNT_ESTIMATE_LIMIT:
+            counts.put(name, query, capped, stamp)
+            return capped, False
+        if not query:
+            return max(capped, await collection.estimated_document_count()), True
+        last_known = counts.get(name, query, max_age=STALE_ESTIMATE_TTL, stale=True)
+        return (max(capped, last_known), True) if last_known is not None else (None, True)
+
+    total = await collection.count_documents(query)
+    counts.put(name, query, total, stamp)
+    return total, False
+
+
+def page_totals(total: Optional[int], estimated: bool, limit: int) -> Dict[str, Any]:
+    """`total`, `totalEstimated` and `pages` of a list response
+
+    An unknown total (see count()) is reported as `totalAtLeast` instead,
+    with `total` and `pages` null.
+    """
+    if total is None:
+        return {"total": None, "totalEstimated": True, "totalAtLeast": COUNT_ESTIMATE_LIMIT, "pages": None}
+    return {"total": total, "totalEstimated": estimated, "pages": (total + limit - 1) // limit}
@@ -1,53 +1,194 @@
 from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure
-from typing import Optional
+from motor.motor_asyncio import AsyncIOMotorClient
+from typing import Optional, Dict, Any
+import asyncio
 import os
 from dotenv import load_dotenv
 import certifi
+from pool_stats import collectors as pool_collectors
+from failover import FailoverSupervisor
+from count_cache import counts
+from bloom import phone_filters
 
 load_dotenv()
 
 class Database:
     client: Optional[MongoClient] = None
+    # Async (Motor) client used by the FastAPI handlers; the sync client above
+    # stays around for scripts such as seed_data.py
+    async_client: Optional[AsyncIOMotorClient] = None
+    # Async collection handles, cached once connected (see get_async_collection)
+    _async_collections: Dict[str, Any] = {}
+    # Health probe that fails over to the mock and back (see failover.py)
+    supervisor: Optional[FailoverSupervisor] = None
+
+    COLLECTIONS = ("contacts", "contact_search", "messages", "campaigns", "templates", "users", "agent_logs", "agents")
+    
+    @classmethod
+    def _pool_options(cls) -> dict:
+        """Connection pool settings from the environment (pymongo defaults otherwise)"""
+        options = {
+            "maxPoolSize": int(os.getenv("MONGODB_MAX_POOL_SIZE", "100")),
+            "minPoolSize": int(os.getenv("MONGODB_MIN_POOL_SIZE", "0")),
+        }
+        # Unset means no limit, as in pymongo
+        if os.getenv("MONGODB_MAX_IDLE_TIME_MS"):
+            options["maxIdleTimeMS"] = int(os.getenv("MONGODB_MAX_IDLE_TIME_MS"))
+        if os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS"):
+            options["waitQueueTimeoutMS"] = int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS"))
+        return options
+
+    @classmethod
+    def _client_options(cls) -> dict:
+        """Connection options shared by the sync and async clients"""
+        # Use certifi for proper SSL certificate verification on macOS
+        return {
+            "serverSelectionTimeoutMS": int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+            "connectTimeoutMS": 5000,
+            "tls": True,
+            "tlsCAFile": certifi.where(),
+            "uuidRepresentation": 'standard',
+            **cls._pool_options(),
+        }
     
     @classmethod
-    def connect(cls):
-        """Connect to MongoDB"""
+    def _use_mock(cls, error: Exception):
+        print(f"⚠️  MongoDB connection failed: {error}")
+        print(f"⚠️  Switching to MOCK DATABASE (In-Memory)")
+
+        from mock_db import MockClient, AsyncMockClient
+        cls.client = MockClient()
+        # Both clients share the same in-memory collections
+        cls.async_client = AsyncMockClient(cls.client)
+        cls._async_collections = {}
+
+    @classmethod
+    def is_mock(cls) -> bool:
+        from mock_db import MockClient, AsyncMockClient
+        return isinstance(cls.client, MockClient) or isinstance(cls.async_client, AsyncMockClient)
+
+    @classmethod
+    def _swap_clients(cls, client, async_client):
+        """Point the handlers at another backend (used by the failover supervisor)"""
+        cls.client = client
+        cls.async_client = async_client
+        cls._async_collections = {}
+        # Cached totals and phone filters describe the previous backend
+        counts.clear()
+        phone_filters.invalidate()
+
+    @classmethod
+    def _wrap(cls, name: str, collection):
+        return cls.supervisor.wrap(name, collection) if cls.supervisor else collection
+
+    @classmethod
+    def connect(cls, ensure_indexes: bool = True):
+        """Connect to MongoDB (blocking; used by scripts such as seed_data.py)"""
         mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
         
         try:
-            # Use certifi for proper SSL certificate verification on macOS
             cls.client = MongoClient(
-                mongodb_url,
-                serverSelectionTimeoutMS=5000,
-                connectTimeoutMS=5000,
-                tls=True,
-                tlsCAFile=certifi.where(),
-                uuidRepresentation='standard'
+                mongodb_url, event_listeners=[pool_collectors["sync"]], **cls._client_options()
             )
             
             # Verify connection
             cls.client.admin.command('ping')
             print(f"✅ Connected to MongoDB")
             
-        except Exception as e:
-            print(f"⚠️  MongoDB connection failed: {e}")
-            print(f"⚠️  Switching to MOCK DATABASE (In-Memory)")
+            # Keep an async client the app lifespan already opened
+            if cls.async_client is None:
+                cls.async_client = AsyncIOMotorClient(
+                    mongodb_url, event_listeners=[pool_collectors["async"]], **cls._client_options()
+                )
             
-            from mock_db import MockClient
-            cls.client = MockClient()
+        except Exception as e:
+            cls._use_mock(e)
+        
+        if ensure_indexes:
+            from indexes import ensure_indexes as ensure_declared_indexes
+            ensure_declared_indexes(cls.get_database())
+
+    @classmethod
+    async def connect_async(cls, ensure_indexes: bool = True):
+        """Connect from inside the running event loop (FastAPI lifespan)
+
+        Runs in each worker after it has started, so no client is ever
+        inherited across a fork, and doesn't block the loop while the
+        server is selected.
+        """
+        mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+
+        client = AsyncIOMotorClient(
+            mongodb_url, event_listeners=[pool_collectors["async"]], **cls._client_options()
+        )
+        try:
+            await client.admin.command('ping')
+            cls.async_client = client
+            cls._async_collections = {}
+            print(f"✅ Connected to MongoDB")
+        except Exception as e:
+            cls._use_mock(e)
+
+        if cls.is_mock():
+            # Started on the mock: it's the database for this process, so
+            # writes go to it directly and are never replayed anywhere
+            client.close()
+        elif os.getenv("MONGODB_FAILOVER", "True").lower() == "true":
+            # Keeps the real client to probe (and reconnect) while on the mock
+            cls.supervisor = FailoverSupervisor(cls, client)
+            cls.supervisor.start()
+
+        if ensure_indexes:
+            from indexes import ensure_indexes_async
+            await ensure_indexes_async(cls.get_async_database())
+        await cls.warm_up()
+
+    @classmethod
+    async def warm_up(cls):
+        """Cache collection handles and open pooled connections before the first request"""
+        db = cls.get_async_database()
+        for name in cls.COLLECTIONS:
+            cls._async_collections[name] = cls._wrap(name, db[name])
+
+        if cls.is_mock():
+            return
+        # Concurrent pings each check out a connection, so the pool opens
+        # (and TLS-handshakes) this many up front
+        connections = min(int(os.getenv("MONGODB_WARM_CONNECTIONS", "4")), cls._pool_options()["maxPoolSize"])
+        await asyncio.gather(*(cls.async_client.admin.command('ping') for _ in range(connections)))
+        print(f"🔥 Warmed {connections} pooled connections")
     
+    @classmethod
+    async def close_async(cls):
+        """Stop the failover probe, then close()"""
+        if cls.supervisor is not None:
+            await cls.supervisor.stop()
+            if cls.supervisor.client is not cls.async_client:
+                cls.supervisor.client.close()
+            cls.supervisor = None
+        cls.close()
+
     @classmethod
     def close(cls):
         """Close MongoDB connection"""
+        cls._async_collections = {}
+        if cls.async_client:
+            cls.async_client.close()
+            cls.async_client = None
         if cls.client:
             cls.client.close()
+            cls.client = None
             print("MongoDB connection closed")
     
     @classmethod
     def get_database(cls):
-        """Get database instance"""
+        """Get database instance (scripts; connects on first use)"""
         if not cls.client:
+            if _in_event_loop():
+                # The app only has the async client (connect_async, failover):
+                # connecting here would block the loop
+                raise RuntimeError("No sync MongoDB client in the app, use get_async_database()")
             cls.connect()
         
         # NOTE: cls.client might be MockClient, which behaves like MongoClient
@@ -55,10 +196,40 @@ class Database:
         db_name = os.getenv("MONGODB_DB_NAME", "whatsapp_business")
         return cls.client[db_name]
     
+    @classmethod
+    def get_async_database(cls):
+        """Get async database instance (awaitable collection methods), None before connect_async()"""
+        if not cls.async_client:
+            return None
+        
+        db_name = os.getenv("MONGODB_DB_NAME", "whatsapp_business")
+        return cls.async_client[db_name]
+    
+    @classmethod
+    def pool_stats(cls) -> dict:
+        """Pool configuration and per-server pool health for both clients"""
+        failover = cls.supervisor.status() if cls.supervisor else None
+        if cls.is_mock():
+            return {"backend": "mock", "config": None, "pools": {}, "failover": failover}
+        return {
+            "backend": "mongodb",
+            "config": cls._pool_options(),
+            "pools": {name: collector.snapshot() for name, collector in pool_collectors.items()},
+            "failover": failover,
+        }
+
     @classmethod
     def is_connected(cls):
-        """Check if MongoDB is connected"""
-        return cls.client is not None
+        """Check if MongoDB is connected (the app only has the async client)"""
+        return cls.async_client is not None or cls.client is not None
+
+
+def _in_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
 
 # Collection accessors
 def get_collection(name: str):
@@ -73,5 +244,23 @@ def get_users_collection(): return get_collection("users")
 def get_agent_logs_collection(): return get_collection("agent_logs")
 def get_agents_collection(): return get_collection("agents")
 
-# Initialize connection on import
-Database.connect()
+# Async collection accessors (for use inside async request handlers)
+def get_async_collection(name: str):
+    collection = Database._async_collections.get(name)
+    if collection is None:
+        db = Database.get_async_database()
+        if db is None:
+            return None
+        collection = Database._async_collections[name] = Database._wrap(name, db[name])
+    return collection
+
+def get_async_contacts_collection(): return get_async_collection("contacts")
+def get_async_messages_collection(): return get_async_collection("messages")
+def get_async_campaigns_collection(): return get_async_collection("campaigns")
+def get_async_templates_collection(): return get_async_collection("templates")
+def get_async_users_collection(): return get_async_collection("users")
+def get_async_agent_logs_collection(): return get_async_collection("agent_logs")
+def get_async_agents_collection(): return get_async_collection("agents")
+
+# No connection on import: the app connects in its lifespan (main.py), scripts
+# connect explicitly or on first use via get_database() (never from the app)
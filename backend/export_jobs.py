@@ -0,0 +1,291 @@
+"""
+Background contact export jobs
+
+A multi-million-row export takes longer than any request should, so
+besides the streamed GET /contacts/export there is a job API:
+
+    POST   /contacts/export/jobs                  queue an export (202)
+    GET    /contacts/export/jobs                  the user's jobs
+    GET    /contacts/export/jobs/{id}             status and progress
+    GET    /contacts/export/jobs/{id}/download    the file (Range requests)
+    DELETE /contacts/export/jobs/{id}             cancel / delete
+
+Jobs live in the `export_jobs` collection. ExportWorker tasks in each app
+process claim queued jobs (a compare-and-set on status, so workers of the
+same host don't run a job twice), encode the contacts with
+contact_export.py (gzip by default) and write the file chunk by chunk
+under EXPORT_DIR, renaming it into place when complete. Downloads are
+plain FileResponses, which answer `Range:` with 206 so interrupted
+downloads resume.
+
+EXPORT_DIR is a local directory, so exports are single-host: any host
+can claim a job, but only the host that wrote the file can serve or
+expire it. Run the app on one host, or mount the same EXPORT_DIR on
+every host.
+
+Exports run at low priority: after every batch the worker waits, up to
+EXPORT_MAX_PAUSE seconds, while interactive requests are in flight. A
+running job records a heartbeat; jobs whose worker died are claimed again
+after EXPORT_STALE_AFTER seconds. Finished files are deleted after
+EXPORT_TTL_HOURS.
+"""
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+
+import repositories
+from contact_export import FORMATS, check_options, encode, filename, gzip_chunks, projection
+from database import get_async_collection
+
+JOBS_COLLECTION = "export_jobs"
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "1"))
+EXPORT_MAX_PAUSE = float(os.getenv("EXPORT_MAX_PAUSE", "1"))
+EXPORT_STALE_AFTER = float(os.getenv("EXPORT_STALE_AFTER", "120"))
+EXPORT_TTL_HOURS = float(os.getenv("EXPORT_TTL_HOURS", "24"))
+# Documents between progress updates / priority checks
+BATCH_SIZE = 1000
+# Documents encoded before the event loop gets a turn
+YIELD_EVERY = 100
+# Seconds an idle worker waits for a job submitted by another process
+POLL_INTERVAL = 2.0
+
+ACTIVE = ("queued", "running")
+PUBLIC_FIELDS = (
+    "id", "status", "format", "compression", "processed", "total", "size",
+    "filename", "error", "createdAt", "startedAt", "finishedAt",
+)
+
+
+class _Cancelled(Exception):
+    pass
+
+
+def file_path(job: Dict[str, Any]) -> str:
+    ext = FORMATS[job["format"]][1] + (".gz" if job.get("compression") == "gzip" else "")
+    return os.path.join(EXPORT_DIR, f"{job['id']}.{ext}")
+
+
+def job_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Job as returned by the API, with progress and the download URL once done"""
+    view = {field: job.get(field) for field in PUBLIC_FIELDS}
+    total, processed = job.get("total"), job.get("processed") or 0
+    if job["status"] == "done":
+        view["progress"] = 100.0
+        view["downloadUrl"] = f"/contacts/export/jobs/{job['id']}/download"
+    else:
+        view["progress"] = round(100.0 * processed / total, 1) if total else 0.0
+    return view
+
+
+def _collection():
+    return get_async_collection(JOBS_COLLECTION)
+
+
+async def get_job(job_id: str, user_id: str) -> Dict[str, Any]:
+    """The user's job (404 otherwise)"""
+    job = await _collection().find_one({"id": job_id, "user_id": user_id}, {"_id": 0})
+    if job is None:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return job
+
+
+async def list_jobs(user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+    jobs = await (
+        _collection().find({"user_id": user_id}, {"_id": 0})
+        .sort("createdAt", -1)
+        .limit(limit)
+        .to_list(length=None)
+    )
+    return [job_view(job) for job in jobs]
+
+
+async def delete_job(job_id: str, user_id: str):
+    """Cancel a queued or running job, or delete a finished one and its file"""
+    job = await get_job(job_id, user_id)
+    # A running worker notices at its next checkpoint and removes its file
+    await _collection().delete_one({"id": job_id})
+    if job["status"] not in ACTIVE:
+        _remove(file_path(job))
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class ExportWorker:
+    """Runs export jobs in the app process, yielding to interactive requests"""
+
+    def __init__(self, is_busy: Callable[[], bool] = lambda: False):
+        self.is_busy = is_busy
+        self._tasks: List[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._last_expiry = 0.0
+
+    def start(self):
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(EXPORT_WORKERS)]
+
+    async def stop(self):
+        """Stop the workers; an interrupted job is picked up again once it goes stale"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, user_id: str, format: str = "csv", compression: Optional[str] = "gzip") -> Dict[str, Any]:
+        check_options(format, compression)
+        job = {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "status": "queued",
+            "format": format,
+            "compression": compression or None,
+            "processed": 0,
+            "total": None,
+            "size": None,
+            "filename": filename(format, compression),
+            "error": None,
+            "createdAt": datetime.now().isoformat(),
+            "startedAt": None,
+            "finishedAt": None,
+            "heartbeat": None,
+        }
+        await _collection().insert_one(dict(job))
+        if self._wake is not None:
+            self._wake.set()
+        return job
+
+    async def _run(self):
+        while True:
+            try:
+                job = await self._claim()
+                if job is None:
+                    await self._expire()
+                    self._wake.clear()
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._export(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # e.g. the database is briefly unavailable: retry later
+                print(f"⚠️  Export worker error: {e}")
+                await asyncio.sleep(POLL_INTERVAL)
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        """Take the oldest queued (or abandoned) job; None if there is none"""
+        stale = time.time() - EXPORT_STALE_AFTER
+        candidates = await (
+            _collection().find({"$or": [
+                {"status": "queued"},
+                {"status": "running", "heartbeat": {"$lt": stale}},
+            ]}, {"_id": 0})
+            .sort("createdAt", 1)
+            .limit(10)
+            .to_list(length=None)
+        )
+        for job in candidates:
+            now = time.time()
+            # Compare-and-set: only one worker wins the job
+            result = await _collection().update_one(
+                {"id": job["id"], "status": job["status"], "heartbeat": job.get("heartbeat")},
+                {"$set": {"status": "running", "heartbeat": now, "processed": 0,
+                          "startedAt": datetime.now().isoformat()}},
+            )
+            if result.modified_count:
+                job.update(status="running", heartbeat=now, processed=0)
+                return job
+        return None
+
+    async def _checkpoint(self, job: Dict[str, Any], update: Dict[str, Any]):
+        """Record progress; raises _Cancelled if the job was cancelled meanwhile"""
+        result = await _collection().update_one(
+            {"id": job["id"], "status": "running"},
+            {"$set": {**update, "heartbeat": time.time()}},
+        )
+        if not result.matched_count:
+            raise _Cancelled()
+
+    async def _yield_to_requests(self):
+        """Low priority: let in-flight requests run before the next batch"""
+        await asyncio.sleep(0)
+        deadline = time.monotonic() + EXPORT_MAX_PAUSE
+        while self.is_busy() and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+
+    async def _export(self, job: Dict[str, Any]):
+        path = file_path(job)
+        part = path + ".part"
+        query = {"user_id": job["user_id"]}
+        processed = 0
+        print(f"📤 Export {job['id']} started")
+        try:
+            total, _ = await repositories.contacts.count(query)
+            await self._checkpoint(job, {"total": total})
+
+            async def docs():
+                nonlocal processed
+                cursor = repositories.contacts.collection.find(query, projection(job["format"]))
+                async for doc in cursor.batch_size(BATCH_SIZE):
+                    yield doc
+                    processed += 1
+                    if processed % BATCH_SIZE == 0:
+                        await self._checkpoint(job, {"processed": processed})
+                        await self._yield_to_requests()
+                    elif processed % YIELD_EVERY == 0:
+                        await asyncio.sleep(0)
+
+            chunks = encode(docs(), job["format"])
+            if job.get("compression") == "gzip":
+                chunks = gzip_chunks(chunks)
+            with open(part, "wb") as f:
+                async for chunk in chunks:
+                    # Chunks go to disk off the event loop
+                    await asyncio.to_thread(f.write, chunk)
+            os.replace(part, path)
+            await self._checkpoint(job, {
+                "status": "done", "processed": processed, "size": os.path.getsize(path),
+                "finishedAt": datetime.now().isoformat(),
+            })
+            print(f"📤 Export {job['id']} done: {processed} contacts")
+        except _Cancelled:
+            _remove(part)
+            _remove(path)
+            print(f"📤 Export {job['id']} cancelled")
+        except asyncio.CancelledError:
+            _remove(part)
+            raise
+        except Exception as e:
+            _remove(part)
+            print(f"❌ Export {job['id']} failed: {e}")
+            await _collection().update_one(
+                {"id": job["id"], "status": "running"},
+                {"$set": {"status": "failed", "error": str(e), "finishedAt": datetime.now().isoformat()}},
+            )
+
+    async def _expire(self):
+        """Delete finished jobs (and files) older than EXPORT_TTL_HOURS, once a minute"""
+        if time.monotonic() - self._last_expiry < 60:
+            return
+        self._last_expiry = time.monotonic()
+        cutoff = (datetime.now() - timedelta(hours=EXPORT_TTL_HOURS)).isoformat()
+        expired = await _collection().find(
+            {"status": {"$in": ["done", "failed"]}, "finishedAt": {"$lt": cutoff}}, {"_id": 0}
+        ).to_list(length=None)
+        for job in expired:
+            _remove(file_path(job))
+        if expired:
+            await _collection().delete_many({"id": {"$in": [job["id"] for job in expired]}})
@@ -0,0 +1,425 @@
+"""
+Supervised MongoDB connection: failover to the in-memory mock and back
+
+Database.connect_async() falls back to the mock when MongoDB is
+unreachable at startup, and that process stays on the mock. Once it has
+connected, with MONGODB_FAILOVER enabled, the lifespan also starts a
+FailoverSupervisor that keeps probing the real cluster:
+
+- while MongoDB is healthy, the documents handlers read are remembered in
+  a bounded LRU cache (ReadCache); projected reads are merged by id into
+  partial documents;
+- after MONGODB_FAILOVER_THRESHOLD failed probes in a row the handlers are
+  switched to an empty mock seeded from that cache, so recently seen
+  contacts, chats and campaigns stay readable during the outage;
+- writes made while degraded go to the mock and are buffered in order;
+- once a probe succeeds the buffered writes are replayed against MongoDB
+  and the handlers are switched back to it.
+"""
+import asyncio
+import os
+from collections import OrderedDict, deque
+from typing import Any, Dict, Optional
+
+from pymongo.errors import BulkWriteError, ConnectionFailure, DuplicateKeyError, PyMongoError
+
+from mock_query import compile_query
+
+WRITE_METHODS = frozenset({
+    "insert_one", "insert_many", "update_one", "update_many",
+    "replace_one", "delete_one", "delete_many", "bulk_write",
+})
+
+
+class WriteBufferFull(ConnectionFailure):
+    """MongoDB is down and MONGODB_FAILOVER_MAX_BUFFERED_WRITES writes are already pending"""
+
+
+def _doc_key(doc) -> Optional[str]:
+    key = doc.get("id")
+    if key is None:
+        key = doc.get("_id")
+    return None if key is None else str(key)
+
+
+# Fields every cached document needs to be found again in the mock:
+# handlers look documents up by id and scope them by user_id
+CACHE_KEY_FIELDS = ("id", "user_id")
+
+
+def _projection(args, kwargs):
+    return args[1] if len(args) > 1 else kwargs.get("projection")
+
+
+def _with_projection(args, kwargs, projection):
+    if len(args) > 1:
+        return (args[0], projection, *args[2:]), kwargs
+    return args, {**kwargs, "projection": projection}
+
+
+def _cache_projection(projection):
+    """(projection to send, fields added to it, whether documents come back whole)
+
+    Inclusion projections are widened with CACHE_KEY_FIELDS so the partial
+    documents can be cached; the added fields are removed from the results.
+    None instead of the projection: don't cache (projection operators).
+    """
+    if projection is None:
+        return None, (), True
+    if not isinstance(projection, dict):
+        projection = {name: 1 for name in projection}
+    if any(isinstance(value, dict) for value in projection.values()):
+        return None, (), False
+    if not any(value for name, value in projection.items() if name != "_id"):
+        # Exclusion ({"_id": 0}): everything else comes back
+        return projection, (), True
+    added = tuple(name for name in CACHE_KEY_FIELDS if name not in projection)
+    return {**projection, **{name: 1 for name in added}}, added, False
+
+
+def _merge(cached: dict, doc: dict) -> dict:
+    merged = dict(cached)
+    for name, value in doc.items():
+        if isinstance(value, dict) and isinstance(merged.get(name), dict):
+            # Projected sub-fields ("a.b") come back as partial subdocuments
+            value = _merge(merged[name], value)
+        merged[name] = value
+    return merged
+
+
+def _query_fields(query) -> set:
+    fields = set()
+    for name, value in query.items():
+        if name in ("$and", "$or", "$nor") and isinstance(value, list):
+            for clause in value:
+                if isinstance(clause, dict):
+                    fields |= _query_fields(clause)
+        elif not name.startswith("$"):
+            fields.add(name.split(".")[0])
+    return fields
+
+
+class ReadCache:
+    """Bounded LRU of documents read from MongoDB, keyed by (collection, id)
+
+    Reads with a projection return partial documents; those are merged into
+    the cached document with the same id, so list views and detail views
+    of the same contact add up to one (possibly still partial) document.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._docs: "OrderedDict[tuple, dict]" = OrderedDict()
+        # Keys of documents only seen through projections
+        self._partial: set = set()
+
+    def __len__(self):
+        return len(self._docs)
+
+    @property
+    def partial(self) -> int:
+        return len(self._partial)
+
+    def items(self):
+        return list(self._docs.items())
+
+    def add(self, name: str, docs, complete: bool = True):
+        if not self.capacity:
+            return
+        for doc in docs:
+            key = _doc_key(doc)
+            if key is None:
+                continue
+            key = (name, key)
+            if complete:
+                self._docs[key] = dict(doc)
+                self._partial.discard(key)
+            elif key in self._docs:
+                self._docs[key] = _merge(self._docs[key], doc)
+            else:
+                self._docs[key] = _merge({}, doc)
+                self._partial.add(key)
+            self._docs.move_to_end(key)
+        while len(self._docs) > self.capacity:
+            key, _ = self._docs.popitem(last=False)
+            self._partial.discard(key)
+
+    def discard(self, name: str, query):
+        """Forget cached documents a write may have changed"""
+        if not isinstance(query, dict):
+            # bulk_write op lists: drop the collection's entries
+            keys = [key for key in self._docs if key[0] == name]
+        elif isinstance(query.get("id"), str):
+            keys = [(name, query["id"])]
+        else:
+            matches = compile_query(query)
+            fields = _query_fields(query)
+            # A partial document without the queried fields might match too
+            keys = [
+                key for key, doc in self._docs.items()
+                if key[0] == name and (matches(doc) or (key in self._partial and not fields <= doc.keys()))
+            ]
+        for key in keys:
+            self._docs.pop(key, None)
+            self._partial.discard(key)
+
+
+def _written(attr, args, kwargs):
+    """What a write touches, for ReadCache.discard(): its filter, the inserted
+    documents' ids, or the bulk_write op list"""
+    if attr == "insert_one":
+        return args[0] if args else kwargs.get("document")
+    if attr == "insert_many":
+        documents = args[0] if args else kwargs.get("documents", ())
+        return {"id": {"$in": [doc["id"] for doc in documents if "id" in doc]}}
+    return args[0] if args else kwargs.get("filter", kwargs.get("requests"))
+
+
+def _strip(docs, added):
+    for doc in docs:
+        for name in added:
+            doc.pop(name, None)
+    return docs
+
+
+class _CachingCursor:
+    def __init__(self, cursor, name: str, cache: ReadCache, added=(), complete: bool = True):
+        self._cursor = cursor
+        self._name = name
+        self._cache = cache
+        self._added = added
+        self._complete = complete
+
+    def sort(self, *args, **kwargs):
+        self._cursor.sort(*args, **kwargs)
+        return self
+
+    def skip(self, n):
+        self._cursor.skip(n)
+        return self
+
+    def limit(self, n):
+        self._cursor.limit(n)
+        return self
+
+    def batch_size(self, n):
+        self._cursor.batch_size(n)
+        return self
+
+    async def to_list(self, length=None):
+        docs = await self._cursor.to_list(length)
+        self._cache.add(self._name, docs, self._complete)
+        return _strip(docs, self._added)
+
+    async def _iterate(self):
+        async for doc in self._cursor:
+            self._cache.add(self._name, (doc,), self._complete)
+            yield _strip((doc,), self._added)[0]
+
+    def __aiter__(self):
+        return self._iterate()
+
+
+class CachingCollection:
+    """Motor collection that records what it reads (and inserts) in the ReadCache"""
+
+    def __init__(self, collection, cache: ReadCache):
+        self._collection = collection
+        self._cache = cache
+        self.name = collection.name
+
+    def find(self, *args, **kwargs):
+        projection, added, complete = _cache_projection(_projection(args, kwargs))
+        if projection is None and not complete:
+            return self._collection.find(*args, **kwargs)
+        if added:
+            args, kwargs = _with_projection(args, kwargs, projection)
+        return _CachingCursor(self._collection.find(*args, **kwargs), self.name, self._cache, added, complete)
+
+    async def find_one(self, *args, **kwargs):
+        projection, added, complete = _cache_projection(_projection(args, kwargs))
+        if projection is None and not complete:
+            return await self._collection.find_one(*args, **kwargs)
+        if added:
+            args, kwargs = _with_projection(args, kwargs, projection)
+        doc = await self._collection.find_one(*args, **kwargs)
+        if doc is not None:
+            self._cache.add(self.name, (doc,), complete)
+            _strip((doc,), added)
+        return doc
+
+    async def insert_one(self, document, *args, **kwargs):
+        result = await self._collection.insert_one(document, *args, **kwargs)
+        self._cache.add(self.name, (document,))
+        return result
+
+    async def insert_many(self, documents, *args, **kwargs):
+        documents = list(documents)
+        result = await self._collection.insert_many(documents, *args, **kwargs)
+        self._cache.add(self.name, documents)
+        return result
+
+    def __getattr__(self, attr):
+        method = getattr(self._collection, attr)
+        if attr not in WRITE_METHODS:
+            return method
+
+        async def call(*args, **kwargs):
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                self._cache.discard(self.name, _written(attr, args, kwargs))
+
+        return call
+
+
+class JournalingCollection:
+    """Mock collection that buffers successful writes for replay against MongoDB"""
+
+    def __init__(self, collection, supervisor: "FailoverSupervisor"):
+        self._collection = collection
+        self._supervisor = supervisor
+        self.name = collection.name
+
+    def find(self, *args, **kwargs):
+        return self._collection.find(*args, **kwargs)
+
+    def __getattr__(self, attr):
+        method = getattr(self._collection, attr)
+        if attr not in WRITE_METHODS:
+            return method
+        supervisor = self._supervisor
+
+        async def call(*args, **kwargs):
+            if not supervisor.degraded:
+                # Handle fetched before the switch back: write to MongoDB,
+                # through the cache like any other handle
+                collection = CachingCollection(supervisor.database.get_async_database()[self.name], supervisor.cache)
+                return await getattr(collection, attr)(*args, **kwargs)
+            # What was cached before the outage is stale once the write is replayed
+            supervisor.cache.discard(self.name, _written(attr, args, kwargs))
+            if len(supervisor.buffered) >= supervisor.max_buffered:
+                raise WriteBufferFull(f"{len(supervisor.buffered)} writes already waiting for MongoDB")
+            try:
+                result = await method(*args, **kwargs)
+            except BulkWriteError:
+                # Partly applied to the mock; replaying repeats the same outcome
+                supervisor.buffered.append((self.name, attr, args, kwargs))
+                raise
+            supervisor.buffered.append((self.name, attr, args, kwargs))
+            return result
+
+        return call
+
+
+class FailoverSupervisor:
+    """Background health probe that moves the app between MongoDB and the mock"""
+
+    def __init__(self, database, client):
+        self.database = database
+        # Real Motor client, kept while degraded so it can reconnect
+        self.client = client
+        self.degraded = False
+        self.interval = float(os.getenv("MONGODB_HEALTH_INTERVAL", "5"))
+        self.threshold = int(os.getenv("MONGODB_FAILOVER_THRESHOLD", "2"))
+        self.max_buffered = int(os.getenv("MONGODB_FAILOVER_MAX_BUFFERED_WRITES", "10000"))
+        self.cache = ReadCache(int(os.getenv("MONGODB_FAILOVER_CACHE_SIZE", "10000")))
+        self.buffered: deque = deque()
+        self.failures = 0
+        self.failovers = 0
+        self.recoveries = 0
+        self.replayed = 0
+        # Buffered writes MongoDB rejected on replay (e.g. duplicate keys)
+        self.rejected = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def wrap(self, name: str, collection):
+        if self.degraded:
+            return JournalingCollection(collection, self)
+        return CachingCollection(collection, self.cache)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.wait_for(self.client.admin.command('ping'), self.interval)
+            except Exception as e:
+                self.failures += 1
+                if not self.degraded and self.failures >= self.threshold:
+                    self.demote(e)
+                continue
+            self.failures = 0
+            if self.degraded:
+                try:
+                    await self.promote()
+                except Exception as e:
+                    print(f"⚠️  Switching back to MongoDB failed, staying on the mock: {e}")
+
+    def demote(self, error: Exception):
+        """Serve from a mock seeded with the cached documents"""
+        from mock_db import MockClient, AsyncMockClient
+        from indexes import ensure_indexes
+
+        print(f"⚠️  MongoDB unreachable after {self.failures} probes: {error}")
+        mock = MockClient(seed=False)
+        db = mock["mock"]
+        ensure_indexes(db)
+        for (name, _), doc in self.cache.items():
+            try:
+                db[name].insert_one(dict(doc))
+            except DuplicateKeyError:
+                pass
+        self.degraded = True
+        self.failovers += 1
+        self.database._swap_clients(mock, AsyncMockClient(mock))
+        print(f"⚠️  Switched to MOCK DATABASE with {len(self.cache)} cached documents")
+
+    async def promote(self):
+        """Replay buffered writes in order, then hand the handlers back to MongoDB"""
+        db = self.client[os.getenv("MONGODB_DB_NAME", "whatsapp_business")]
+        while self.buffered:
+            name, method, args, kwargs = self.buffered[0]
+            try:
+                await getattr(db[name], method)(*args, **kwargs)
+                self.replayed += 1
+            except ConnectionFailure:
+                raise  # down again: keep the rest buffered
+            except PyMongoError as e:
+                self.rejected += 1
+                print(f"⚠️  MongoDB rejected buffered {name}.{method}: {e}")
+            self.buffered.popleft()
+
+        # No await between the empty buffer check and the switch, so no
+        # degraded write can slip in between
+        mock = self.database.client
+        self.degraded = False
+        self.recoveries += 1
+        self.database._swap_clients(None, self.client)
+        if mock is not None:
+            mock.close()
+        print(f"✅ MongoDB is back, switched from the mock ({self.replayed} buffered writes replayed so far)")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": "degraded" if self.degraded else "primary",
+            "failovers": self.failovers,
+            "recoveries": self.recoveries,
+            "cached_documents": len(self.cache),
+            # Only seen through projected reads (list views): some fields missing
+            "partial_cached_documents": self.cache.partial,
+            "buffered_writes": len(self.buffered),
+            "replayed_writes": self.replayed,
+            "rejected_writes": self.rejected,
+        }
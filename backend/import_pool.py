@@ -0,0 +1,183 @@
+"""
+Parallel CSV parsing for contact import
+
+Parsing a CSV upload, validating rows and normalizing phones
+(contact_import.prepare_rows) is pure Python and keeps one core busy
+while the others idle. For uploads of at least two ranges, import_csv()
+splits the file into byte ranges of about IMPORT_RANGE_BYTES, each ending
+at a line break, and parses them in a ProcessPoolExecutor of
+IMPORT_WORKERS processes. Results are taken in file order and handed to
+the batched writer (contact_import.write_contacts) while later ranges
+are still being parsed.
+
+A line break inside a quoted field can end up on a range boundary.
+Ranges are parsed strictly, so the range cut inside the quotes fails;
+all ranges before it ended on a record boundary, so the rest of the file
+is imported serially from the start of that range.
+
+Every parallel import reports its stages (`stages` in the response):
+reading ranges from the upload, parsing (summed over the workers, so
+per-worker throughput) and writing.
+"""
+import asyncio
+import csv
+import io
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+
+import contact_import
+from contact_import import IMPORT_CHUNK_SIZE, ImportResult, csv_contacts, header_columns, prepare_rows, write_contacts
+from count_cache import counts
+from database import get_async_collection
+
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", str(os.cpu_count() or 1)))
+IMPORT_RANGE_BYTES = int(os.getenv("IMPORT_RANGE_BYTES", str(4 * 1024 * 1024)))
+# Ranges parsed ahead of the writer, per worker
+PREFETCH = 2
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_pool(workers: int = IMPORT_WORKERS) -> ProcessPoolExecutor:
+    """The shared worker pool, started on first use"""
+    global _pool
+    if _pool is None:
+        # Fresh interpreters: forking would copy the event loop and driver threads
+        _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def parse_range(data: bytes, columns: List[Optional[str]], user_id: str,
+                now: str) -> Tuple[List[Tuple], List[Tuple], int, float]:
+    """Worker: parse and prepare a byte range of records (rows numbered from 0)
+
+    Returns prepare_rows()'s candidates and skipped rows, the number of
+    rows and the seconds spent. csv.Error if the range ends inside quotes.
+    """
+    started = time.perf_counter()
+    records = csv.reader(io.StringIO(data.decode("utf-8"), newline=""), strict=True)
+    rows = list(csv_contacts(records, columns))
+    candidates, skipped = prepare_rows(rows, 0, user_id, now)
+    return candidates, skipped, len(rows), time.perf_counter() - started
+
+
+def read_header(file: BinaryIO) -> List[Optional[str]]:
+    line = file.readline().decode("utf-8-sig")
+    return header_columns(next(csv.reader([line]), None))
+
+
+def read_range(file: BinaryIO, size: int = IMPORT_RANGE_BYTES) -> Tuple[int, bytes]:
+    """(offset, bytes) of the next ~`size` bytes, up to the end of a line"""
+    offset = file.tell()
+    data = file.read(size)
+    if data and not data.endswith(b"\n"):
+        data += file.readline()
+    return offset, data
+
+
+def _file_size(file: BinaryIO) -> int:
+    size = file.seek(0, os.SEEK_END)
+    file.seek(0)
+    return size
+
+
+def _stage(seconds: float, rows: int) -> Dict[str, Any]:
+    return {"seconds": round(seconds, 3), "rowsPerSecond": round(rows / seconds) if seconds else None}
+
+
+async def import_csv(user_id: str, file: BinaryIO, result: Optional[ImportResult] = None,
+                     workers: Optional[int] = None) -> ImportResult:
+    """Import an uploaded CSV file, parsing it in worker processes when it is large enough"""
+    result = result if result is not None else ImportResult()
+    workers = IMPORT_WORKERS if workers is None else workers
+    size = await asyncio.to_thread(_file_size, file)
+    if workers <= 1 or size < 2 * IMPORT_RANGE_BYTES:
+        return await contact_import.import_contacts(user_id, contact_import.read_csv(file), result=result)
+
+    columns = await asyncio.to_thread(read_header, file)
+    collection = get_async_collection("contacts")
+    pool = get_pool(workers)
+    loop = asyncio.get_running_loop()
+    now = datetime.now().isoformat()
+    seconds = {"read": 0.0, "parse": 0.0, "write": 0.0}
+    started = time.perf_counter()
+    rows = written = 0
+    pending = deque()
+    eof = False
+    try:
+        while True:
+            while not eof and len(pending) < workers * PREFETCH:
+                t = time.perf_counter()
+                offset, data = await asyncio.to_thread(read_range, file, IMPORT_RANGE_BYTES)
+                seconds["read"] += time.perf_counter() - t
+                if not data:
+                    eof = True
+                    break
+                pending.append((offset, loop.run_in_executor(pool, parse_range, data, columns, user_id, now)))
+            if not pending:
+                break
+            offset, future = pending.popleft()
+            try:
+                candidates, skipped, count, parse_seconds = await future
+            except csv.Error:
+                # A quoted line break at the end of this range: go on serially from its start
+                for _, other in pending:
+                    other.cancel()
+                pending.clear()
+                print(f"📥 Import of {user_id}: quoted line break at byte {offset}, parsing the rest serially")
+                await asyncio.to_thread(file.seek, offset)
+                t = time.perf_counter()
+                before = result.imported + result.skipped
+                await contact_import.import_contacts(
+                    user_id, contact_import.read_csv(file, columns=columns), result=result, start=rows
+                )
+                seconds["serial"] = time.perf_counter() - t
+                rows += result.imported + result.skipped - before
+                break
+
+            seconds["parse"] += parse_seconds
+            for row, contact_data, reason in skipped:
+                result.skip(rows + row, contact_data, reason)
+            t = time.perf_counter()
+            imported = result.imported
+            for start in range(0, len(candidates), IMPORT_CHUNK_SIZE):
+                batch = [(rows + row, doc) for row, doc in candidates[start:start + IMPORT_CHUNK_SIZE]]
+                await write_contacts(collection, user_id, batch, result)
+            written += result.imported - imported
+            seconds["write"] += time.perf_counter() - t
+            rows += count
+    finally:
+        for _, future in pending:
+            future.cancel()
+        # The serial part adjusts its own count
+        if written:
+            counts.adjust("contacts", user_id, written)
+
+    elapsed = time.perf_counter() - started
+    result.stages = {
+        "workers": workers,
+        "rows": rows,
+        **_stage(elapsed, rows),
+        "read": {**_stage(seconds["read"], rows), "megabytesPerSecond":
+                 round(size / 2**20 / seconds["read"], 1) if seconds["read"] else None},
+        "parse": _stage(seconds["parse"], rows),
+        "write": _stage(seconds["write"], rows),
+    }
+    if "serial" in seconds:
+        result.stages["serial"] = {"seconds": round(seconds["serial"], 3)}
+    print(f"📥 Imported {result.imported} contacts for {user_id} with {workers} workers in {elapsed:.1f}s: "
+          f"parse {result.stages['parse']['rowsPerSecond']} rows/s per worker, "
+          f"write {result.stages['write']['rowsPerSecond']} rows/s")
+    return result
@@ -0,0 +1,216 @@
+"""
+Declared MongoDB indexes for the WhatsApp Business collections
+
+Indexes are ensured at startup by Database.connect_async() (app lifespan)
+and Database.connect() (scripts). Run
+
+    python indexes.py report
+
+to compare the declared spec with the live indexes, their usage
+($indexStats) and the query plans of the hot queries in main.py.
+"""
+from typing import Dict, List, Any
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+# Index spec per collection. Each entry is passed to create_index().
+INDEX_SPECS: Dict[str, List[Dict[str, Any]]] = {
+    "contacts": [
+        # Duplicate checks in create_contact / import_contacts, on the E.164 key
+        # (phone_utils.py); rows without a valid phone are left out
+        {"keys": [("user_id", ASCENDING), ("phoneE164", ASCENDING)], "name": "user_phone_e164_unique", "unique": True,
+         "partialFilterExpression": {"phoneE164": {"$type": "string"}}},
+        # get/update/delete contact and bulk operations
+        {"keys": [("id", ASCENDING), ("user_id", ASCENDING)], "name": "id_user"},
+        # Dashboard stats and status filter on /contacts
+        {"keys": [("user_id", ASCENDING), ("status", ASCENDING)], "name": "user_status"},
+        # /contacts sorts; the trailing id makes them keyset pagination indexes
+        {"keys": [("user_id", ASCENDING), ("name", ASCENDING), ("id", ASCENDING)], "name": "user_name_id"},
+        {"keys": [("user_id", ASCENDING), ("createdAt", ASCENDING), ("id", ASCENDING)], "name": "user_created_id"},
+        {"keys": [("user_id", ASCENDING), ("lastMessageTime", ASCENDING), ("id", ASCENDING)], "name": "user_last_message_id"},
+        # Inbound webhook and chat history lookups (not tenant scoped)
+        {"keys": [("phoneE164", ASCENDING)], "name": "phone_e164"},
+        # The same lookups for phones without an E.164 key, on the raw text
+        {"keys": [("phone", ASCENDING), ("user_id", ASCENDING)], "name": "phone_user"},
+    ],
+    "contact_search": [
+        # Search tokens (search_index.py): covered tier lookups ordered by name
+        {"keys": [("user_id", ASCENDING), ("t", ASCENDING), ("name", ASCENDING), ("id", ASCENDING)],
+         "name": "user_token_name_id"},
+        {"keys": [("id", ASCENDING)], "name": "id_unique", "unique": True},
+    ],
+    "messages": [
+        # Chat history, sorted by timestamp
+        {"keys": [("phoneE164", ASCENDING), ("timestamp", ASCENDING)], "name": "phone_e164_timestamp"},
+        # Dashboard stats
+        {"keys": [("user_id", ASCENDING)], "name": "user"},
+    ],
+    "campaigns": [
+        {"keys": [("id", ASCENDING), ("user_id", ASCENDING)], "name": "id_user"},
+        {"keys": [("user_id", ASCENDING), ("status", ASCENDING)], "name": "user_status"},
+    ],
+    "templates": [
+        {"keys": [("id", ASCENDING), ("user_id", ASCENDING)], "name": "id_user"},
+        # Duplicate name check in create_template
+        {"keys": [("user_id", ASCENDING), ("name", ASCENDING)], "name": "user_name"},
+    ],
+    "agents": [
+        {"keys": [("id", ASCENDING), ("user_id", ASCENDING)], "name": "id_user"},
+        # Active agents lookup in the inbound webhook
+        {"keys": [("user_id", ASCENDING), ("status", ASCENDING)], "name": "user_status"},
+    ],
+    "agent_logs": [
+        {"keys": [("contactId", ASCENDING), ("timestamp", DESCENDING)], "name": "contact_timestamp"},
+    ],
+    "export_jobs": [
+        {"keys": [("id", ASCENDING)], "name": "id_unique", "unique": True},
+        # Worker claims: oldest queued or abandoned job
+        {"keys": [("status", ASCENDING), ("createdAt", ASCENDING)], "name": "status_created"},
+        {"keys": [("user_id", ASCENDING), ("createdAt", DESCENDING)], "name": "user_created"},
+    ],
+    "users": [
+        {"keys": [("id", ASCENDING)], "name": "id_unique", "unique": True},
+    ],
+    # Completed data migrations (phone_utils.backfill_all)
+    "migrations": [
+        {"keys": [("id", ASCENDING)], "name": "id_unique", "unique": True},
+    ],
+}
+
+# Representative shapes of the hot queries in main.py, used by the report
+# to flag collection scans: (collection, filter, sort)
+HOT_QUERIES = [
+    ("contacts", {"user_id": "default_user", "phoneE164": "+15551234567"}, None),
+    ("contacts", {"id": "1", "user_id": "default_user"}, None),
+    ("contacts", {"user_id": "default_user"}, [("name", ASCENDING)]),
+    ("contacts", {"user_id": "default_user", "$or": [{"name": {"$gt": "M"}}, {"name": "M", "id": {"$gt": "1"}}]},
+     [("name", ASCENDING), ("id", ASCENDING)]),
+    ("contacts", {"user_id": "default_user"}, [("createdAt", DESCENDING), ("id", DESCENDING)]),
+    ("contacts", {"user_id": "default_user", "status": "Active"}, None),
+    ("contacts", {"phoneE164": "+15551234567"}, None),
+    ("contacts", {"phone": "911", "user_id": "default_user"}, None),
+    ("contact_search", {"user_id": "default_user", "t": "w:sar"}, [("name", ASCENDING)]),
+    ("messages", {"phoneE164": "+15551234567"}, [("timestamp", ASCENDING)]),
+    ("messages", {"user_id": "default_user"}, None),
+    ("campaigns", {"user_id": "default_user"}, None),
+    ("templates", {"id": "1"}, None),
+    ("agents", {"user_id": "default_user", "status": "active"}, None),
+]
+
+
+def _declared():
+    for collection_name, specs in INDEX_SPECS.items():
+        for spec in specs:
+            yield collection_name, spec, {k: v for k, v in spec.items() if k != "keys"}
+
+
+def ensure_indexes(db) -> None:
+    """Create any missing declared indexes (no-op for existing ones)"""
+    for collection_name, spec, options in _declared():
+        try:
+            db[collection_name].create_index(spec["keys"], **options)
+        except OperationFailure as e:
+            # e.g. existing duplicates violate a unique index - keep serving
+            print(f"⚠️  Could not create index {collection_name}.{spec['name']}: {e}")
+
+
+async def ensure_indexes_async(db) -> None:
+    """ensure_indexes() for a Motor (or async mock) database"""
+    for collection_name, spec, options in _declared():
+        try:
+            await db[collection_name].create_index(spec["keys"], **options)
+        except OperationFailure as e:
+            print(f"⚠️  Could not create index {collection_name}.{spec['name']}: {e}")
+
+
+def _winning_stages(plan: Dict[str, Any]) -> List[str]:
+    """Flatten the stage names of an explain() winning plan"""
+    stages = []
+    while plan:
+        stages.append(plan.get("stage", "?"))
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return stages
+
+
+def index_report(db) -> Dict[str, Any]:
+    """Compare declared indexes with live ones and explain the hot queries"""
+    report = {"collections": {}, "queries": []}
+
+    for collection_name, specs in INDEX_SPECS.items():
+        collection = db[collection_name]
+        live = collection.index_information()
+        live_keys = {name: [tuple(k) for k in info["key"]] for name, info in live.items()}
+
+        try:
+            usage = {s["name"]: s["accesses"]["ops"] for s in collection.aggregate([{"$indexStats": {}}])}
+        except OperationFailure:
+            usage = {}
+
+        declared = {spec["name"]: [tuple(k) for k in spec["keys"]] for spec in specs}
+        report["collections"][collection_name] = {
+            "missing": [name for name, keys in declared.items() if keys not in live_keys.values()],
+            "undeclared": [name for name, keys in live_keys.items()
+                           if name != "_id_" and keys not in declared.values()],
+            "usage": usage,
+            "unused": [name for name in declared if usage.get(name) == 0],
+        }
+
+    for collection_name, query, sort in HOT_QUERIES:
+        command = {"find": collection_name, "filter": query}
+        if sort:
+            command["sort"] = dict(sort)
+        explain = db.command("explain", command, verbosity="queryPlanner")
+        stages = _winning_stages(explain["queryPlanner"]["winningPlan"])
+        report["queries"].append({
+            "collection": collection_name,
+            "filter": query,
+            "sort": sort,
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages,
+        })
+
+    return report
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print("📇 Declared vs live indexes")
+    for collection_name, info in report["collections"].items():
+        print(f"  {collection_name}")
+        for name in info["missing"]:
+            print(f"    ❌ missing: {name}")
+        for name in info["undeclared"]:
+            print(f"    ➕ not declared: {name}")
+        for name, ops in sorted(info["usage"].items()):
+            print(f"    {name}: {ops} ops")
+        for name in info["unused"]:
+            print(f"    ⚠️  unused since server start: {name}")
+
+    print()
+    print("🔍 Hot query plans")
+    for q in report["queries"]:
+        marker = "❌ COLLSCAN" if q["collscan"] else "✅"
+        print(f"  {marker} {q['collection']} {q['filter']} sort={q['sort']}: {' <- '.join(q['stages'])}")
+
+
+if __name__ == "__main__":
+    import sys
+    from database import Database
+    from mock_db import MockClient
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "report"
+    # Don't create indexes here, otherwise the report can never show drift
+    Database.connect(ensure_indexes=False)
+
+    if isinstance(Database.client, MockClient):
+        print("❌ Index commands need a real MongoDB connection.")
+        exit(1)
+
+    db = Database.get_database()
+    if command == "ensure":
+        ensure_indexes(db)
+        print("✅ Indexes ensured")
+    elif command == "report":
+        print_report(index_report(db))
+    else:
+        print("Usage: python indexes.py [ensure|report]")
+        exit(1)
@@ -0,0 +1,40 @@
+"""
+Application lifespan helpers: in-flight request tracking and shutdown drain
+"""
+import asyncio
+
+
+class InFlightTracker:
+    """Counts HTTP requests in progress so shutdown can wait for them"""
+
+    def __init__(self):
+        self.active = 0
+
+    async def drain(self, timeout: float) -> int:
+        """Wait up to `timeout` seconds for in-flight requests; returns how many are left"""
+        if self.active:
+            print(f"⏳ Draining {self.active} in-flight requests")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self.active and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+        if self.active:
+            print(f"⚠️  {self.active} requests still running after {timeout:.0f}s")
+        return self.active
+
+
+class InFlightMiddleware:
+    """Plain ASGI middleware (no per-request task like BaseHTTPMiddleware)"""
+
+    def __init__(self, app, tracker: InFlightTracker):
+        self.app = app
+        self.tracker = tracker
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        self.tracker.active += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.tracker.active -= 1
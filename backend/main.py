@@ -1,38 +1,94 @@
-from fastapi import FastAPI, HTTPException, Depends, Header
+from fastapi import FastAPI, HTTPException, Depends, Header, File, UploadFile
+from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Optional, Dict, Any, List
 import os
 from dotenv import load_dotenv
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
-from bson import ObjectId
+import asyncio
+import csv
 import uuid
+from database import (
+    Database,
+    get_async_agent_logs_collection,
+    get_async_agents_collection,
+    get_async_campaigns_collection,
+    get_async_contacts_collection,
+    get_async_messages_collection,
+    get_async_templates_collection,
+    get_async_users_collection,
+)
+from lifecycle import InFlightTracker, InFlightMiddleware
+import repositories
+import search_index
+from count_cache import counts, page_totals
+from bloom import phone_filters
+from contact_export import media_type, stream_export
+import export_jobs
+import contact_import
+import import_pool
+from fastapi.responses import FileResponse
+from phone_utils import backfill_all as backfill_phone_keys, normalize_phone
+from pymongo.errors import DuplicateKeyError
+from repositories import parse_fields
+from serialization import BSONJSONResponse, BSONJSONRoute
 
 load_dotenv()
 
-app = FastAPI(title="WhatsApp Business API - Hybrid Auth (Clerk + JWT)")
+in_flight = InFlightTracker()
+# Background exports yield to interactive requests (export_jobs.py)
+export_worker = export_jobs.ExportWorker(is_busy=lambda: in_flight.active > 0)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Connect once the worker is running, drain requests before disconnecting"""
+    await Database.connect_async()
+    await search_index.ensure_built()
+    # E.164 phone keys for rows written before they existed (phone_utils.py)
+    backfill = asyncio.create_task(backfill_phone_keys())
+    export_worker.start()
+    # Phone Bloom filters for imports and the webhook (bloom.py)
+    phone_filters.start()
+    yield
+    # In-flight requests (e.g. uploads parsed in import_pool) finish first
+    await in_flight.drain(float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "10")))
+    import_pool.shutdown()
+    await export_worker.stop()
+    await phone_filters.stop()
+    backfill.cancel()
+    await asyncio.gather(backfill, return_exceptions=True)
+    await Database.close_async()
+
+
+app = FastAPI(
+    title="WhatsApp Business API - Hybrid Auth (Clerk + JWT)",
+    lifespan=lifespan,
+    default_response_class=BSONJSONResponse,
+)
+# Handler results are encoded once by orjson, without jsonable_encoder (serialization.py)
+app.router.route_class = BSONJSONRoute
+app.add_middleware(InFlightMiddleware, tracker=in_flight)
 
 # Helper function to convert MongoDB documents to JSON-safe dictionaries
 def mongo_to_dict(doc: Dict) -> Dict:
-    """Convert MongoDB document to JSON-safe dictionary"""
+    """Drop _id from a MongoDB document (or list of them), at any depth
+
+    Dicts inserted with insert_one() get an _id too, also when they are
+    nested in a response (agent logs). ObjectIds elsewhere in the document
+    are encoded by the response class (serialization.py), so only the
+    parts holding an _id are copied.
+    """
     if doc is None:
         return None
     if isinstance(doc, list):
-        return [mongo_to_dict(item) for item in doc]
+        items = [mongo_to_dict(item) for item in doc]
+        return items if any(new is not old for new, old in zip(items, doc)) else doc
     if isinstance(doc, dict):
-        result = {}
-        for key, value in doc.items():
-            if key == "_id":
-                continue  # Skip _id field
-            elif isinstance(value, ObjectId):
-                result[key] = str(value)
-            elif isinstance(value, dict):
-                result[key] = mongo_to_dict(value)
-            elif isinstance(value, list):
-                result[key] = [mongo_to_dict(item) if isinstance(item, dict) else str(item) if isinstance(item, ObjectId) else item for item in value]
-            else:
-                result[key] = value
-        return result
+        result = {key: mongo_to_dict(value) for key, value in doc.items() if key != "_id"}
+        if "_id" in doc or any(value is not doc[key] for key, value in result.items()):
+            return result
     return doc
 
 # CORS Configuration
@@ -180,6 +236,7 @@ async def health_check():
         "status": "healthy",
         "service": "WhatsApp Business API",
         "auth": "Hybrid (Clerk + JWT)",
+        "database": "mock" if Database.is_mock() else "mongodb",
         "debug_mode": DEBUG
     }
 
@@ -274,13 +331,31 @@ async def get_contacts(
     sort_order: Optional[str] = "asc",
     page: int = 1,
     limit: int = 50,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    estimate: bool = False,
     user: Dict[str, Any] = Depends(verify_jwt_auth)
 ):
-    """Get all contacts with search, filter, and sorting"""
-    from database import get_contacts_collection
-    
+    """Get all contacts with search, filter, and sorting
+
+    `fields` is an optional comma-separated subset of the list view fields.
+
+    `total` is cached until the next contact write (count_cache.py). With
+    `estimate=true` counting stops at COUNT_ESTIMATE_LIMIT: beyond it
+    `total` is a last known count (`totalEstimated`) or null, with the
+    limit in `totalAtLeast` and `pages` null.
+
+    Pass `cursor` (empty for the first page, then each response's
+    `nextCursor`) instead of `page` for keyset pagination: every page costs
+    the same however deep it is. `total` is only counted on the first page.
+
+    `search` uses the contact search index (search_index.py): name, word and
+    email prefixes and leading or trailing digits of the phone. Without a
+    cursor the results are ranked best match first instead of by `sort_by`.
+    `truncated` is true when more than search_index.MAX_RESULTS matched.
+    """
     try:
-        contacts_collection = get_contacts_collection()
+        contacts_collection = get_async_contacts_collection()
         
         if contacts_collection is None:
             raise HTTPException(status_code=503, detail="Database not available")
@@ -288,14 +363,6 @@ async def get_contacts(
         # Build query
         query = {"user_id": user["user_id"]}
         
-        # Search filter
-        if search:
-            query["$or"] = [
-                {"name": {"$regex": search, "$options": "i"}},
-                {"phone": {"$regex": search, "$options": "i"}},
-                {"email": {"$regex": search, "$options": "i"}}
-            ]
-        
         # Status filter
         if status and status != "all":
             query["status"] = status
@@ -304,33 +371,67 @@ async def get_contacts(
         if tag and tag != "all":
             query["tags"] = tag
         
-        # Count total
-        total = contacts_collection.count_documents(query)
-        
         # Sort
         sort_direction = 1 if sort_order == "asc" else -1
         sort_field = sort_by if sort_by else "name"
         
+        # Search: ranked ids from the search index
+        matches, truncated = await search_index.search(user["user_id"], search) if search else (None, False)
+        # More matches than search_index.MAX_RESULTS: only the best ones are listed
+        searched = {"truncated": truncated} if matches is not None else {}
+        if matches is not None and cursor is None:
+            skip = (page - 1) * limit
+            contacts, total = await repositories.contacts.ranked_page(
+                matches, query, skip=skip, limit=limit, fields=parse_fields(fields)
+            )
+            return {
+                "contacts": contacts,
+                "total": total,
+                "totalEstimated": False,
+                **searched,
+                "page": page,
+                "limit": limit,
+                "pages": (total + limit - 1) // limit
+            }
+        if matches is not None:
+            query["id"] = {"$in": matches}
+        
+        # Keyset pagination: no skip, no count after the first page
+        if cursor is not None:
+            contacts, next_cursor = await repositories.contacts.keyset_page(
+                query, sort_field, sort_direction, limit, cursor=cursor, fields=parse_fields(fields)
+            )
+            totals = {"total": None, "totalEstimated": False}
+            if not cursor:
+                totals = page_totals(*await repositories.contacts.count(query, estimate), limit)
+                totals.pop("pages")
+            return {
+                "contacts": contacts,
+                **totals,
+                **searched,
+                "limit": limit,
+                "nextCursor": next_cursor
+            }
+        
+        # Count total (cached)
+        total, estimated = await repositories.contacts.count(query, estimate)
+        
         # Pagination
         skip = (page - 1) * limit
         
-        # Get contacts
-        contacts_raw = list(
-            contacts_collection
-            .find(query)
-            .sort(sort_field, sort_direction)
-            .skip(skip)
-            .limit(limit)
+        # Get contacts (list view fields only, no _id)
+        contacts = await repositories.contacts.list(
+            query, sort=[(sort_field, sort_direction)], skip=skip, limit=limit, fields=parse_fields(fields)
         )
-        contacts = [mongo_to_dict(c) for c in contacts_raw]
         
         return {
             "contacts": contacts,
-            "total": total,
+            **page_totals(total, estimated, limit),
             "page": page,
-            "limit": limit,
-            "pages": (total + limit - 1) // limit
+            "limit": limit
         }
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching contacts: {e}")
         import traceback
@@ -338,21 +439,18 @@ async def get_contacts(
         raise HTTPException(status_code=500, detail=f"Failed to fetch contacts: {str(e)}")
 
 @app.get("/users")
-async def get_users(login_user: str, user: Dict[str, Any] = Depends(verify_jwt_auth)):
+async def get_users(login_user: str, fields: Optional[str] = None, user: Dict[str, Any] = Depends(verify_jwt_auth)):
     """Get all contacts for a user (legacy endpoint)"""
-    from database import get_contacts_collection
-    
     try:
-        contacts_collection = get_contacts_collection()
+        contacts_collection = get_async_contacts_collection()
         
         if contacts_collection is None:
             return []
         
         # Get contacts for this user
-        contacts_raw = list(contacts_collection.find({"user_id": login_user}))
-        contacts = [mongo_to_dict(c) for c in contacts_raw]
-        
-        return contacts
+        return await repositories.contacts.list({"user_id": login_user}, fields=parse_fields(fields))
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching contacts: {e}")
         return []
@@ -360,16 +458,14 @@ async def get_users(login_user: str, user: Dict[str, Any] = Depends(verify_jwt_a
 @app.get("/tags")
 async def get_tags(user: Dict[str, Any] = Depends(verify_jwt_auth)):
     """Get all contact tags"""
-    from database import get_contacts_collection
-    
     try:
-        contacts_collection = get_contacts_collection()
+        contacts_collection = get_async_contacts_collection()
         
         if contacts_collection is None:
             return ["VIP", "Customer", "Lead", "Prospect", "Support"]
         
-        # Get unique tags from all contacts
-        all_tags = contacts_collection.distinct("tags")
+        # Get unique tags from this user's contacts
+        all_tags = await contacts_collection.distinct("tags", {"user_id": user["user_id"]})
         
         if not all_tags:
             return ["VIP", "Customer", "Lead", "Prospect", "Support"]
@@ -382,12 +478,11 @@ async def get_tags(user: Dict[str, Any] = Depends(verify_jwt_auth)):
 @app.get("/chats/{phone_number}")
 async def get_chat_history(phone_number: str, user: Dict[str, Any] = Depends(verify_jwt_auth)):
     """Get chat history for a phone number"""
-    from database import get_messages_collection, get_contacts_collection
     from datetime import datetime
     
     try:
-        messages_collection = get_messages_collection()
-        contacts_collection = get_contacts_collection()
+        messages_collection = get_async_messages_collection()
+        contacts_collection = get_async_contacts_collection()
         
         if messages_collection is None or contacts_collection is None:
             return {
@@ -397,19 +492,19 @@ async def get_chat_history(phone_number: str, user: Dict[str, Any] = Depends(ver
             }
         
         # Get contact name
-        contact = contacts_collection.find_one({"phone": phone_number}, {"_id": 0, "name": 1})
-        contact_name = contact["name"] if contact else "Unknown"
+        contact_name = await repositories.contacts.name_for_phone(phone_number) or "Unknown"
         
         # Get messages
-        messages_raw = list(messages_collection.find({"phoneNumber": phone_number}).sort("timestamp", 1))
-        messages = [mongo_to_dict(m) for m in messages_raw]
+        messages = await repositories.messages.history(phone_number)
         
         # If no messages, create sample conversation
         if not messages:
+            phone_key = normalize_phone(phone_number)
             sample_messages = [
                 {
                     "id": "1",
                     "phoneNumber": phone_number,
+                    "phoneE164": phone_key,
                     "text": "Hi! I'm interested in your products.",
                     "timestamp": datetime.now().isoformat(),
                     "sent": False,
@@ -418,6 +513,7 @@ async def get_chat_history(phone_number: str, user: Dict[str, Any] = Depends(ver
                 {
                     "id": "2",
                     "phoneNumber": phone_number,
+                    "phoneE164": phone_key,
                     "text": "Hello! Thank you for reaching out. How can I help you today?",
                     "timestamp": datetime.now().isoformat(),
                     "sent": True,
@@ -426,13 +522,14 @@ async def get_chat_history(phone_number: str, user: Dict[str, Any] = Depends(ver
                 {
                     "id": "3",
                     "phoneNumber": phone_number,
+                    "phoneE164": phone_key,
                     "text": "I'd like to know more about the pricing plans.",
                     "timestamp": datetime.now().isoformat(),
                     "sent": False,
                     "status": "read"
                 }
             ]
-            messages_collection.insert_many(sample_messages)
+            await messages_collection.insert_many(sample_messages)
             messages = sample_messages
         
         return {
@@ -451,7 +548,6 @@ async def get_chat_history(phone_number: str, user: Dict[str, Any] = Depends(ver
 @app.post("/send")
 async def send_message(data: dict, user: Dict[str, Any] = Depends(verify_jwt_auth)):
     """Send a message"""
-    from database import get_messages_collection
     from datetime import datetime
     import uuid
     
@@ -463,12 +559,13 @@ async def send_message(data: dict, user: Dict[str, Any] = Depends(verify_jwt_aut
         if not phone or not message:
             raise HTTPException(status_code=400, detail="Phone and message are required")
         
-        messages_collection = get_messages_collection()
+        messages_collection = get_async_messages_collection()
         
         # Create message document
         message_doc = {
             "id": str(uuid.uuid4()),
             "phoneNumber": phone,
+            "phoneE164": normalize_phone(phone),
             "text": message,
             "timestamp": datetime.now().isoformat(),
             "sent": True,
@@ -481,7 +578,7 @@ async def send_message(data: dict, user: Dict[str, Any] = Depends(verify_jwt_aut
         
         # Save to database if connected
         if messages_collection is not None:
-            messages_collection.insert_one(message_doc)
+            await messages_collection.insert_one(message_doc)
         
         # TODO: Integrate with WhatsApp Business API
         # For now, simulate sending
@@ -496,21 +593,18 @@ async def send_message(data: dict, user: Dict[str, Any] = Depends(verify_jwt_aut
         raise HTTPException(status_code=500, detail=f"Failed to send message: {str(e)}")
 
 @app.get("/campaigns")
-async def get_campaigns(user: Dict[str, Any] = Depends(verify_jwt_auth)):
-    """Get all campaigns"""
-    from database import get_campaigns_collection
-    
+async def get_campaigns(fields: Optional[str] = None, user: Dict[str, Any] = Depends(verify_jwt_auth)):
+    """Get all campaigns (`fields`: optional comma-separated subset of the list view fields)"""
     try:
-        campaigns_collection = get_campaigns_collection()
+        campaigns_collection = get_async_campaigns_collection()
         
         if campaigns_collection is None:
             return []
         
         # Get campaigns for this user
         print(f"🔍 Fetching campaigns for user_id: {user['user_id']}")
-        campaigns_raw = list(campaigns_collection.find({"user_id": user["user_id"]}))
-        print(f"📊 Found {len(campaigns_raw)} campaigns in MongoDB")
-        campaigns = [mongo_to_dict(c) for c in campaigns_raw]
+        campaigns = await repositories.campaigns.list({"user_id": user["user_id"]}, fields=parse_fields(fields))
+        print(f"📊 Found {len(campaigns)} campaigns in MongoDB")
         
         # If no campaigns, create sample data
         if not campaigns:
@@ -558,10 +652,12 @@ async def get_campaigns(user: Dict[str, Any] = Depends(verify_jwt_auth)):
                     "createdAt": "Mar 5, 2024"
                 }
             ]
-            campaigns_collection.insert_many(sample_campaigns)
+            await campaigns_collection.insert_many(sample_campaigns)
             return sample_campaigns
         
         return campaigns
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching campaigns: {e}")
         return []
@@ -578,14 +674,19 @@ async def get_templates(
     sort_order: Optional[str] = "asc",
     page: int = 1,
     limit: int = 50,
+    fields: Optional[str] = None,
+    estimate: bool = False,
     user: Dict[str, Any] = Depends(verify_jwt_auth)
 ):
-    """Get all WhatsApp templates with search and filtering"""
-    from database import get_templates_collection
+    """Get all WhatsApp templates with search and filtering
+
+    `fields` is an optional comma-separated subset of the list view fields.
+    `total` is cached as for /contacts, including `estimate=true`.
+    """
     import re
     
     try:
-        templates_collection = get_templates_collection()
+        templates_collection = get_async_templates_collection()
         
         if templates_collection is None:
             raise HTTPException(status_code=503, detail="Database not available")
@@ -613,8 +714,8 @@ async def get_templates(
         if language and language.lower() != "all":
             query["language"] = {"$regex": f"^{language}$", "$options": "i"}
         
-        # Count total
-        total = templates_collection.count_documents(query)
+        # Count total (cached)
+        total, estimated = await repositories.templates.count(query, estimate)
         
         # Sort
         sort_direction = 1 if sort_order == "asc" else -1
@@ -625,29 +726,26 @@ async def get_templates(
         
         # Get templates
         print(f"🔍 Fetching templates with query: {query}")
-        templates_raw = list(
-            templates_collection
-            .find(query)
-            .sort(sort_field, sort_direction)
-            .skip(skip)
-            .limit(limit)
+        templates = await repositories.templates.list(
+            query, sort=[(sort_field, sort_direction)], skip=skip, limit=limit, fields=parse_fields(fields)
         )
-        print(f"📊 Found {len(templates_raw)} templates in MongoDB (total: {total})")
-        templates = [mongo_to_dict(t) for t in templates_raw]
+        print(f"📊 Found {len(templates)} templates in MongoDB (total: {total})")
         
         # Extract parameters from content for each template
         for template in templates:
-            content = template.get("content", "")
-            params = re.findall(r'\{\{(\w+)\}\}', content)
+            if "content" not in template:
+                continue  # excluded by `fields`
+            params = re.findall(r'\{\{(\w+)\}\}', template["content"] or "")
             template["parameters"] = list(set(params))  # Remove duplicates
         
         return {
             "templates": templates,
-            "total": total,
+            **page_totals(total, estimated, limit),
             "page": page,
-            "limit": limit,
-            "pages": (total + limit - 1) // limit
+            "limit": limit
         }
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching templates: {e}")
         import traceback
@@ -657,16 +755,15 @@ async def get_templates(
 @app.get("/templates/{template_id}")
 async def get_template(template_id: str, user: Dict[str, Any] = Depends(verify_jwt_auth)):
     """Get a single template by ID"""
-    from database import get_templates_collection
     import re
     
     try:
-        templates_collection = get_templates_collection()
+        templates_collection = get_async_templates_collection()
         
         if templates_collection is None:
             raise HTTPException(status_code=503, detail="Database not available")
         
-        template = templates_collection.find_one({"id": template_id})
+        template = await templates_collection.find_one({"id": template_id})
         
         if not template:
             raise HTTPException(status_code=404, detail="Template not found")
@@ -687,18 +784,17 @@ async def get_template(template_id: str, user: Dict[str, Any] = Depends(verify_j
 @app.post("/templates")
 async def create_template(template: dict, user: Dict[str, Any] = Depends(verify_jwt_auth)):
     """Create a new template"""
-    from database import get_templates_collection
     import uuid
     import re
     
     try:
-        templates_collection = get_templates_collection()
+        templates_collection = get_async_templates_collection()
         
         if templates_collection is None:
             raise HTTPException(status_code=503, detail="Database not available")
         
         # Check if template with same name already exists
-        existing = templates_collection.find_one({
+        existing = await templates_collection.find_one({
             "name": template.get("name"),
             "user_id": user["user_id"]
         })
@@ -724,7 +820,8 @@ async def create_template(template: dict, user: Dict[str, Any] = Depends(verify_
             "updatedAt": datetime.now().isoformat()
         }
         
-        templates_collection.insert_one(template_doc)
+        await templates_collection.insert_one(template_doc)
+        counts.adjust("templates", user["user_id"], 1)
         
         return {"success": True, "template": mongo_to_dict(template_doc)}
     except HTTPException:
@@ -735,11 +832,10 @@ async def create_template(template: dict, user: Dict[str, Any] = Depends(verify_
 @app.put("/templates/{template_id}")
 async def update_template(template_id: str, template: dict, user: Dict[str, Any] = Depends(verify_jwt_auth)):
     """Update a template"""
-    from database import get_templates_collection
     import re
     
     try:
-        templates_collection = get_templates_collection()
+        templates_collection = get_async_templates_collection()
         
         if templates_collection is None:
             raise HTTPException(status_code=503, detail="Database not available")
@@ -753,7 +849,7 @@ async def update_template(template_id: str, template: dict, user: Dict[str, Any]
         # Add updatedAt timestamp
         update_data = {**template, "updatedAt": datetime.now().isoformat()}
         
-        result = templates_collection.update_one(
+        result = await templates_collection.update_one(
             {"id": template_id},
             {"$set": update_data}
         )
@@ -762,7 +858,8 @@ async def update_template(template_id: str, template: dict, user: Dict[str, Any]
             raise HTTPException(status_code=404, detail="Template not found")
         
         # Get updated template
-        updated_template = templates_collection.find_one({"id": template_id})
+        updated_template = await templates_collection.find_one({"id": template_id})
+        counts.invalidate("templates", updated_template.get("user_id") if updated_template else None)
         
         return {"success": True, "template": mongo_to_dict(updated_template)}
     except HTTPException:
@@ -773,18 +870,19 @@ async def update_template(template_id: str, template: dict, user: Dict[str, Any]
 @app.delete("/templates/{template_id}")
 async def delete_template(template_id: str, user: Dict[str, Any] = Depends(verify_jwt_auth)):
     """Delete a template"""
-    from database import get_templates_collection
-    
     try:
-        templates_collection = get_templates_collection()
+        templates_collection = get_async_templates_collection()
         
         if templates_collection is None:
             raise HTTPException(status_code=503, detail="Database not available")
         
-        result = templates_collection.delete_one({"id": template_id})
+        # The owner's cached totals are the ones that change
+        template = await templates_collection.find_one({"id": template_id}, {"_id": 0, "user_id": 1})
+        result = await templates_collection.delete_one({"id": template_id})
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Template not found")
+        counts.adjust("templates", (template or {}).get("user_id"), -1)
         
         return {"success": True, "message": "Template deleted"}
     except HTTPException:
@@ -795,17 +893,16 @@ async def delete_template(template_id: str, user: Dict[str, Any] = Depends(verif
 @app.post("/templates/{template_id}/use")
 async def use_template(template_id: str, parameters: dict, user: Dict[str, Any] = Depends(verify_jwt_auth)):
     """Use a template and increment usage count"""
-    from database import get_templates_collection
     import re
     
     try:
-        templates_collection = get_templates_collection()
+        templates_collection = get_async_templates_collection()
         
         if templates_collection is None:
             raise HTTPException(status_code=503, detail="Database not available")
         
         # Get template
-        template = templates_collection.find_one({"id": template_id})
+        template = await templates_collection.find_one({"id": template_id})
         
         if not template:
             raise HTTPException(status_code=404, detail="Template not found")
@@ -818,7 +915,7 @@ async def use_template(template_id: str, parameters: dict, user: Dict[str, Any]
             filled_content = re.sub(f'\\{{\\{{{key}\\}}\\}}', str(value), filled_content)
         
         # Increment usage count
-        templates_collection.update_one(
+        await templates_collection.update_one(
             {"id": template_id},
             {"$inc": {"usageCount": 1}}
         )
@@ -836,16 +933,14 @@ async def use_template(template_id: str, parameters: dict, user: Dict[str, Any]
 @app.get("/templates/categories/list")
 async def get_template_categories(user: Dict[str, Any] = Depends(verify_jwt_auth)):
     """Get all template categories"""
-    from database import get_templates_collection
-    
     try:
-        templates_collection = get_templates_collection()
+        templates_collection = get_async_templates_collection()
         
         if templates_collection is None:
             return ["marketing", "utility", "transactional", "authentication"]
         
         # Get unique categories
-        categories = templates_collection.distinct("category")
+        categories = await templates_collection.distinct("category")
         
         if not categories:
             return ["marketing", "utility", "transactional", "authentication"]
@@ -1052,18 +1147,75 @@ async def process_message_with_ai(data: dict, user: Dict[str, Any] = Depends(ver
     
     return result
 
+@app.get("/contacts/export")
+async def export_contacts(
+    format: str = "csv",
+    compression: Optional[str] = None,
+    user: Dict[str, Any] = Depends(verify_jwt_auth)
+):
+    """Export all contacts as a streamed download
+
+    `format`: csv, ndjson or json; `compression=gzip` compresses on the fly
+    (contact_export.py).
+    """
+    contacts_collection = get_async_contacts_collection()
+    
+    if contacts_collection is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+    
+    return stream_export(contacts_collection, {"user_id": user["user_id"]}, format, compression)
+
+@app.post("/contacts/export/jobs", status_code=202)
+async def create_export_job(options: dict = None, user: Dict[str, Any] = Depends(verify_jwt_auth)):
+    """Queue a background export (`format`: csv/ndjson/json, `compression`: gzip or null)
+
+    Poll GET /contacts/export/jobs/{job_id} for progress; download from
+    `downloadUrl` once `status` is done.
+    """
+    options = options or {}
+    job = await export_worker.submit(
+        user["user_id"], options.get("format", "csv"), options.get("compression", "gzip")
+    )
+    return export_jobs.job_view(job)
+
+@app.get("/contacts/export/jobs")
+async def list_export_jobs(user: Dict[str, Any] = Depends(verify_jwt_auth)):
+    """The user's export jobs, newest first"""
+    return {"jobs": await export_jobs.list_jobs(user["user_id"])}
+
+@app.get("/contacts/export/jobs/{job_id}")
+async def get_export_job(job_id: str, user: Dict[str, Any] = Depends(verify_jwt_auth)):
+    """Export job status and progress"""
+    return export_jobs.job_view(await export_jobs.get_job(job_id, user["user_id"]))
+
+@app.get("/contacts/export/jobs/{job_id}/download")
+async def download_export_job(job_id: str, user: Dict[str, Any] = Depends(verify_jwt_auth)):
+    """Finished export file; supports Range requests to resume downloads"""
+    job = await export_jobs.get_job(job_id, user["user_id"])
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Export is {job['status']}")
+    path = export_jobs.file_path(job)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=410, detail="Export file has expired")
+    return FileResponse(path, media_type=media_type(job["format"], job["compression"]),
+                        filename=job["filename"])
+
+@app.delete("/contacts/export/jobs/{job_id}")
+async def delete_export_job(job_id: str, user: Dict[str, Any] = Depends(verify_jwt_auth)):
+    """Cancel a queued or running export, or delete a finished one"""
+    await export_jobs.delete_job(job_id, user["user_id"])
+    return {"success": True}
+
 @app.get("/contacts/{contact_id}")
 async def get_contact(contact_id: str, user: Dict[str, Any] = Depends(verify_jwt_auth)):
     """Get a single contact by ID"""
-    from database import get_contacts_collection
-    
     try:
-        contacts_collection = get_contacts_collection()
+        contacts_collection = get_async_contacts_collection()
         
         if contacts_collection is None:
             raise HTTPException(status_code=503, detail="Database not available")
         
-        contact = contacts_collection.find_one(
+        contact = await contacts_collection.find_one(
             {"id": contact_id, "user_id": user["user_id"]}
         )
         
@@ -1079,20 +1231,16 @@ async def get_contact(contact_id: str, user: Dict[str, Any] = Depends(verify_jwt
 @app.post("/contacts")
 async def create_contact(contact: dict, user: Dict[str, Any] = Depends(verify_jwt_auth)):
     """Create a new contact"""
-    from database import get_contacts_collection
     import uuid
     
     try:
-        contacts_collection = get_contacts_collection()
+        contacts_collection = get_async_contacts_collection()
         
         if contacts_collection is None:
             raise HTTPException(status_code=503, detail="Database not available")
         
-        # Check if contact with same phone already exists
-        existing = contacts_collection.find_one({
-            "phone": contact.get("phone"),
-            "user_id": user["user_id"]
-        })
+        # Check if contact with same phone already exists (in any format)
+        existing = await repositories.contacts.find_by_phone(contact.get("phone"), user["user_id"])
         
         if existing:
             raise HTTPException(status_code=400, detail="Contact with this phone number already exists")
@@ -1102,6 +1250,7 @@ async def create_contact(contact: dict, user: Dict[str, Any] = Depends(verify_jw
             "user_id": user["user_id"],
             "name": contact.get("name"),
             "phone": contact.get("phone"),
+            "phoneE164": normalize_phone(contact.get("phone")),
             "email": contact.get("email"),
             "tags": contact.get("tags", []),
             "status": contact.get("status", "Active"),
@@ -1112,7 +1261,13 @@ async def create_contact(contact: dict, user: Dict[str, Any] = Depends(verify_jw
             "updatedAt": datetime.now().isoformat()
         }
         
-        contacts_collection.insert_one(contact_doc)
+        try:
+            await contacts_collection.insert_one(contact_doc)
+        except DuplicateKeyError:
+            raise HTTPException(status_code=400, detail="Contact with this phone number already exists")
+        await search_index.index_contacts([contact_doc])
+        counts.adjust("contacts", user["user_id"], 1)
+        phone_filters.add(user["user_id"], contact_doc["phoneE164"])
         
         return {"success": True, "contact": mongo_to_dict(contact_doc)}
     except HTTPException:
@@ -1123,27 +1278,34 @@ async def create_contact(contact: dict, user: Dict[str, Any] = Depends(verify_jw
 @app.put("/contacts/{contact_id}")
 async def update_contact(contact_id: str, contact: dict, user: Dict[str, Any] = Depends(verify_jwt_auth)):
     """Update a contact"""
-    from database import get_contacts_collection
-    
     try:
-        contacts_collection = get_contacts_collection()
+        contacts_collection = get_async_contacts_collection()
         
         if contacts_collection is None:
             raise HTTPException(status_code=503, detail="Database not available")
         
         # Add updatedAt timestamp
         update_data = {**contact, "updatedAt": datetime.now().isoformat()}
+        if "phone" in contact:
+            update_data["phoneE164"] = normalize_phone(contact["phone"])
         
-        result = contacts_collection.update_one(
-            {"id": contact_id, "user_id": user["user_id"]},
-            {"$set": update_data}
-        )
+        try:
+            result = await contacts_collection.update_one(
+                {"id": contact_id, "user_id": user["user_id"]},
+                {"$set": update_data}
+            )
+        except DuplicateKeyError:
+            raise HTTPException(status_code=400, detail="Contact with this phone number already exists")
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Contact not found")
         
         # Get updated contact
-        updated_contact = contacts_collection.find_one({"id": contact_id})
+        updated_contact = await contacts_collection.find_one({"id": contact_id})
+        await search_index.index_contacts([updated_contact])
+        counts.invalidate("contacts", user["user_id"])
+        if "phone" in contact:
+            phone_filters.add(user["user_id"], update_data["phoneE164"])
         
         return {"success": True, "contact": mongo_to_dict(updated_contact)}
     except HTTPException:
@@ -1154,20 +1316,20 @@ async def update_contact(contact_id: str, contact: dict, user: Dict[str, Any] =
 @app.delete("/contacts/{contact_id}")
 async def delete_contact(contact_id: str, user: Dict[str, Any] = Depends(verify_jwt_auth)):
     """Delete a contact"""
-    from database import get_contacts_collection
-    
     try:
-        contacts_collection = get_contacts_collection()
+        contacts_collection = get_async_contacts_collection()
         
         if contacts_collection is None:
             raise HTTPException(status_code=503, detail="Database not available")
         
-        result = contacts_collection.delete_one(
+        result = await contacts_collection.delete_one(
             {"id": contact_id, "user_id": user["user_id"]}
         )
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Contact not found")
+        await search_index.unindex_contacts([contact_id], user["user_id"])
+        counts.adjust("contacts", user["user_id"], -1)
         
         return {"success": True, "message": "Contact deleted"}
     except HTTPException:
@@ -1178,12 +1340,8 @@ async def delete_contact(contact_id: str, user: Dict[str, Any] = Depends(verify_
 @app.post("/contacts/bulk")
 async def bulk_contact_operation(operation: dict, user: Dict[str, Any] = Depends(verify_jwt_auth)):
     """Perform bulk operations on contacts"""
-    from database import get_contacts_collection
-    import csv
-    import io
-    
     try:
-        contacts_collection = get_contacts_collection()
+        contacts_collection = get_async_contacts_collection()
         
         if contacts_collection is None:
             raise HTTPException(status_code=503, detail="Database not available")
@@ -1202,7 +1360,9 @@ async def bulk_contact_operation(operation: dict, user: Dict[str, Any] = Depends
         }
         
         if op_type == "delete":
-            result = contacts_collection.delete_many(query)
+            result = await contacts_collection.delete_many(query)
+            await search_index.unindex_contacts(contact_ids, user["user_id"])
+            counts.adjust("contacts", user["user_id"], -result.deleted_count)
             return {
                 "success": True,
                 "message": f"Deleted {result.deleted_count} contacts",
@@ -1211,10 +1371,11 @@ async def bulk_contact_operation(operation: dict, user: Dict[str, Any] = Depends
         
         elif op_type == "tag":
             tags_to_add = data.get("tags", [])
-            result = contacts_collection.update_many(
+            result = await contacts_collection.update_many(
                 query,
                 {"$addToSet": {"tags": {"$each": tags_to_add}}}
             )
+            counts.invalidate("contacts", user["user_id"])
             return {
                 "success": True,
                 "message": f"Tagged {result.modified_count} contacts",
@@ -1226,10 +1387,11 @@ async def bulk_contact_operation(operation: dict, user: Dict[str, Any] = Depends
             if not new_status:
                 raise HTTPException(status_code=400, detail="Status is required")
             
-            result = contacts_collection.update_many(
+            result = await contacts_collection.update_many(
                 query,
                 {"$set": {"status": new_status, "updatedAt": datetime.now().isoformat()}}
             )
+            counts.invalidate("contacts", user["user_id"])
             return {
                 "success": True,
                 "message": f"Updated {result.modified_count} contacts",
@@ -1237,38 +1399,8 @@ async def bulk_contact_operation(operation: dict, user: Dict[str, Any] = Depends
             }
         
         elif op_type == "export":
-            # Get contacts
-            contacts_raw = list(contacts_collection.find(query))
-            contacts = [mongo_to_dict(c) for c in contacts_raw]
-            
-            # Create CSV
-            output = io.StringIO()
-            if contacts:
-                fieldnames = ["id", "name", "phone", "email", "tags", "status", "notes", "createdAt"]
-                writer = csv.DictWriter(output, fieldnames=fieldnames)
-                writer.writeheader()
-                
-                for contact in contacts:
-                    row = {
-                        "id": contact.get("id", ""),
-                        "name": contact.get("name", ""),
-                        "phone": contact.get("phone", ""),
-                        "email": contact.get("email", ""),
-                        "tags": ",".join(contact.get("tags", [])),
-                        "status": contact.get("status", ""),
-                        "notes": contact.get("notes", ""),
-                        "createdAt": contact.get("createdAt", "")
-                    }
-                    writer.writerow(row)
-            
-            csv_content = output.getvalue()
-            
-            return {
-                "success": True,
-                "message": f"Exported {len(contacts)} contacts",
-                "count": len(contacts),
-                "csv": csv_content
-            }
+            # Streamed CSV download (`data.format`, `data.compression` as for /contacts/export)
+            return stream_export(contacts_collection, query, data.get("format", "csv"), data.get("compression"))
         
         else:
             raise HTTPException(status_code=400, detail=f"Unknown operation: {op_type}")
@@ -1283,77 +1415,24 @@ async def bulk_contact_operation(operation: dict, user: Dict[str, Any] = Depends
 
 @app.post("/contacts/import")
 async def import_contacts(import_data: dict, user: Dict[str, Any] = Depends(verify_jwt_auth)):
-    """Import contacts from CSV or other sources"""
-    from database import get_contacts_collection
-    import uuid
-    import csv
-    import io
-    
+    """Import contacts from CSV or other sources
+
+    Rows are inserted in batches (contact_import.py); `rowErrors` lists
+    every skipped row with its reason.
+    """
     try:
-        contacts_collection = get_contacts_collection()
+        contacts_collection = get_async_contacts_collection()
         
         if contacts_collection is None:
             raise HTTPException(status_code=503, detail="Database not available")
         
         contacts_to_import = import_data.get("contacts", [])
-        source = import_data.get("source", "manual")
         
         if not contacts_to_import:
             raise HTTPException(status_code=400, detail="No contacts to import")
         
-        imported = 0
-        skipped = 0
-        errors = []
-        
-        for contact_data in contacts_to_import:
-            try:
-                # Validate required fields
-                if not contact_data.get("name") or not contact_data.get("phone"):
-                    skipped += 1
-                    errors.append(f"Skipped contact: missing name or phone")
-                    continue
-                
-                # Check if contact already exists
-                existing = contacts_collection.find_one({
-                    "phone": contact_data.get("phone"),
-                    "user_id": user["user_id"]
-                })
-                
-                if existing:
-                    skipped += 1
-                    errors.append(f"Skipped {contact_data.get('name')}: phone already exists")
-                    continue
-                
-                # Create contact
-                contact_doc = {
-                    "id": str(uuid.uuid4()),
-                    "user_id": user["user_id"],
-                    "name": contact_data.get("name"),
-                    "phone": contact_data.get("phone"),
-                    "email": contact_data.get("email"),
-                    "tags": contact_data.get("tags", []) if isinstance(contact_data.get("tags"), list) else [],
-                    "status": contact_data.get("status", "Active"),
-                    "customFields": contact_data.get("customFields", {}),
-                    "notes": contact_data.get("notes"),
-                    "avatar": contact_data.get("name", "U")[:2].upper(),
-                    "createdAt": datetime.now().isoformat(),
-                    "updatedAt": datetime.now().isoformat()
-                }
-                
-                contacts_collection.insert_one(contact_doc)
-                imported += 1
-                
-            except Exception as e:
-                skipped += 1
-                errors.append(f"Error importing {contact_data.get('name', 'unknown')}: {str(e)}")
-        
-        return {
-            "success": True,
-            "imported": imported,
-            "skipped": skipped,
-            "errors": errors[:10],  # Return first 10 errors
-            "message": f"Imported {imported} contacts, skipped {skipped}"
-        }
+        result = await contact_import.import_contacts(user["user_id"], contacts_to_import)
+        return result.to_dict()
     
     except HTTPException:
         raise
@@ -1363,78 +1442,43 @@ async def import_contacts(import_data: dict, user: Dict[str, Any] = Depends(veri
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Import failed: {str(e)}")
 
-@app.get("/contacts/export")
-async def export_contacts(
-    format: str = "csv",
-    user: Dict[str, Any] = Depends(verify_jwt_auth)
-):
-    """Export all contacts"""
-    from database import get_contacts_collection
-    import csv
-    import io
-    import json
-    
+@app.post("/contacts/import/upload")
+async def import_contacts_upload(file: UploadFile = File(...), user: Dict[str, Any] = Depends(verify_jwt_auth)):
+    """Import contacts from an uploaded CSV file (multipart field `file`)
+
+    The file is read back from the spooled upload chunk by chunk, so its
+    size doesn't matter; large files are parsed in worker processes
+    (import_pool.py). The response is the same as /contacts/import, plus
+    per-stage timings (`stages`) for a parallel import.
+    """
+    contacts_collection = get_async_contacts_collection()
+    if contacts_collection is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+
+    result = contact_import.ImportResult()
     try:
-        contacts_collection = get_contacts_collection()
-        
-        if contacts_collection is None:
-            raise HTTPException(status_code=503, detail="Database not available")
-        
-        # Get all contacts for user
-        contacts_raw = list(contacts_collection.find({"user_id": user["user_id"]}))
-        contacts = [mongo_to_dict(c) for c in contacts_raw]
-        
-        if format == "csv":
-            output = io.StringIO()
-            if contacts:
-                fieldnames = ["id", "name", "phone", "email", "tags", "status", "notes", "createdAt"]
-                writer = csv.DictWriter(output, fieldnames=fieldnames)
-                writer.writeheader()
-                
-                for contact in contacts:
-                    row = {
-                        "id": contact.get("id", ""),
-                        "name": contact.get("name", ""),
-                        "phone": contact.get("phone", ""),
-                        "email": contact.get("email", ""),
-                        "tags": ",".join(contact.get("tags", [])),
-                        "status": contact.get("status", ""),
-                        "notes": contact.get("notes", ""),
-                        "createdAt": contact.get("createdAt", "")
-                    }
-                    writer.writerow(row)
-            
-            return {
-                "success": True,
-                "format": "csv",
-                "count": len(contacts),
-                "data": output.getvalue()
-            }
-        
-        elif format == "json":
-            return {
-                "success": True,
-                "format": "json",
-                "count": len(contacts),
-                "data": contacts
-            }
-        
-        else:
-            raise HTTPException(status_code=400, detail=f"Unsupported format: {format}")
-    
-    except HTTPException:
-        raise
+        await import_pool.import_csv(user["user_id"], file.file, result=result)
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        detail = f"Invalid CSV: {e}"
+        if result.imported or result.skipped:
+            detail += f" (after {result.imported} contacts were imported, {result.skipped} skipped)"
+        raise HTTPException(status_code=400, detail=detail)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
+        print(f"Error importing contacts: {e}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Import failed: {str(e)}")
+    finally:
+        await file.close()
+    return result.to_dict()
 
 @app.post("/campaigns")
 async def create_campaign(campaign: dict, user: Dict[str, Any] = Depends(verify_jwt_auth)):
     """Create a new campaign"""
-    from database import get_campaigns_collection
     import uuid
     
     try:
-        campaigns_collection = get_campaigns_collection()
+        campaigns_collection = get_async_campaigns_collection()
         
         if campaigns_collection is None:
             raise HTTPException(status_code=503, detail="Database not available")
@@ -1467,7 +1511,7 @@ async def create_campaign(campaign: dict, user: Dict[str, Any] = Depends(verify_
             "scheduledAt": campaign.get("scheduledDate")
         }
         
-        campaigns_collection.insert_one(campaign_doc)
+        await campaigns_collection.insert_one(campaign_doc)
         
         return {"success": True, "campaign": mongo_to_dict(campaign_doc)}
     except HTTPException:
@@ -1481,12 +1525,10 @@ async def create_campaign(campaign: dict, user: Dict[str, Any] = Depends(verify_
 @app.get("/dashboard/stats")
 async def get_dashboard_stats(user: Dict[str, Any] = Depends(verify_jwt_auth)):
     """Get dashboard statistics"""
-    from database import get_contacts_collection, get_messages_collection, get_campaigns_collection
-    
     try:
-        contacts_collection = get_contacts_collection()
-        messages_collection = get_messages_collection()
-        campaigns_collection = get_campaigns_collection()
+        contacts_collection = get_async_contacts_collection()
+        messages_collection = get_async_messages_collection()
+        campaigns_collection = get_async_campaigns_collection()
         
         if contacts_collection is None or messages_collection is None or campaigns_collection is None:
             return {
@@ -1500,10 +1542,13 @@ async def get_dashboard_stats(user: Dict[str, Any] = Depends(verify_jwt_auth)):
                 "messagesChange": "0%"
             }
         
-        total_contacts = contacts_collection.count_documents({"user_id": user["user_id"]})
-        total_messages = messages_collection.count_documents({"user_id": user["user_id"]})
-        total_campaigns = campaigns_collection.count_documents({"user_id": user["user_id"]})
-        active_chats = contacts_collection.count_documents({"user_id": user["user_id"], "status": "Active"})
+        # Independent counts - run them concurrently instead of one after another
+        total_contacts, total_messages, total_campaigns, active_chats = await asyncio.gather(
+            contacts_collection.count_documents({"user_id": user["user_id"]}),
+            messages_collection.count_documents({"user_id": user["user_id"]}),
+            campaigns_collection.count_documents({"user_id": user["user_id"]}),
+            contacts_collection.count_documents({"user_id": user["user_id"], "status": "Active"})
+        )
         
         return {
             "totalContacts": total_contacts,
@@ -1528,17 +1573,38 @@ async def get_dashboard_stats(user: Dict[str, Any] = Depends(verify_jwt_auth)):
             "messagesChange": "0%"
         }
 
+@app.get("/admin/db/pool")
+async def get_db_pool_stats(user: Dict[str, Any] = Depends(verify_jwt_auth)):
+    """MongoDB connection pool settings and health (Admin only)
+
+    Per server: connections created/open/in use, requests waiting for a
+    checkout, checkout failures and checkout wait time percentiles. High
+    waits with all connections in use mean requests queue on the pool
+    rather than on the server. "failover" reports the supervisor state,
+    cached documents and writes buffered while on the mock.
+    """
+    return Database.pool_stats()
+
+@app.get("/admin/bloom")
+async def get_bloom_stats(user: Dict[str, Any] = Depends(verify_jwt_auth)):
+    """Phone Bloom filter metrics (Admin only)
+
+    `lookupsSaved` counts phones that skipped their database lookup;
+    `observedFalsePositiveRate` is the share of absent phones the filters
+    let through anyway, against `expectedFalsePositiveRate` at the current
+    fill. `largestTenants` lists the biggest per-tenant filters.
+    """
+    return phone_filters.stats()
+
 # Removed catch-all endpoint to avoid conflicts with other routes
 
 # User Management Endpoints
 
 @app.get("/api/users")
-async def get_all_users(user: Dict[str, Any] = Depends(verify_jwt_auth)):
-    """Get all users (Admin only)"""
-    from database import get_users_collection
-    
+async def get_all_users(fields: Optional[str] = None, user: Dict[str, Any] = Depends(verify_jwt_auth)):
+    """Get all users (Admin only; `fields`: optional comma-separated subset of the list view fields)"""
     try:
-        users_collection = get_users_collection()
+        users_collection = get_async_users_collection()
         
         if users_collection is None:
             # Return mock data if MongoDB not connected
@@ -1555,10 +1621,9 @@ async def get_all_users(user: Dict[str, Any] = Depends(verify_jwt_auth)):
                 }
             ]
         
-        users_raw = list(users_collection.find({}))
-        users = [mongo_to_dict(u) for u in users_raw]
-        
-        return users
+        return await repositories.users.list({}, fields=parse_fields(fields))
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching users: {e}")
         return []
@@ -1566,11 +1631,10 @@ async def get_all_users(user: Dict[str, Any] = Depends(verify_jwt_auth)):
 @app.post("/api/users")
 async def create_user(user_data: dict, user: Dict[str, Any] = Depends(verify_jwt_auth)):
     """Create a new user (Admin only)"""
-    from database import get_users_collection
     import uuid
     
     try:
-        users_collection = get_users_collection()
+        users_collection = get_async_users_collection()
         
         if users_collection is None:
             raise HTTPException(status_code=503, detail="Database not available")
@@ -1587,7 +1651,7 @@ async def create_user(user_data: dict, user: Dict[str, Any] = Depends(verify_jwt
             "createdAt": datetime.now().isoformat()
         }
         
-        users_collection.insert_one(user_doc)
+        await users_collection.insert_one(user_doc)
         
         return {"success": True, "user": mongo_to_dict(user_doc)}
     except Exception as e:
@@ -1596,15 +1660,13 @@ async def create_user(user_data: dict, user: Dict[str, Any] = Depends(verify_jwt
 @app.put("/api/users/{user_id}")
 async def update_user(user_id: str, user_data: dict, user: Dict[str, Any] = Depends(verify_jwt_auth)):
     """Update user (Admin only)"""
-    from database import get_users_collection
-    
     try:
-        users_collection = get_users_collection()
+        users_collection = get_async_users_collection()
         
         if users_collection is None:
             raise HTTPException(status_code=503, detail="Database not available")
         
-        result = users_collection.update_one(
+        result = await users_collection.update_one(
             {"id": user_id},
             {"$set": user_data}
         )
@@ -1619,15 +1681,13 @@ async def update_user(user_id: str, user_data: dict, user: Dict[str, Any] = Depe
 @app.delete("/api/users/{user_id}")
 async def delete_user(user_id: str, user: Dict[str, Any] = Depends(verify_jwt_auth)):
     """Delete user (Admin only)"""
-    from database import get_users_collection
-    
     try:
-        users_collection = get_users_collection()
+        users_collection = get_async_users_collection()
         
         if users_collection is None:
             raise HTTPException(status_code=503, detail="Database not available")
         
-        result = users_collection.delete_one({"id": user_id})
+        result = await users_collection.delete_one({"id": user_id})
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="User not found")
@@ -1639,10 +1699,8 @@ async def delete_user(user_id: str, user: Dict[str, Any] = Depends(verify_jwt_au
 @app.get("/api/profile")
 async def get_user_profile(user: Dict[str, Any] = Depends(verify_jwt_auth)):
     """Get current user profile"""
-    from database import get_users_collection
-    
     try:
-        users_collection = get_users_collection()
+        users_collection = get_async_users_collection()
         
         if users_collection is None:
             return {
@@ -1653,7 +1711,7 @@ async def get_user_profile(user: Dict[str, Any] = Depends(verify_jwt_auth)):
                 "status": "Active"
             }
         
-        user_doc = users_collection.find_one({"id": user["user_id"]})
+        user_doc = await users_collection.find_one({"id": user["user_id"]})
         
         if user_doc:
             return mongo_to_dict(user_doc)
@@ -1678,15 +1736,13 @@ async def get_user_profile(user: Dict[str, Any] = Depends(verify_jwt_auth)):
 @app.put("/api/profile")
 async def update_user_profile(profile_data: dict, user: Dict[str, Any] = Depends(verify_jwt_auth)):
     """Update current user profile"""
-    from database import get_users_collection
-    
     try:
-        users_collection = get_users_collection()
+        users_collection = get_async_users_collection()
         
         if users_collection is None:
             raise HTTPException(status_code=503, detail="Database not available")
         
-        result = users_collection.update_one(
+        result = await users_collection.update_one(
             {"id": user["user_id"]},
             {"$set": profile_data}
         )
@@ -1741,15 +1797,14 @@ async def run_ai_pipeline(message: str, contact_id: str, active_agents: list, us
     Reusable AI pipeline logic
     """
     from datetime import datetime
-    from database import get_agent_logs_collection, get_contacts_collection
     import json
     import os
     
-    # Initialize Groq Client
+    # Initialize Groq Client (async so model calls don't block the event loop)
     try:
-        from groq import Groq
+        from groq import AsyncGroq
         groq_api_key = os.getenv("GROQ_API_KEY")
-        client = Groq(api_key=groq_api_key) if groq_api_key else None
+        client = AsyncGroq(api_key=groq_api_key) if groq_api_key else None
     except ImportError:
         client = None
 
@@ -1760,8 +1815,8 @@ async def run_ai_pipeline(message: str, contact_id: str, active_agents: list, us
         "logs": []
     }
     
-    logs_collection = get_agent_logs_collection()
-    contacts_collection = get_contacts_collection()
+    logs_collection = get_async_agent_logs_collection()
+    contacts_collection = get_async_contacts_collection()
 
     async def process_single_agent(agent):
         if not client: return None
@@ -1793,7 +1848,7 @@ async def run_ai_pipeline(message: str, contact_id: str, active_agents: list, us
         """
         
         try:
-            chat_completion = client.chat.completions.create(
+            chat_completion = await client.chat.completions.create(
                 messages=[
                     {"role": "system", "content": enriched_prompt},
                     {"role": "user", "content": f"User message: {message}"}
@@ -1839,7 +1894,7 @@ async def run_ai_pipeline(message: str, contact_id: str, active_agents: list, us
                             "timestamp": datetime.now().isoformat()
                         }
                         results["logs"].append(log_entry)
-                        if logs_collection is not None: logs_collection.insert_one(log_entry)
+                        if logs_collection is not None: await logs_collection.insert_one(log_entry)
 
                 elif action_type == "update_contact":
                     field = action.get("field")
@@ -1847,10 +1902,13 @@ async def run_ai_pipeline(message: str, contact_id: str, active_agents: list, us
                     if field and value and contact_id and contacts_collection is not None:
                         # DB Update
                         if field in ["name", "email", "status", "notes"]:
-                            contacts_collection.update_one(
+                            await contacts_collection.update_one(
                                 {"id": contact_id},
                                 {"$set": {field: value}}
                             )
+                            if field in ("name", "email"):
+                                await search_index.reindex({"id": contact_id})
+                            counts.invalidate("contacts", user_id)
                         
                         log_entry = {
                             "id": str(datetime.now().timestamp()),
@@ -1861,7 +1919,7 @@ async def run_ai_pipeline(message: str, contact_id: str, active_agents: list, us
                             "timestamp": datetime.now().isoformat()
                         }
                         results["logs"].append(log_entry)
-                        if logs_collection is not None: logs_collection.insert_one(log_entry)
+                        if logs_collection is not None: await logs_collection.insert_one(log_entry)
 
             # 2. Handle Reply & Sentiment
             if response.get("reply") and not results["reply"]:
@@ -1875,7 +1933,7 @@ async def run_ai_pipeline(message: str, contact_id: str, active_agents: list, us
                     "timestamp": datetime.now().isoformat()
                 }
                 results["logs"].append(log_entry)
-                if logs_collection is not None: logs_collection.insert_one(log_entry)
+                if logs_collection is not None: await logs_collection.insert_one(log_entry)
                 
             if response.get("sentiment"):
                 results["sentiment"] = response.get("sentiment")
@@ -1890,7 +1948,6 @@ async def inbound_webhook(data: dict):
     """
     Simulate inbound WhatsApp message
     """
-    from database import get_messages_collection, get_contacts_collection, get_agents_collection
     from datetime import datetime
     import uuid
     
@@ -1901,12 +1958,19 @@ async def inbound_webhook(data: dict):
         if not phone or not text:
             raise HTTPException(status_code=400, detail="from and text are required")
             
-        contacts_collection = get_contacts_collection()
-        messages_collection = get_messages_collection()
-        agents_collection = get_agents_collection()
-        
-        # 1. Find or Create Contact
-        contact = contacts_collection.find_one({"phone": phone})
+        contacts_collection = get_async_contacts_collection()
+        messages_collection = get_async_messages_collection()
+        agents_collection = get_async_agents_collection()
+        
+        # 1. Find or Create Contact (WhatsApp sends digits only, e.g. "15551234567")
+        phone_key = normalize_phone(phone)
+        contact = None
+        # Skip the lookup when the Bloom filter has never seen the phone (bloom.py)
+        answered = phone_filters.answers(phone_key)
+        if phone_filters.might_exist(None, phone_key):
+            contact = await repositories.contacts.find_by_phone(phone)
+            if not contact and answered:
+                phone_filters.false_positive()
         
         # Set user_id - either from existing contact or default for new contacts
         user_id = "default_user"  # Default user for simulation (matches debug mode)
@@ -1919,12 +1983,21 @@ async def inbound_webhook(data: dict):
                 "user_id": user_id,
                 "name": "New Lead " + phone[-4:],
                 "phone": phone,
+                "phoneE164": phone_key,
                 "status": "New",
                 "tags": [],
                 "createdAt": datetime.now().isoformat()
             }
-            contacts_collection.insert_one(new_contact)
-            contact = new_contact
+            try:
+                await contacts_collection.insert_one(new_contact)
+            except DuplicateKeyError:
+                # Created by another process since the filters were built
+                contact = await repositories.contacts.find_by_phone(phone, user_id)
+            else:
+                await search_index.index_contacts([new_contact])
+                counts.adjust("contacts", user_id, 1)
+                phone_filters.add(user_id, phone_key)
+                contact = new_contact
         else:
             # Use existing contact's user_id if available
             user_id = contact.get("user_id", user_id)
@@ -1935,17 +2008,18 @@ async def inbound_webhook(data: dict):
         user_message = {
             "id": str(uuid.uuid4()),
             "phoneNumber": phone,
+            "phoneE164": phone_key,
             "text": text,
             "timestamp": datetime.now().isoformat(),
             "sent": False, # Inbound
             "status": "read",
             "type": "text"
         }
-        messages_collection.insert_one(user_message)
+        await messages_collection.insert_one(user_message)
         
         # 3. Run Agents
         # Fetch active agents for this user
-        active_agents = list(agents_collection.find({"user_id": user_id, "status": "active"}))
+        active_agents = await agents_collection.find({"user_id": user_id, "status": "active"}).to_list(length=None)
         active_agents = [mongo_to_dict(a) for a in active_agents]
         
         ai_results = await run_ai_pipeline(text, contact_id, active_agents, user_id)
@@ -1955,6 +2029,7 @@ async def inbound_webhook(data: dict):
             reply_message = {
                 "id": str(uuid.uuid4()),
                 "phoneNumber": phone,
+                "phoneE164": phone_key,
                 "text": ai_results.get("reply"),
                 "timestamp": datetime.now().isoformat(),
                 "sent": True, # Outbound reply
@@ -1962,14 +2037,15 @@ async def inbound_webhook(data: dict):
                 "type": "text",
                 "agent_reply": True
             }
-            messages_collection.insert_one(reply_message)
+            await messages_collection.insert_one(reply_message)
             
         # 5. Apply tags to contact
         if ai_results.get("tags"):
-            contacts_collection.update_one(
+            await contacts_collection.update_one(
                 {"id": contact_id},
                 {"$addToSet": {"tags": {"$each": ai_results.get("tags")}}}
             )
+            counts.invalidate("contacts", user_id)
             
         return {"success": True, "ai_results": mongo_to_dict(ai_results)}
         
@@ -1982,17 +2058,15 @@ async def inbound_webhook(data: dict):
 @app.get("/api/agents")
 async def get_agents(user: Dict[str, Any] = Depends(verify_jwt_auth)):
     """Get all AI agents"""
-    from database import get_agents_collection
-    
     try:
-        agents_collection = get_agents_collection()
+        agents_collection = get_async_agents_collection()
         if agents_collection is None:
             return [] # or return default agents
         
         # return list(agents_collection.find({"user_id": user["user_id"]}))
         # For simplicity in this demo, we might return global agents or user specific.
         # Let's assume user specific.
-        agents = list(agents_collection.find({"user_id": user["user_id"]}))
+        agents = await agents_collection.find({"user_id": user["user_id"]}).to_list(length=None)
         if not agents:
             # Seed default agents if none exist
             default_agents = [
@@ -2065,7 +2139,7 @@ async def get_agents(user: Dict[str, Any] = Depends(verify_jwt_auth)):
                     }
                 }
             ]
-            agents_collection.insert_many(default_agents)
+            await agents_collection.insert_many(default_agents)
             return [mongo_to_dict(a) for a in default_agents]
             
         return [mongo_to_dict(a) for a in agents]
@@ -2077,11 +2151,10 @@ async def get_agents(user: Dict[str, Any] = Depends(verify_jwt_auth)):
 @app.post("/api/agents")
 async def create_agent(agent_data: dict, user: Dict[str, Any] = Depends(verify_jwt_auth)):
     """Create a new AI agent"""
-    from database import get_agents_collection
     import uuid
     
     try:
-        agents_collection = get_agents_collection()
+        agents_collection = get_async_agents_collection()
         if agents_collection is None:
             raise HTTPException(status_code=503, detail="Database unavailable")
         
@@ -2105,7 +2178,7 @@ async def create_agent(agent_data: dict, user: Dict[str, Any] = Depends(verify_j
         }
         
         print(f"DEBUG: Creating agent with data: {new_agent}")
-        agents_collection.insert_one(new_agent)
+        await agents_collection.insert_one(new_agent)
         
         # Manual conversion to ensure no ObjectId issues
         new_agent["_id"] = str(new_agent["_id"])
@@ -2122,10 +2195,8 @@ async def create_agent(agent_data: dict, user: Dict[str, Any] = Depends(verify_j
 @app.put("/api/agents/{agent_id}")
 async def update_agent(agent_id: str, agent_data: dict, user: Dict[str, Any] = Depends(verify_jwt_auth)):
     """Update an existing agent"""
-    from database import get_agents_collection
-    
     try:
-        agents_collection = get_agents_collection()
+        agents_collection = get_async_agents_collection()
         if agents_collection is None:
             raise HTTPException(status_code=503, detail="Database unavailable")
         
@@ -2133,7 +2204,7 @@ async def update_agent(agent_id: str, agent_data: dict, user: Dict[str, Any] = D
         update_fields = {k: v for k, v in agent_data.items() if k not in ["id", "user_id", "_id"]}
         update_fields["updatedAt"] = datetime.now().isoformat()
         
-        result = agents_collection.update_one(
+        result = await agents_collection.update_one(
             {"id": agent_id, "user_id": user["user_id"]},
             {"$set": update_fields}
         )
@@ -1,6 +1,17 @@
 from typing import List, Dict, Any, Optional
+import os
 from datetime import datetime, timedelta
-import re
+import bisect
+import functools
+import heapq
+import threading
+from contextlib import contextmanager
+from itertools import islice
+from pymongo import InsertOne, UpdateOne, UpdateMany, ReplaceOne, DeleteOne, DeleteMany
+from pymongo.errors import BulkWriteError, DuplicateKeyError, WriteError
+from mock_query import compile_projection, compile_query, compile_update, upsert_seed
+from mock_persistence import MockPersistence
+from mock_storage import make_store
 
 # Sample Data
 CONTACTS = [
@@ -65,15 +76,198 @@ TEMPLATES = [
 ]
 
 
+def _sort_key(value):
+    """Order values of mixed types roughly like MongoDB's BSON comparison order"""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (6, value)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    if isinstance(value, dict):
+        return (3, str(value))
+    if isinstance(value, (list, tuple)):
+        return (4, tuple(_sort_key(v) for v in value))
+    if isinstance(value, datetime):
+        return (7, value)
+    return (5, str(value))
+
+
+_UNHASHABLE = object()
+
+
+class _HashIndex:
+    """Field value -> row ids. Array values are indexed per element (multikey)."""
+
+    def __init__(self, field):
+        self.field = field
+        # Buckets are dicts used as insertion-ordered sets of row ids
+        self.buckets = {}
+        self.unhashable = {}
+
+    def _keys(self, doc):
+        value = doc.get(self.field)
+        for v in (value if isinstance(value, list) else [value]):
+            try:
+                hash(v)
+                yield v
+            except TypeError:
+                yield _UNHASHABLE
+
+    def add(self, rid, doc):
+        for key in self._keys(doc):
+            if key is _UNHASHABLE:
+                self.unhashable[rid] = None
+            else:
+                self.buckets.setdefault(key, {})[rid] = None
+
+    def remove(self, rid, doc):
+        for key in self._keys(doc):
+            if key is _UNHASHABLE:
+                self.unhashable.pop(rid, None)
+                continue
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                bucket.pop(rid, None)
+                if not bucket:
+                    del self.buckets[key]
+
+    def lookup(self, values):
+        """Candidate row ids for an equality / $in match, or None if unusable"""
+        try:
+            buckets = [self.buckets.get(v, {}) for v in values]
+        except TypeError:
+            return None
+        if len(buckets) == 1 and not self.unhashable:
+            return buckets[0]
+        rids = set(self.unhashable).union(*buckets)
+        return dict.fromkeys(sorted(rids))
+
+
+class _SortedIndex:
+    """(sort key, row id) pairs kept in order for sorted scans"""
+
+    def __init__(self, field, docs):
+        self.field = field
+        self.entries = sorted((_sort_key(doc.get(field)), rid) for rid, doc in docs.items())
+
+    def add(self, rid, doc):
+        bisect.insort(self.entries, (_sort_key(doc.get(self.field)), rid))
+
+    def remove(self, rid, doc):
+        entry = (_sort_key(doc.get(self.field)), rid)
+        i = bisect.bisect_left(self.entries, entry)
+        if i < len(self.entries) and self.entries[i] == entry:
+            del self.entries[i]
+
+    def rids(self, reverse=False):
+        entries = reversed(self.entries) if reverse else self.entries
+        return (rid for _, rid in entries)
+
+
+class _Descending:
+    """Inverts the ordering of a sort key (for mixed-direction sorts)"""
+    __slots__ = ("key",)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+
+class _RWLock:
+    """Many readers or one writer. Waiting writers block new readers; the writer may re-enter."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = None
+        self._depth = 0
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        if self._writer == threading.get_ident():
+            yield
+            return
+        with self._cond:
+            while self._writer is not None or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        me = threading.get_ident()
+        if self._writer == me:
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+            return
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer is not None or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = me
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = None
+                self._cond.notify_all()
+
+
+def _reading(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock.read():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _writing(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock.write():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _numeric_id(value):
+    return isinstance(value, str) and value.isdigit()
+
+
 class MockCursor:
-    def __init__(self, data):
-        self.data = data
+    """Lazy cursor: nothing is matched or sorted until iteration"""
+
+    def __init__(self, collection, query=None, projection=None):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort = []
         self._skip = 0
-        self._limit = len(data)
-        
-    def sort(self, field, direction=1):
-        reverse = direction == -1
-        self.data.sort(key=lambda x: x.get(field, ""), reverse=reverse)
+        self._limit = 0
+
+    def sort(self, key_or_list, direction=1):
+        if isinstance(key_or_list, str):
+            self._sort = [(key_or_list, direction)]
+        else:
+            self._sort = list(key_or_list)
         return self
 
     def skip(self, n):
@@ -85,104 +279,666 @@ class MockCursor:
         return self
 
     def __iter__(self):
-        return iter(self.data[self._skip : self._skip + self._limit])
-
-    def __list__(self):
-        return list(self)
+        return self._collection._execute(self._query, self._sort, self._skip, self._limit, self._projection)
 
 
 class MockCollection:
-    def __init__(self, name, initial_data):
+    # Below this size sorting the matches directly beats building a sorted index
+    SORTED_INDEX_MIN_SIZE = 1000
+    # Cursors copy documents out under the read lock this many at a time
+    CURSOR_BATCH_SIZE = 256
+    # State that only exists once the documents are in memory
+    _LAZY_ATTRS = ("_docs", "_next_rid", "_hash_indexes", "_sorted_indexes", "_unique", "_last_id")
+
+    def __init__(self, name, initial_data, loader=None, storage=None, lock=None):
         self.name = name
-        self.data = initial_data
-
-    def find(self, query=None):
-        # Very basic query support
-        filtered = []
-        for item in self.data:
-            match = True
-            if query:
-                for k, v in query.items():
-                    if k == "$or":
-                        # Simple OR support for search (name, phone, email)
-                        or_match = False
-                        for cond in v:
-                            for sub_k, sub_v in cond.items():
-                                if "$regex" in sub_v:
-                                    pattern = sub_v["$regex"]
-                                    if re.search(pattern, item.get(sub_k, ""), re.IGNORECASE):
-                                        or_match = True
-                                        break
-                        if not or_match:
-                            match = False
-                    elif isinstance(v, dict) and "$regex" in v:
-                        if not re.search(v["$regex"], item.get(k, ""), re.IGNORECASE):
-                            match = False
-                    elif item.get(k) != v:
-                        match = False
-            if match:
-                filtered.append(item)
-        return MockCursor(filtered)
-
-    def find_one(self, query):
-        cursor = self.find(query)
-        res = list(cursor)
-        return res[0] if res else None
-
-    def insert_one(self, doc):
+        self.indexes = {}
+        # Shared by all collections of a MockDatabaseObject so a write (and the
+        # snapshot it may trigger) sees every collection in a consistent state
+        self._lock = lock or _RWLock()
+        self._load_lock = threading.Lock()
+        # "dict" (one dict per document) or "columnar" (see mock_storage.py)
+        self._storage = storage or os.getenv("MOCK_DB_STORAGE", "dict")
+        # Write hook set by MockDatabaseObject when persistence is enabled
+        self._journal = None
+        # Deferred load from a snapshot: callable returning (next_rid, {rid: doc})
+        self._loader = loader
+        if loader is None:
+            self._reset({}, 0)
+            for doc in initial_data:
+                self._add(dict(doc))
+
+    def _reset(self, docs, next_rid):
+        # Documents keyed by an internal row id so indexes can reference them
+        self._docs = make_store(self._storage, docs)
+        self._next_rid = next_rid
+        self._hash_indexes = {}
+        self._sorted_indexes = {}
+        self._unique = []
+        # Highest numeric id handed out or seen; computed on first insert
+        self._last_id = None
+
+    def __getattr__(self, attr):
+        # Only reached while a snapshot-backed collection hasn't been loaded yet
+        if attr in self._LAZY_ATTRS and "_loader" in self.__dict__:
+            # Readers may trigger the load concurrently; only one decodes
+            with self._load_lock:
+                if self._loader is not None:
+                    self._load()
+            return self.__dict__[attr]
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{attr}'")
+
+    def _load(self):
+        loader, self._loader = self._loader, None
+        next_rid, docs = loader()
+        self._reset(docs, next_rid)
+        # Build the indexes declared before the documents were loaded
+        declared, self.indexes = self.indexes, {}
+        for name, info in declared.items():
+            self._create_index(info["key"], name=name, unique=info["unique"],
+                               partialFilterExpression=info.get("partialFilterExpression"))
+
+    def _snapshot_rows(self):
+        return self._next_rid, list(self._docs.items())
+
+    @_writing
+    def create_index(self, keys, **kwargs):
+        return self._create_index(keys, **kwargs)
+
+    def _create_index(self, keys, **kwargs):
+        if isinstance(keys, str):
+            keys = [(keys, 1)]
+        keys = list(keys)
+        name = kwargs.get("name") or "_".join(f"{field}_{direction}" for field, direction in keys)
+        fields = [field for field, _ in keys]
+
+        info = {"key": keys, "unique": kwargs.get("unique", False)}
+        partial = kwargs.get("partialFilterExpression")
+        if partial:
+            info["partialFilterExpression"] = partial
+
+        if self._loader is not None:
+            # Not loaded yet: record the spec, _load() builds it
+            self.indexes[name] = info
+            return name
+
+        # Every declared field gets a hash index; sorted indexes are built on
+        # first use by a sort (see _sorted_index)
+        for field in fields:
+            if field not in self._hash_indexes:
+                index = _HashIndex(field)
+                for rid, doc in self._docs.items():
+                    index.add(rid, doc)
+                self._hash_indexes[field] = index
+
+        if kwargs.get("unique") and name not in self.indexes:
+            # A partial unique index only constrains the documents its filter matches
+            covers = compile_query(partial) if partial else None
+            for rid, doc in self._docs.items():
+                self._check_unique(doc, rid, [(name, fields, covers)])
+            self._unique.append((name, fields, covers))
+
+        self.indexes[name] = info
+        return name
+
+    @_reading
+    def index_information(self):
+        return dict(self.indexes)
+
+    # Index maintenance
+
+    def _index(self, rid, doc, fields=None):
+        for field, index in self._hash_indexes.items():
+            if fields is None or field in fields:
+                index.add(rid, doc)
+        for field, index in self._sorted_indexes.items():
+            if fields is None or field in fields:
+                index.add(rid, doc)
+
+    def _unindex(self, rid, doc, fields=None):
+        for field, index in self._hash_indexes.items():
+            if fields is None or field in fields:
+                index.remove(rid, doc)
+        for field, index in self._sorted_indexes.items():
+            if fields is None or field in fields:
+                index.remove(rid, doc)
+
+    def _check_unique(self, doc, rid=None, unique=None):
+        for name, fields, covers in (unique if unique is not None else self._unique):
+            if covers is not None and not covers(doc):
+                continue
+            values = [doc.get(field) for field in fields]
+            # Probe the most selective field's bucket (e.g. phone, not user_id)
+            candidates = self._docs.keys()
+            for field, value in zip(fields, values):
+                rids = self._hash_indexes[field].lookup([value])
+                if rids is not None and len(rids) < len(candidates):
+                    candidates = rids
+            for other in candidates:
+                other_doc = self._docs[other]
+                if other != rid and all(other_doc.get(f) == v for f, v in zip(fields, values)) \
+                        and (covers is None or covers(other_doc)):
+                    raise DuplicateKeyError(
+                        f"E11000 duplicate key error collection: {self.name} index: {name} "
+                        f"dup key: {dict(zip(fields, values))}",
+                        11000,
+                    )
+
+    def _add(self, doc):
+        self._check_unique(doc)
+        rid = self._next_rid
+        self._next_rid += 1
+        self._docs[rid] = doc
+        self._index(rid, doc)
+        if self._last_id is not None and _numeric_id(doc.get("id")):
+            self._last_id = max(self._last_id, int(doc["id"]))
+        if self._journal is not None:
+            self._journal(self.name, "put", rid, doc)
+        return rid
+
+    def _allocate_id(self):
+        """Next numeric id; monotonic, so ids of deleted documents aren't handed out again"""
+        if self._last_id is None:
+            self._last_id = max(
+                (int(doc["id"]) for doc in self._docs.values() if _numeric_id(doc.get("id"))),
+                default=0,
+            )
+        self._last_id += 1
+        return str(self._last_id)
+
+    def _remove(self, rid):
+        doc = self._docs.pop(rid)
+        self._unindex(rid, doc)
+        if self._journal is not None:
+            self._journal(self.name, "del", rid)
+
+    def _replace(self, rid, new_doc, fields=None):
+        """Swap in a new version of a document; `fields` limits index work to the changed top-level fields"""
+        old_doc = self._docs[rid]
+        self._unindex(rid, old_doc, fields)
+        try:
+            unique = None
+            if fields is not None:
+                unique = [entry for entry in self._unique if fields.intersection(entry[1])]
+            self._check_unique(new_doc, rid, unique)
+        except DuplicateKeyError:
+            self._index(rid, old_doc, fields)
+            raise
+        self._docs[rid] = new_doc
+        self._index(rid, new_doc, fields)
+        if self._journal is not None:
+            self._journal(self.name, "put", rid, new_doc)
+
+    # Query planning
+
+    def _candidates(self, query):
+        """Smallest set of row ids an indexed equality / $in term narrows to"""
+        best = None
+        for field, cond in (query or {}).items():
+            index = self._hash_indexes.get(field)
+            if index is None:
+                continue
+            if isinstance(cond, dict):
+                if list(cond) == ["$in"]:
+                    rids = index.lookup(cond["$in"])
+                elif list(cond) == ["$eq"] and not isinstance(cond["$eq"], (list, dict)):
+                    rids = index.lookup([cond["$eq"]])
+                else:
+                    continue
+            elif isinstance(cond, list):
+                continue
+            else:
+                rids = index.lookup([cond])
+            if rids is not None and (best is None or len(rids) < len(best)):
+                best = rids
+        return self._docs if best is None else best
+
+    def _sorted_index(self, field):
+        if field in self._sorted_indexes:
+            return self._sorted_indexes[field]
+        if field in self._hash_indexes and len(self._docs) >= self.SORTED_INDEX_MIN_SIZE:
+            self._sorted_indexes[field] = _SortedIndex(field, self._docs)
+            return self._sorted_indexes[field]
+        return None
+
+    def _sort_key_fn(self, sort):
+        docs = self._docs
+        if len(sort) == 1:
+            field = sort[0][0]
+            return lambda rid: _sort_key(docs[rid].get(field)), sort[0][1] == -1
+        if len({direction for _, direction in sort}) == 1:
+            fields = [field for field, _ in sort]
+            return lambda rid: tuple(_sort_key(docs[rid].get(f)) for f in fields), sort[0][1] == -1
+
+        def key(rid):
+            doc = docs[rid]
+            return tuple(
+                _sort_key(doc.get(f)) if direction != -1 else _Descending(_sort_key(doc.get(f)))
+                for f, direction in sort
+            )
+        return key, False
+
+    def _plan(self, query, sort, skip, limit):
+        """Row ids of the requested window, in order (called under the read lock)"""
+        docs = self._docs
+        matches = compile_query(query)
+        candidates = self._candidates(query)
+        end = skip + limit if limit else None
+
+        if not sort:
+            return list(islice((rid for rid in candidates if matches(docs[rid])), skip, end))
+        if len(sort) == 1:
+            index = self._sorted_index(sort[0][0])
+            # Walking the index stops after skip+limit hits (~k*n/c entries for c
+            # candidates); filtering the candidates first costs ~c
+            if index is not None and (
+                candidates is docs
+                or (end is not None and end * len(docs) < len(candidates) ** 2)
+            ):
+                walk = index.rids(reverse=sort[0][1] == -1)
+                if candidates is not docs:
+                    walk = (rid for rid in walk if rid in candidates)
+                return list(islice((rid for rid in walk if matches(docs[rid])), skip, end))
+
+        key, reverse = self._sort_key_fn(sort)
+        matched = (rid for rid in candidates if matches(docs[rid]))
+        if end is not None:
+            # Partial sort: O(n log k) for the page instead of sorting everything
+            top = heapq.nlargest if reverse else heapq.nsmallest
+            return top(end, matched, key=key)[skip:]
+        return sorted(matched, key=key, reverse=reverse)[skip:]
+
+    def _execute(self, query, sort, skip, limit, projection=None):
+        """Generator behind MockCursor: plans on first iteration, then copies documents out in batches
+
+        The read lock is never held across a yield, so a slow consumer can't
+        block writers. Documents deleted after planning are skipped, and
+        updated ones are re-checked against the filter.
+        """
+        with self._lock.read():
+            rids = self._plan(query, sort, skip, limit)
+        matches = compile_query(query)
+        project = compile_projection(projection)
+        batch_size = self.CURSOR_BATCH_SIZE
+        for start in range(0, len(rids), batch_size):
+            with self._lock.read():
+                docs = self._docs
+                batch = [
+                    project(docs[rid]) for rid in rids[start:start + batch_size]
+                    if rid in docs and matches(docs[rid])
+                ]
+            yield from batch
+
+    def _first_match(self, query):
+        matches = compile_query(query)
+        for rid in self._candidates(query):
+            if matches(self._docs[rid]):
+                return rid
+        return None
+
+    # Collection API
+
+    def find(self, query=None, projection=None):
+        return MockCursor(self, query, projection)
+
+    @_reading
+    def find_one(self, query=None, projection=None):
+        rid = self._first_match(query)
+        return compile_projection(projection)(self._docs[rid]) if rid is not None else None
+
+    @_writing
+    def insert_one(self, doc, **kwargs):
         if "id" not in doc:
-            doc["id"] = str(len(self.data) + 1)
-        self.data.append(doc)
-        return type('obj', (object,), {'inserted_id': doc["id"]})
+            doc["id"] = self._allocate_id()
+        self._add(dict(doc))
+        return type('obj', (object,), {'inserted_id': doc["id"], 'acknowledged': True})
+
+    @_writing
+    def insert_many(self, docs, ordered=True, **kwargs):
+        docs = list(docs)
+        if not docs:
+            raise TypeError("documents must be a non-empty list")
+        result = _bulk_counts()
+        inserted_ids = []
+        for i, doc in enumerate(docs):
+            try:
+                inserted_ids.append(self.insert_one(doc).inserted_id)
+            except DuplicateKeyError as e:
+                result["writeErrors"].append({"index": i, "code": e.code, "errmsg": str(e), "op": doc})
+                if ordered:
+                    break
+        result["nInserted"] = len(inserted_ids)
+        if result["writeErrors"]:
+            raise BulkWriteError(result)
+        return type('obj', (object,), {'inserted_ids': inserted_ids, 'acknowledged': True})
 
-    def insert_many(self, docs):
-        for doc in docs:
-            self.insert_one(doc)
+    def _count_from_index(self, query):
+        """Exact count straight from a hash bucket for {field: "value"} filters"""
+        if len(query) != 1:
+            return None
+        (field, value), = query.items()
+        index = self._hash_indexes.get(field)
+        # Only strings: Python hashing conflates True/1, which MongoDB doesn't
+        if index is None or not isinstance(value, str):
+            return None
+        bucket = index.buckets.get(value, {})
+        if not index.unhashable:
+            return len(bucket)
+        matches = compile_query(query)
+        return len(bucket) + sum(
+            1 for rid in index.unhashable if rid not in bucket and matches(self._docs[rid])
+        )
 
-    def count_documents(self, query):
-        return len(list(self.find(query)))
+    @_reading
+    def count_documents(self, query, skip=0, limit=0, **kwargs):
+        query = query or {}
+        count = len(self._docs) if not query else self._count_from_index(query)
+        if count is None:
+            # Stream over the candidates; never build a result list
+            docs = self._docs
+            matches = compile_query(query)
+            matching = (rid for rid in self._candidates(query) if matches(docs[rid]))
+            if limit:
+                return sum(1 for _ in islice(matching, skip, skip + limit))
+            count = sum(1 for _ in matching)
+        count = max(0, count - skip)
+        return min(count, limit) if limit else count
 
-    def distinct(self, field):
-        return list(set(item.get(field) for item in self.data if field in item))
+    @_reading
+    def estimated_document_count(self, **kwargs):
+        return len(self._docs)
+
+    @_reading
+    def distinct(self, key, filter=None, **kwargs):
+        docs = self._docs
+        index = self._hash_indexes.get(key)
+        if not filter and index is not None and not index.unhashable:
+            # Bucket keys are already the unwound distinct values; the None bucket
+            # also holds documents missing the field, which distinct() skips
+            return [
+                value for value, rids in index.buckets.items()
+                if value is not None or any(key in docs[rid] for rid in rids)
+            ]
+
+        matches = compile_query(filter)
+        values = {}
+        unhashable = []
+        for rid in self._candidates(filter):
+            doc = docs[rid]
+            if key not in doc or not matches(doc):
+                continue
+            value = doc[key]
+            # Arrays are unwound like MongoDB's distinct (e.g. tags)
+            for item in (value if isinstance(value, list) else [value]):
+                try:
+                    values[item] = None
+                except TypeError:
+                    if item not in unhashable:
+                        unhashable.append(item)
+        return list(values) + unhashable
         
-    def delete_one(self, query):
-        item = self.find_one(query)
-        if item:
-            self.data.remove(item)
-            return type('obj', (object,), {'deleted_count': 1})
-        return type('obj', (object,), {'deleted_count': 0})
-    
-    def update_one(self, query, update):
-        item = self.find_one(query)
-        if item:
-            if "$set" in update:
-                item.update(update["$set"])
-            return type('obj', (object,), {'matched_count': 1})
-        return type('obj', (object,), {'matched_count': 0})
+    def _matching_rids(self, query, multi):
+        if not multi:
+            rid = self._first_match(query)
+            return [] if rid is None else [rid]
+        docs = self._docs
+        matches = compile_query(query)
+        # Materialized up front: index maintenance mutates the candidate buckets
+        return [rid for rid in self._candidates(query) if matches(docs[rid])]
+
+    def _delete(self, query, multi):
+        rids = self._matching_rids(query, multi)
+        for rid in rids:
+            self._remove(rid)
+        return type('obj', (object,), {'deleted_count': len(rids), 'acknowledged': True})
+
+    @_writing
+    def delete_one(self, query, **kwargs):
+        return self._delete(query, multi=False)
+
+    @_writing
+    def delete_many(self, query, **kwargs):
+        return self._delete(query, multi=True)
+
+    def _update(self, query, update, multi, upsert=False):
+        """Shared body of update_one/update_many: one pass over the matched documents"""
+        apply = compile_update(update)
+        rids = self._matching_rids(query, multi)
+        modified = 0
+        for rid in rids:
+            new_doc = apply(self._docs[rid])
+            if new_doc is not None:
+                self._replace(rid, new_doc, apply.fields)
+                modified += 1
+
+        upserted_id = None
+        if not rids and upsert:
+            seed = upsert_seed(query)
+            upserted_id = self.insert_one(apply(seed) or seed).inserted_id
+        return type('obj', (object,), {
+            'matched_count': len(rids), 'modified_count': modified,
+            'upserted_id': upserted_id, 'acknowledged': True,
+        })
+
+    @_writing
+    def update_one(self, query, update, upsert=False, **kwargs):
+        return self._update(query, update, multi=False, upsert=upsert)
+
+    @_writing
+    def update_many(self, query, update, upsert=False, **kwargs):
+        return self._update(query, update, multi=True, upsert=upsert)
+
+    @_writing
+    def replace_one(self, query, replacement, upsert=False, **kwargs):
+        if any(key.startswith("$") for key in replacement):
+            raise ValueError("replacement can not include $ operators")
+        rids = self._matching_rids(query, multi=False)
+        modified = 0
+        upserted_id = None
+        if rids:
+            old_doc = self._docs[rids[0]]
+            new_doc = dict(replacement)
+            # Like _id in MongoDB, the id survives a replacement
+            if "id" in old_doc:
+                new_doc.setdefault("id", old_doc["id"])
+            if new_doc != dict(old_doc):
+                self._replace(rids[0], new_doc)
+                modified = 1
+        elif upsert:
+            upserted_id = self.insert_one({**upsert_seed(query), **replacement}).inserted_id
+        return type('obj', (object,), {
+            'matched_count': len(rids), 'modified_count': modified,
+            'upserted_id': upserted_id, 'acknowledged': True,
+        })
+
+    @_writing
+    def bulk_write(self, requests, ordered=True, **kwargs):
+        result = _bulk_counts()
+        upserted_ids = {}
+        for i, request in enumerate(requests):
+            try:
+                if isinstance(request, InsertOne):
+                    self.insert_one(request._doc)
+                    result["nInserted"] += 1
+                elif isinstance(request, (DeleteOne, DeleteMany)):
+                    deleted = self._delete(request._filter, multi=isinstance(request, DeleteMany))
+                    result["nRemoved"] += deleted.deleted_count
+                elif isinstance(request, (UpdateOne, UpdateMany, ReplaceOne)):
+                    if isinstance(request, ReplaceOne):
+                        updated = self.replace_one(request._filter, request._doc, upsert=bool(request._upsert))
+                    else:
+                        updated = self._update(request._filter, request._doc, multi=isinstance(request, UpdateMany),
+                                               upsert=bool(request._upsert))
+                    result["nMatched"] += updated.matched_count
+                    result["nModified"] += updated.modified_count
+                    if updated.upserted_id is not None:
+                        upserted_ids[i] = updated.upserted_id
+                        result["nUpserted"] += 1
+                        result["upserted"].append({"index": i, "_id": updated.upserted_id})
+                else:
+                    raise TypeError(f"{request!r} is not a valid request")
+            except WriteError as e:
+                result["writeErrors"].append({"index": i, "code": e.code, "errmsg": str(e), "op": request})
+                if ordered:
+                    break
+        if result["writeErrors"]:
+            raise BulkWriteError(result)
+        return type('obj', (object,), {
+            'inserted_count': result["nInserted"], 'matched_count': result["nMatched"],
+            'modified_count': result["nModified"], 'deleted_count': result["nRemoved"],
+            'upserted_count': result["nUpserted"], 'upserted_ids': upserted_ids,
+            'bulk_api_result': result, 'acknowledged': True,
+        })
+
+
+def _bulk_counts():
+    """Empty bulk write result in the shape BulkWriteError.details uses"""
+    return {
+        "writeErrors": [], "writeConcernErrors": [], "nInserted": 0, "nUpserted": 0,
+        "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": [],
+    }
 
 
 class MockDatabaseObject:
-    def __init__(self):
-        self.collections = {
-            "contacts": MockCollection("contacts", CONTACTS),
-            "messages": MockCollection("messages", MESSAGES),
-            "campaigns": MockCollection("campaigns", CAMPAIGNS),
-            "templates": MockCollection("templates", TEMPLATES),
-            "users": MockCollection("users", [])
-        }
-    
+    def __init__(self, seed: bool = True):
+        # MOCK_DB_PATH enables the on-disk journal + snapshots (see mock_persistence.py);
+        # an unseeded database (failover.py's outage store) is never persisted
+        self._persistence = MockPersistence.from_env() if seed else None
+        self._lock = _RWLock()
+
+        if self._persistence is not None and self._persistence.exists():
+            sections = self._persistence.load()
+            self.collections = {
+                name: MockCollection(name, [], loader=section, lock=self._lock)
+                for name, section in sections.items()
+            }
+            print(f"💾 Mock database restored from {self._persistence.path} ({len(sections)} collections)")
+        elif not seed:
+            self.collections = {}
+        else:
+            self.collections = {
+                "contacts": MockCollection("contacts", CONTACTS, lock=self._lock),
+                "messages": MockCollection("messages", MESSAGES, lock=self._lock),
+                "campaigns": MockCollection("campaigns", CAMPAIGNS, lock=self._lock),
+                "templates": MockCollection("templates", TEMPLATES, lock=self._lock),
+                "users": MockCollection("users", [], lock=self._lock)
+            }
+            if self._persistence is not None:
+                self._persistence.load()
+                self._persistence.write_snapshot(self.collections)
+                print(f"💾 Mock database persisting to {self._persistence.path}")
+
+        if self._persistence is not None:
+            for collection in self.collections.values():
+                collection._journal = self._journal
+
     def __getitem__(self, name):
         if name not in self.collections:
-            self.collections[name] = MockCollection(name, [])
+            with self._lock.write():
+                if name not in self.collections:
+                    collection = MockCollection(name, [], lock=self._lock)
+                    if self._persistence is not None:
+                        collection._journal = self._journal
+                    self.collections[name] = collection
         return self.collections[name]
 
+    def _journal(self, name, op, rid, doc=None):
+        # Called from collection writes, i.e. under the shared write lock
+        if self._persistence.append(name, op, rid, doc):
+            self._persistence.write_snapshot(self.collections)
+
+    def close(self):
+        with self._lock.write():
+            if self._persistence is not None:
+                if self._persistence.pending:
+                    self._persistence.write_snapshot(self.collections)
+                self._persistence.close()
+                self._persistence = None
+
 class MockClient:
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, seed: bool = True, **kwargs):
         self.admin = type('obj', (object,), {'command': lambda x: print("MOCK ping")})
-        self.db = MockDatabaseObject()
+        self.db = MockDatabaseObject(seed=seed)
 
     def __getitem__(self, name):
         return self.db
         
+    def close(self):
+        self.db.close()
+
+
+# Async wrappers - mirror Motor's API on top of the in-memory mock so handlers
+# can `await` the same calls whether MongoDB or the mock is active
+
+class AsyncMockCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self._cursor.sort(*args, **kwargs)
+        return self
+
+    def skip(self, n):
+        self._cursor.skip(n)
+        return self
+
+    def limit(self, n):
+        self._cursor.limit(n)
+        return self
+
+    def batch_size(self, n):
+        # Motor API; the mock cursor already copies documents out in batches
+        return self
+
+    async def to_list(self, length=None):
+        return list(islice(self._cursor, length))
+
+    async def _iterate(self):
+        for item in self._cursor:
+            yield item
+
+    def __aiter__(self):
+        return self._iterate()
+
+
+class AsyncMockCollection:
+    def __init__(self, collection):
+        self._collection = collection
+        self.name = collection.name
+
+    def find(self, *args, **kwargs):
+        # Like Motor, find() itself is not awaited - only the cursor is
+        return AsyncMockCursor(self._collection.find(*args, **kwargs))
+
+    def __getattr__(self, attr):
+        method = getattr(self._collection, attr)
+        if not callable(method):
+            return method
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+
+        return call
+
+
+class AsyncMockDatabaseObject:
+    def __init__(self, db):
+        self._db = db
+        self._collections = {}
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = AsyncMockCollection(self._db[name])
+        return self._collections[name]
+
+class AsyncMockClient:
+    def __init__(self, client=None):
+        # Share the sync client's data so both views see the same documents
+        self._client = client or MockClient()
+        self.db = AsyncMockDatabaseObject(self._client.db)
+
+    def __getitem__(self, name):
+        return self.db
+
     def close(self):
         pass
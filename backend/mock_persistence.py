@@ -0,0 +1,182 @@
+"""
+Optional on-disk persistence for the in-memory mock database
+
+Enabled by pointing MOCK_DB_PATH at a directory. Every write made through a
+MockCollection is appended to a journal; once MOCK_DB_SNAPSHOT_EVERY writes
+have accumulated and the journal has grown to half the snapshot's size (and
+on close) the data is compacted into a binary snapshot and the journal is
+truncated.
+
+At startup the snapshot is memory-mapped and only its header is read, so a
+restart takes milliseconds regardless of size. Each collection is decoded
+from the mapped file (plus its journal records) the first time it is used.
+"""
+import mmap
+import os
+import pickle
+import struct
+from typing import Dict, List, Tuple, Any, Optional
+
+SNAPSHOT_FILE = "snapshot.bin"
+JOURNAL_FILE = "journal.log"
+
+MAGIC = b"WBMOCK01"
+_LENGTH = struct.Struct("<I")
+_FOOTER = struct.Struct("<Q")
+
+
+class _SnapshotSection:
+    """Loader for one collection: decodes its snapshot bytes, then replays its journal records"""
+
+    def __init__(self, name, view=None, next_rid=0):
+        self.name = name
+        self.view = view
+        self.next_rid = next_rid
+        self.records: List[Tuple[str, int, Any]] = []
+
+    def __call__(self):
+        docs = dict(pickle.loads(self.view)) if self.view is not None else {}
+        next_rid = self.next_rid
+        for op, rid, doc in self.records:
+            if op == "put":
+                docs[rid] = doc
+                next_rid = max(next_rid, rid + 1)
+            else:
+                docs.pop(rid, None)
+        self.view = None
+        self.records = []
+        return next_rid, docs
+
+
+class MockPersistence:
+    def __init__(self, path: str, snapshot_every: int = 10000, fsync: bool = False):
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.pending = 0
+        self._journal_bytes = 0
+        self._snapshot_bytes = 0
+        os.makedirs(path, exist_ok=True)
+        self._snapshot_path = os.path.join(path, SNAPSHOT_FILE)
+        self._journal_path = os.path.join(path, JOURNAL_FILE)
+        self._mmap: Optional[mmap.mmap] = None
+        self._journal = None
+
+    @classmethod
+    def from_env(cls) -> Optional["MockPersistence"]:
+        path = os.getenv("MOCK_DB_PATH")
+        if not path:
+            return None
+        return cls(
+            path,
+            snapshot_every=int(os.getenv("MOCK_DB_SNAPSHOT_EVERY", "10000")),
+            fsync=os.getenv("MOCK_DB_FSYNC", "False") == "True",
+        )
+
+    def exists(self) -> bool:
+        return os.path.exists(self._snapshot_path) or os.path.exists(self._journal_path)
+
+    def _map_snapshot(self) -> Dict[str, _SnapshotSection]:
+        sections = {}
+        if not os.path.exists(self._snapshot_path):
+            return sections
+        with open(self._snapshot_path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        mm = self._mmap
+        self._snapshot_bytes = len(mm)
+        if mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{self._snapshot_path} is not a mock database snapshot")
+        header_offset, = _FOOTER.unpack_from(mm, len(mm) - _FOOTER.size)
+        header = pickle.loads(memoryview(mm)[header_offset:len(mm) - _FOOTER.size])
+        for name, (offset, length, next_rid) in header.items():
+            sections[name] = _SnapshotSection(name, memoryview(mm)[offset:offset + length], next_rid)
+        return sections
+
+    def load(self) -> Dict[str, _SnapshotSection]:
+        """Map the snapshot and attach journal records; returns a lazy loader per collection"""
+        sections = self._map_snapshot()
+
+        if os.path.exists(self._journal_path):
+            with open(self._journal_path, "rb") as f:
+                data = f.read()
+            pos = 0
+            while pos + _LENGTH.size <= len(data):
+                length, = _LENGTH.unpack_from(data, pos)
+                end = pos + _LENGTH.size + length
+                if end > len(data):
+                    # Torn write at the tail of the journal - ignore it
+                    break
+                name, op, rid, doc = pickle.loads(data[pos + _LENGTH.size:end])
+                sections.setdefault(name, _SnapshotSection(name)).records.append((op, rid, doc))
+                self.pending += 1
+                pos = end
+            self._journal_bytes = pos
+
+        self._journal = open(self._journal_path, "ab")
+        return sections
+
+    def append(self, name: str, op: str, rid: int, doc=None) -> bool:
+        """Journal one write; returns True when a snapshot is due"""
+        record = pickle.dumps((name, op, rid, doc), protocol=pickle.HIGHEST_PROTOCOL)
+        self._journal.write(_LENGTH.pack(len(record)) + record)
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+        self.pending += 1
+        self._journal_bytes += _LENGTH.size + len(record)
+        # Keep compaction amortized: rewriting a large snapshot every few
+        # thousand writes would dominate bulk loads
+        return self.pending >= self.snapshot_every and self._journal_bytes * 2 >= self._snapshot_bytes
+
+    def write_snapshot(self, collections: Dict[str, Any]) -> None:
+        """Compact all collections into a new snapshot and truncate the journal"""
+        tmp_path = self._snapshot_path + ".tmp"
+        header = {}
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC)
+            for name, collection in collections.items():
+                loader = collection._loader
+                if isinstance(loader, _SnapshotSection) and loader.view is not None and not loader.records:
+                    # Never loaded and unchanged: copy the encoded bytes as they are
+                    payload, next_rid = loader.view, loader.next_rid
+                else:
+                    next_rid, rows = collection._snapshot_rows()
+                    payload = pickle.dumps(rows, protocol=pickle.HIGHEST_PROTOCOL)
+                header[name] = (f.tell(), len(payload), next_rid)
+                f.write(payload)
+            header_offset = f.tell()
+            f.write(pickle.dumps(header, protocol=pickle.HIGHEST_PROTOCOL))
+            f.write(_FOOTER.pack(header_offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._snapshot_path)
+
+        # Re-point collections that are still lazy at the new file before
+        # releasing the old mapping
+        old_mmap = self._mmap
+        sections = self._map_snapshot()
+        for name, collection in collections.items():
+            if isinstance(collection._loader, _SnapshotSection):
+                collection._loader = sections[name]
+        if old_mmap is not None:
+            try:
+                old_mmap.close()
+            except BufferError:
+                pass
+
+        self._journal.truncate(0)
+        self._journal.seek(0)
+        self.pending = 0
+        self._journal_bytes = 0
+
+    def close(self) -> None:
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # A lazy collection still references the mapping
+                pass
+            self._mmap = None
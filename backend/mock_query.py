@@ -0,0 +1,483 @@
+"""
+Query compiler for the in-memory mock database
+
+A MongoDB filter dict is compiled once per find() into a predicate over
+documents instead of being re-interpreted for every document. Terms are
+ordered so cheap equality checks run before $in/range checks and regexes,
+and regexes are compiled once and cached. Update documents are compiled the
+same way, once per update_many()/bulk op, and projections once per find().
+"""
+import re
+from functools import lru_cache
+from pymongo.errors import OperationFailure, WriteError
+
+_MISSING = object()
+
+# Rough relative cost of each term, used to order evaluation
+_COST_EQ = 0
+_COST_IN = 1
+_COST_RANGE = 2
+_COST_REGEX = 5
+_COST_LOGICAL = 10
+
+_REGEX_FLAGS = {"i": re.IGNORECASE, "m": re.MULTILINE, "s": re.DOTALL, "x": re.VERBOSE}
+
+
+@lru_cache(maxsize=512)
+def compile_regex(pattern, options=""):
+    flags = 0
+    for option in options or "":
+        flags |= _REGEX_FLAGS.get(option, 0)
+    return re.compile(pattern, flags)
+
+
+def _getter(field):
+    if "." not in field:
+        return lambda doc: doc.get(field, _MISSING)
+    first, *parts = field.split(".")
+
+    def get(doc):
+        # The document itself may be a storage row proxy, nested values are dicts
+        value = doc.get(first, _MISSING)
+        for part in parts:
+            if not isinstance(value, dict):
+                return _MISSING
+            value = value.get(part, _MISSING)
+        return value
+    return get
+
+
+def _rank(value):
+    """Type bracket used for comparisons (mirrors mock_db._sort_key ranks)"""
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 6
+    if isinstance(value, (int, float)):
+        return 1
+    if isinstance(value, str):
+        return 2
+    return 5
+
+
+def _eq_term(get, value):
+    if value is None:
+        def predicate(doc):
+            v = get(doc)
+            return v is None or v is _MISSING or (type(v) is list and None in v)
+    elif isinstance(value, (list, dict)):
+        def predicate(doc):
+            v = get(doc)
+            return v == value or (type(v) is list and value in v)
+    elif isinstance(value, (bool, int, float)):
+        # Python treats True == 1; MongoDB doesn't
+        is_bool = isinstance(value, bool)
+
+        def predicate(doc):
+            v = get(doc)
+            if type(v) is list:
+                return any(e == value and isinstance(e, bool) == is_bool for e in v)
+            return v == value and isinstance(v, bool) == is_bool
+    else:
+        def predicate(doc):
+            v = get(doc)
+            return v == value or (type(v) is list and value in v)
+    return _COST_EQ, predicate
+
+
+def _in_term(get, values):
+    values = list(values)
+    try:
+        lookup = frozenset(values)
+    except TypeError:
+        lookup = values
+    match_missing = None in lookup
+
+    def predicate(doc):
+        v = get(doc)
+        if v is _MISSING:
+            return match_missing
+        if type(v) is list:
+            return any(e in lookup for e in v) or (v in values)
+        try:
+            return v in lookup
+        except TypeError:
+            return False
+    return _COST_IN, predicate
+
+
+def _compare_term(get, op, bound):
+    bound_rank = _rank(bound)
+    compare = {
+        "$gt": lambda v: v > bound,
+        "$gte": lambda v: v >= bound,
+        "$lt": lambda v: v < bound,
+        "$lte": lambda v: v <= bound,
+    }[op]
+
+    def check(v):
+        return v is not _MISSING and _rank(v) == bound_rank and compare(v)
+
+    def predicate(doc):
+        v = get(doc)
+        if type(v) is list:
+            return any(check(e) for e in v)
+        return check(v)
+    return _COST_RANGE, predicate
+
+
+def _regex_term(get, pattern, options):
+    if isinstance(pattern, re.Pattern):
+        search = pattern.search
+    else:
+        search = compile_regex(pattern, options).search
+
+    def predicate(doc):
+        v = get(doc)
+        if type(v) is str:
+            return search(v) is not None
+        if type(v) is list:
+            return any(type(e) is str and search(e) is not None for e in v)
+        return False
+    return _COST_REGEX, predicate
+
+
+def _negate(term):
+    cost, predicate = term
+    return cost, lambda doc: not predicate(doc)
+
+
+# $type aliases the mock understands
+_BSON_TYPES = {
+    "string": (str,),
+    "int": (int,),
+    "double": (float,),
+    "number": (int, float),
+    "bool": (bool,),
+    "object": (dict,),
+    "array": (list,),
+    "null": (type(None),),
+}
+
+
+def _field_terms(field, cond):
+    get = _getter(field)
+    if isinstance(cond, re.Pattern):
+        return [_regex_term(get, cond, "")]
+    if not (isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond)):
+        return [_eq_term(get, cond)]
+
+    terms = []
+    for op, value in cond.items():
+        if op == "$eq":
+            terms.append(_eq_term(get, value))
+        elif op == "$ne":
+            terms.append(_negate(_eq_term(get, value)))
+        elif op == "$in":
+            terms.append(_in_term(get, value))
+        elif op == "$nin":
+            terms.append(_negate(_in_term(get, value)))
+        elif op in ("$gt", "$gte", "$lt", "$lte"):
+            terms.append(_compare_term(get, op, value))
+        elif op == "$exists":
+            want = bool(value)
+            terms.append((_COST_EQ, lambda doc, want=want: (get(doc) is not _MISSING) == want))
+        elif op == "$type":
+            types = _BSON_TYPES[value]
+            terms.append((_COST_EQ, lambda doc, types=types: type(get(doc)) in types))
+        elif op == "$regex":
+            terms.append(_regex_term(get, value, cond.get("$options", "")))
+        elif op == "$options":
+            continue
+        elif op == "$all":
+            terms.extend(_eq_term(get, v) for v in value)
+        elif op == "$size":
+            terms.append((_COST_EQ, lambda doc, n=value: type(get(doc)) is list and len(get(doc)) == n))
+        elif op == "$not":
+            sub_terms = _field_terms(field, value)
+            terms.append(_negate(_combine_all(sub_terms)))
+        else:
+            raise ValueError(f"Unsupported query operator in mock database: {op}")
+    return terms
+
+
+def _combine_all(terms):
+    """AND terms together, cheapest first"""
+    predicates = [predicate for _, predicate in sorted(terms, key=lambda t: t[0])]
+    cost = sum(cost for cost, _ in terms)
+    if not predicates:
+        return cost, _match_all
+    if len(predicates) == 1:
+        return cost, predicates[0]
+
+    def predicate(doc):
+        for p in predicates:
+            if not p(doc):
+                return False
+        return True
+    return cost, predicate
+
+
+def _combine_any(terms):
+    """OR terms together, cheapest first"""
+    predicates = [predicate for _, predicate in sorted(terms, key=lambda t: t[0])]
+    cost = _COST_LOGICAL + sum(cost for cost, _ in terms)
+
+    def predicate(doc):
+        for p in predicates:
+            if p(doc):
+                return True
+        return False
+    return cost, predicate
+
+
+def _query_terms(query):
+    terms = []
+    for key, cond in (query or {}).items():
+        if key == "$or":
+            terms.append(_combine_any([_combine_all(_query_terms(sub)) for sub in cond]))
+        elif key == "$and":
+            terms.extend(_combine_all(_query_terms(sub)) for sub in cond)
+        elif key == "$nor":
+            terms.append(_negate(_combine_any([_combine_all(_query_terms(sub)) for sub in cond])))
+        elif key.startswith("$"):
+            raise ValueError(f"Unsupported query operator in mock database: {key}")
+        else:
+            terms.extend(_field_terms(key, cond))
+    return terms
+
+
+def _match_all(doc):
+    return True
+
+
+def compile_query(query):
+    """Compile a MongoDB filter into a predicate(doc) -> bool"""
+    if not query:
+        return _match_all
+    return _combine_all(_query_terms(query))[1]
+
+
+# Update operators
+
+def _numeric(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _get_path(doc, parts):
+    value = doc
+    for part in parts:
+        if not isinstance(value, dict):
+            return _MISSING
+        value = value.get(part, _MISSING)
+    return value
+
+
+def _set_path(doc, parts, value):
+    """Set a (dotted) field on a shallow copy, copying nested dicts on the way down"""
+    for part in parts[:-1]:
+        child = doc.get(part, _MISSING)
+        if child is _MISSING:
+            child = {}
+        elif not isinstance(child, dict):
+            raise WriteError(f"Cannot create field '{parts[-1]}' in element {{{part}: {child!r}}}", 28)
+        else:
+            child = dict(child)
+        doc[part] = child
+        doc = child
+    doc[parts[-1]] = value
+
+
+def _unset_path(doc, parts):
+    for part in parts[:-1]:
+        child = doc.get(part)
+        if not isinstance(child, dict):
+            return
+        child = dict(child)
+        doc[part] = child
+        doc = child
+    doc.pop(parts[-1], None)
+
+
+def _same(a, b):
+    return a == b and type(a) is type(b)
+
+
+def _op_set(parts, value):
+    def apply(doc):
+        if _same(_get_path(doc, parts), value):
+            return False
+        _set_path(doc, parts, value)
+        return True
+    return apply
+
+
+def _op_unset(parts, _):
+    def apply(doc):
+        if _get_path(doc, parts) is _MISSING:
+            return False
+        _unset_path(doc, parts)
+        return True
+    return apply
+
+
+def _op_inc(parts, amount):
+    if not _numeric(amount):
+        raise WriteError(f"Cannot increment with non-numeric argument: {{{'.'.join(parts)}: {amount!r}}}", 14)
+
+    def apply(doc):
+        current = _get_path(doc, parts)
+        if current is _MISSING:
+            current = 0
+        elif not _numeric(current):
+            raise WriteError(
+                f"Cannot apply $inc to a value of non-numeric type. Field '{'.'.join(parts)}' "
+                f"has non-numeric type {type(current).__name__}", 14)
+        elif amount == 0:
+            return False
+        _set_path(doc, parts, current + amount)
+        return True
+    return apply
+
+
+def _array_items(arg):
+    if isinstance(arg, dict) and "$each" in arg:
+        return list(arg["$each"])
+    return [arg]
+
+
+def _current_array(doc, parts, op):
+    current = _get_path(doc, parts)
+    if current is _MISSING:
+        return []
+    if not isinstance(current, list):
+        raise WriteError(
+            f"Cannot apply {op} to non-array field. Field named '{'.'.join(parts)}' "
+            f"has non-array type {type(current).__name__}", 2)
+    return current
+
+
+def _op_add_to_set(parts, arg):
+    items = _array_items(arg)
+
+    def apply(doc):
+        current = _current_array(doc, parts, "$addToSet")
+        added = []
+        for item in items:
+            if not any(_same(item, existing) for existing in current) and \
+                    not any(_same(item, existing) for existing in added):
+                added.append(item)
+        if not added and _get_path(doc, parts) is not _MISSING:
+            return False
+        # New list: the old document version still references the old one
+        _set_path(doc, parts, current + added)
+        return True
+    return apply
+
+
+def _op_push(parts, arg):
+    items = _array_items(arg)
+
+    def apply(doc):
+        _set_path(doc, parts, _current_array(doc, parts, "$push") + items)
+        return True
+    return apply
+
+
+_UPDATE_OPERATORS = {
+    "$set": _op_set,
+    "$unset": _op_unset,
+    "$inc": _op_inc,
+    "$addToSet": _op_add_to_set,
+    "$push": _op_push,
+}
+
+
+def compile_update(update):
+    """Compile a MongoDB update document into apply(doc) -> new doc, or None if nothing changes
+
+    The input document is never mutated (copy-on-write). `apply.fields` holds
+    the top-level fields the update can touch, so callers can limit index
+    maintenance to them.
+    """
+    if not update or not all(op.startswith("$") for op in update):
+        raise ValueError("update only works with $ operators")
+    ops = []
+    fields = set()
+    for op, targets in update.items():
+        if op not in _UPDATE_OPERATORS:
+            raise ValueError(f"Unsupported update operator in mock database: {op}")
+        for path, arg in targets.items():
+            parts = path.split(".")
+            fields.add(parts[0])
+            ops.append(_UPDATE_OPERATORS[op](parts, arg))
+
+    def apply(doc):
+        new_doc = dict(doc)
+        changed = False
+        for op in ops:
+            changed = op(new_doc) or changed
+        return new_doc if changed else None
+
+    apply.fields = fields
+    return apply
+
+
+def upsert_seed(query):
+    """Fields an upsert inserts from the filter: top-level equality terms"""
+    seed = {}
+    for key, cond in (query or {}).items():
+        if key.startswith("$"):
+            continue
+        if isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond):
+            if "$eq" in cond:
+                seed[key] = cond["$eq"]
+            continue
+        seed[key] = cond
+    return seed
+
+
+# Projections
+
+def compile_projection(projection):
+    """Compile a find() projection into doc -> new dict
+
+    Either inclusions or exclusions of (dotted) fields, with "_id" included
+    unless excluded explicitly, as in MongoDB. A list of names means
+    inclusion. No projection copies the whole document.
+    """
+    if not projection:
+        return dict
+    if not isinstance(projection, dict):
+        projection = {field: 1 for field in projection}
+    include_id = bool(projection.get("_id", 1))
+    fields = [(field.split("."), bool(flag)) for field, flag in projection.items() if field != "_id"]
+    inclusive = any(flag for _, flag in fields)
+    if any(flag != inclusive for _, flag in fields):
+        raise OperationFailure("Cannot mix inclusion and exclusion in a projection", 31254)
+
+    if inclusive:
+        paths = [parts for parts, _ in fields] + ([["_id"]] if include_id else [])
+        if all(len(parts) == 1 for parts in paths):
+            names = [parts[0] for parts in paths]
+            return lambda doc: {name: doc[name] for name in names if name in doc}
+
+        def include(doc):
+            out = {}
+            for first, *rest in paths:
+                value = doc.get(first, _MISSING)
+                if rest:
+                    value = _get_path(value, rest) if isinstance(value, dict) else _MISSING
+                if value is not _MISSING:
+                    _set_path(out, [first, *rest], value)
+            return out
+        return include
+
+    paths = [parts for parts, _ in fields] + ([] if include_id else [["_id"]])
+
+    def exclude(doc):
+        out = dict(doc)
+        for parts in paths:
+            _unset_path(out, parts)
+        return out
+    return exclude
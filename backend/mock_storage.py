@@ -0,0 +1,322 @@
+"""
+Columnar document storage for the in-memory mock database
+
+MockCollection keeps its documents in a mapping of row id -> document. By
+default that is a plain dict of dicts; with MOCK_DB_STORAGE=columnar it is a
+ColumnStore instead, which keeps one column per field:
+
+- low-cardinality values (status, user_id, phoneNumber, bools) are
+  dictionary encoded: each distinct value is stored once and
+  rows hold an int32 code
+- ints, floats, datetimes and ISO-8601 timestamp strings live in typed
+  `array` columns with a presence mask
+- anything else (unique strings, lists, nested dicts) falls back to a list
+
+Reads return a lightweight Row proxy that behaves like a read-only dict.
+"""
+from array import array
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+from itertools import compress
+
+_ABSENT = object()
+
+# A dictionary-encoded column switches to a plain one once it holds this many
+# distinct values and they are more than a quarter of its rows
+CODE_LIMIT = 4096
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+class _ObjectColumn:
+    kind = "object"
+    __slots__ = ("values",)
+
+    def __init__(self):
+        self.values = []
+
+    def get(self, rid):
+        values = self.values
+        return values[rid] if rid < len(values) else _ABSENT
+
+    def set(self, rid, value):
+        values = self.values
+        if rid >= len(values):
+            values.extend([_ABSENT] * (rid + 1 - len(values)))
+        values[rid] = value
+        return True
+
+    def clear(self, rid):
+        if rid < len(self.values):
+            self.values[rid] = _ABSENT
+
+    def __len__(self):
+        return len(self.values)
+
+
+class _CodeColumn:
+    kind = "code"
+    __slots__ = ("codes", "values", "lookup")
+
+    def __init__(self):
+        self.codes = array("i")
+        self.values = []
+        # Keyed by (type, value) so True and 1 get separate codes
+        self.lookup = {}
+
+    def get(self, rid):
+        codes = self.codes
+        if rid < len(codes):
+            code = codes[rid]
+            if code >= 0:
+                return self.values[code]
+        return _ABSENT
+
+    def set(self, rid, value):
+        key = (type(value), value)
+        try:
+            code = self.lookup.get(key)
+        except TypeError:
+            return False
+        if code is None:
+            if len(self.values) >= CODE_LIMIT and len(self.values) * 4 > len(self.codes):
+                return False
+            code = len(self.values)
+            self.values.append(value)
+            self.lookup[key] = code
+        codes = self.codes
+        if rid >= len(codes):
+            codes.extend([-1] * (rid + 1 - len(codes)))
+        codes[rid] = code
+        return True
+
+    def clear(self, rid):
+        if rid < len(self.codes):
+            self.codes[rid] = -1
+
+    def __len__(self):
+        return len(self.codes)
+
+
+def _is_int64(value):
+    return type(value) is int and -2 ** 63 <= value < 2 ** 63
+
+
+def _is_naive_datetime(value):
+    return type(value) is datetime and value.tzinfo is None
+
+
+def _encode_isotime(value):
+    # Only strings that datetime.isoformat() reproduces exactly
+    if type(value) is not str or len(value) not in (19, 26) or value[10:11] != "T":
+        return None
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if dt.tzinfo is not None or dt.isoformat() != value:
+        return None
+    return (dt - _EPOCH) // _MICROSECOND
+
+
+# kind -> (array typecode, encode (None if the value doesn't fit), decode)
+_ARRAY_KINDS = {
+    "int": ("q", lambda v: v if _is_int64(v) else None, int),
+    "float": ("d", lambda v: v if type(v) is float else None, float),
+    "datetime": (
+        "q",
+        lambda v: (v - _EPOCH) // _MICROSECOND if _is_naive_datetime(v) else None,
+        lambda v: _EPOCH + timedelta(microseconds=v),
+    ),
+    "isotime": ("q", _encode_isotime, lambda v: (_EPOCH + timedelta(microseconds=v)).isoformat()),
+}
+
+
+class _ArrayColumn:
+    __slots__ = ("kind", "data", "present", "encode", "decode")
+
+    def __init__(self, kind):
+        typecode, self.encode, self.decode = _ARRAY_KINDS[kind]
+        self.kind = kind
+        self.data = array(typecode)
+        self.present = bytearray()
+
+    def get(self, rid):
+        if rid < len(self.present) and self.present[rid]:
+            return self.decode(self.data[rid])
+        return _ABSENT
+
+    def set(self, rid, value):
+        encoded = self.encode(value)
+        if encoded is None:
+            return False
+        present = self.present
+        if rid >= len(present):
+            grow = rid + 1 - len(present)
+            present.extend(bytes(grow))
+            self.data.extend([0] * grow)
+        self.data[rid] = encoded
+        present[rid] = 1
+        return True
+
+    def clear(self, rid):
+        if rid < len(self.present):
+            self.present[rid] = 0
+
+    def __len__(self):
+        return len(self.present)
+
+
+def _new_column(value):
+    if _is_int64(value):
+        return _ArrayColumn("int")
+    if type(value) is float:
+        return _ArrayColumn("float")
+    if _is_naive_datetime(value):
+        return _ArrayColumn("datetime")
+    try:
+        hash(value)
+    except TypeError:
+        return _ObjectColumn()
+    return _CodeColumn()
+
+
+def _convert(column, rid, value):
+    """Rebuild a column that can't hold `value`: ISO timestamps if they all fit, else objects"""
+    rows = [(r, column.get(r)) for r in range(len(column))]
+    rows = [(r, v) for r, v in rows if v is not _ABSENT]
+    rows.append((rid, value))
+    if column.kind == "code" and all(_encode_isotime(v) is not None for _, v in rows):
+        new = _ArrayColumn("isotime")
+    else:
+        new = _ObjectColumn()
+    for r, v in rows:
+        new.set(r, v)
+    return new
+
+
+class Row(Mapping):
+    """Read-only dict view of one stored document"""
+    __slots__ = ("_store", "_rid")
+
+    def __init__(self, store, rid):
+        self._store = store
+        self._rid = rid
+
+    def __getitem__(self, key):
+        column = self._store.columns.get(key)
+        if column is not None:
+            value = column.get(self._rid)
+            if value is not _ABSENT:
+                return value
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        column = self._store.columns.get(key)
+        if column is None:
+            return default
+        value = column.get(self._rid)
+        return default if value is _ABSENT else value
+
+    def __contains__(self, key):
+        column = self._store.columns.get(key)
+        return column is not None and column.get(self._rid) is not _ABSENT
+
+    def __iter__(self):
+        rid = self._rid
+        return (name for name, column in self._store.columns.items() if column.get(rid) is not _ABSENT)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __reduce__(self):
+        # Pickles (snapshots, journal records) as a plain dict
+        return dict, (dict(self),)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class ColumnStore:
+    """Row id -> document mapping with the documents split into columns"""
+
+    def __init__(self):
+        self.columns = {}
+        # 1 for every live row id; row ids double as column positions
+        self._live = bytearray()
+        self._count = 0
+
+    @classmethod
+    def from_docs(cls, docs):
+        store = cls()
+        for rid, doc in docs.items():
+            store[rid] = doc
+        return store
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        return compress(range(len(self._live)), self._live)
+
+    def __contains__(self, rid):
+        return 0 <= rid < len(self._live) and self._live[rid] == 1
+
+    def __getitem__(self, rid):
+        if rid not in self:
+            raise KeyError(rid)
+        return Row(self, rid)
+
+    def __setitem__(self, rid, doc):
+        if rid in self:
+            self._clear(rid)
+        else:
+            if rid >= len(self._live):
+                self._live.extend(bytes(rid + 1 - len(self._live)))
+            self._live[rid] = 1
+            self._count += 1
+        columns = self.columns
+        for key, value in doc.items():
+            column = columns.get(key)
+            if column is None:
+                column = columns[key] = _new_column(value)
+            if not column.set(rid, value):
+                columns[key] = _convert(column, rid, value)
+
+    def _clear(self, rid):
+        for column in self.columns.values():
+            column.clear(rid)
+
+    def pop(self, rid, *default):
+        if rid not in self:
+            if default:
+                return default[0]
+            raise KeyError(rid)
+        # Materialize first: a Row would read the cleared columns
+        doc = dict(Row(self, rid))
+        self._clear(rid)
+        self._live[rid] = 0
+        self._count -= 1
+        return doc
+
+    def keys(self):
+        return self
+
+    def values(self):
+        return (Row(self, rid) for rid in self)
+
+    def items(self):
+        return ((rid, Row(self, rid)) for rid in self)
+
+    def column_kinds(self):
+        return {name: column.kind for name, column in self.columns.items()}
+
+
+def make_store(storage, docs):
+    """Wrap a {rid: doc} dict in the configured storage engine"""
+    if storage == "columnar":
+        return ColumnStore.from_docs(docs)
+    if storage != "dict":
+        raise ValueError(f"Unknown mock storage engine: {storage}")
+    return docs
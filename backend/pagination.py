@@ -0,0 +1,57 @@
+"""
+Keyset (cursor) pagination
+
+A page is the next `limit` documents in (sort field, id) order after the
+last document of the previous page, so with a compound index on
+(user_id, <sort field>, id) every page costs the same as the first.
+skip() would scan and discard all earlier documents.
+
+The position travels as an opaque cursor: URL-safe base64 of the sort
+field, direction, last sort value and last id.
+"""
+import base64
+import json
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException
+
+
+def encode_cursor(sort_field: str, direction: int, doc: Dict[str, Any]) -> str:
+    position = {"s": sort_field, "d": direction, "v": doc.get(sort_field), "id": doc["id"]}
+    raw = json.dumps(position, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_field: str, direction: int) -> Dict[str, Any]:
+    """Position from a cursor; 400 if it is malformed or was issued for another sort"""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        valid = isinstance(position, dict) and {"s", "d", "v", "id"} <= position.keys()
+    except ValueError:
+        valid = False
+    if not valid:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if position["s"] != sort_field or position["d"] != direction:
+        raise HTTPException(status_code=400, detail="Cursor was issued for a different sort")
+    return position
+
+
+def after_filter(sort_field: str, direction: int, position: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Filter for documents after `position` in (sort_field, id) order
+
+    Missing and null values sort before everything else, as in MongoDB,
+    so they come first ascending and last descending.
+    """
+    if position is None:
+        return None
+    value, last_id = position["v"], position["id"]
+    beyond = "$gt" if direction == 1 else "$lt"
+    tie = {sort_field: value, "id": {beyond: last_id}}
+    if value is None:
+        if direction == 1:
+            return {"$or": [tie, {sort_field: {"$ne": None}}]}
+        return tie
+    clauses = [{sort_field: {beyond: value}}, tie]
+    if direction == -1:
+        clauses.append({sort_field: None})
+    return {"$or": clauses}
@@ -0,0 +1,164 @@
+"""
+Phone number normalization
+
+Contacts are stored with free-form phones ("+1 (555) 123-4567") while the
+WhatsApp webhook sends `from` as bare digits with the country code
+("15551234567"). Every contact and message also stores the E.164 form of
+its phone in `phoneE164` ("+15551234567"), and phone lookups go through
+that indexed key:
+
+    contacts  (user_id, phoneE164)  unique, duplicate checks
+    contacts  (phoneE164)           inbound webhook
+    messages  (phoneE164, timestamp) chat history
+
+Rows written before the key existed are backfilled at startup by
+backfill_phone_keys(), in the background, or explicitly:
+
+    python phone_utils.py backfill
+
+Once every collection is backfilled a marker document is written to
+`migrations`, and later startups skip the (unindexed) scan; the command
+above always runs it.
+"""
+import asyncio
+import os
+import re
+import sys
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from database import get_async_collection
+
+# Country calling code for numbers written without one ("(555) 123-4567")
+DEFAULT_COUNTRY_CODE = os.getenv("PHONE_DEFAULT_COUNTRY_CODE", "1")
+# National significant numbers are at most this long; longer digit strings
+# without "+" already carry a country code (WhatsApp ids)
+MAX_NATIONAL_DIGITS = 10
+MIN_E164_DIGITS = 8
+MAX_E164_DIGITS = 15
+BATCH_SIZE = 1000
+MIGRATIONS_COLLECTION = "migrations"
+BACKFILL_MARKER = "phone_e164_backfill"
+
+# Extensions are not part of the number: "555-1234 ext. 12", "555-1234 x12"
+_EXTENSION = re.compile(r"\s*(?:ext\.?|extension|x|#|;).*$", re.IGNORECASE)
+
+# Collection -> field holding the free-form phone
+PHONE_FIELDS = {"contacts": "phone", "messages": "phoneNumber"}
+
+
+def normalize_phone(raw: Any, country_code: str = DEFAULT_COUNTRY_CODE) -> Optional[str]:
+    """E.164 form of a phone number ("+15551234567"), or None if it can't be one
+
+    Formatting is dropped and a "00" international prefix is read as "+".
+    Numbers without a country code get `country_code`, minus a leading
+    trunk "0". Only the length is checked, not the numbering plan.
+    """
+    if raw is None:
+        return None
+    text = _EXTENSION.sub("", str(raw).strip())
+    digits = "".join(ch for ch in text if ch.isdigit())
+    international = text.startswith("+")
+    if not international and digits.startswith("00"):
+        digits, international = digits[2:], True
+    if not international:
+        if digits.startswith("0"):
+            digits = country_code + digits[1:]
+        elif len(digits) <= MAX_NATIONAL_DIGITS:
+            digits = country_code + digits
+    if not MIN_E164_DIGITS <= len(digits) <= MAX_E164_DIGITS or digits.startswith("0"):
+        return None
+    return "+" + digits
+
+
+def _selector(doc: Dict[str, Any], field: str) -> Dict[str, Any]:
+    """Filter for one row being backfilled (the mock database has no _id)"""
+    if "_id" in doc:
+        return {"_id": doc["_id"]}
+    return {"id": doc.get("id"), field: doc.get(field), "phoneE164": {"$exists": False}}
+
+
+async def backfill_phone_keys(collection_name: str, batch_size: int = BATCH_SIZE) -> Dict[str, int]:
+    """Set phoneE164 on the rows of `collection_name` that don't have it yet
+
+    Phones that can't be normalized get phoneE164: null so they are not
+    scanned again. Contacts whose key collides with another contact of the
+    same user keep null too and are reported; they need merging by hand.
+    """
+    collection = get_async_collection(collection_name)
+    field = PHONE_FIELDS[collection_name]
+    stats = {"updated": 0, "invalid": 0, "duplicates": 0}
+    while True:
+        docs = await (
+            collection.find({"phoneE164": {"$exists": False}}, {"_id": 1, "id": 1, field: 1})
+            .limit(batch_size)
+            .to_list(length=None)
+        )
+        if not docs:
+            return stats
+        requests = []
+        for doc in docs:
+            key = normalize_phone(doc.get(field))
+            stats["updated" if key else "invalid"] += 1
+            requests.append(UpdateOne(_selector(doc, field), {"$set": {"phoneE164": key}}))
+        try:
+            await collection.bulk_write(requests, ordered=False)
+        except BulkWriteError as e:
+            failed = [error for error in e.details.get("writeErrors", []) if error.get("code") == 11000]
+            if len(failed) != len(e.details.get("writeErrors", [])):
+                raise
+            for error in failed:
+                doc = docs[error["index"]]
+                print(f"⚠️  Contact {doc.get('id')} has the same phone as another contact: {doc.get(field)}")
+            await collection.bulk_write(
+                [UpdateOne(_selector(docs[error["index"]], field), {"$set": {"phoneE164": None}}) for error in failed],
+                ordered=False,
+            )
+            stats["updated"] -= len(failed)
+            stats["duplicates"] += len(failed)
+        # Let requests in between batches
+        await asyncio.sleep(0)
+
+
+async def backfill_all(force: bool = False):
+    """Backfill every collection with a phone field (startup background task)
+
+    Skipped once the backfill has completed, unless `force`.
+    """
+    migrations = get_async_collection(MIGRATIONS_COLLECTION)
+    if not force and await migrations.find_one({"id": BACKFILL_MARKER}, {"_id": 0, "id": 1}):
+        return
+    complete = True
+    for collection_name in PHONE_FIELDS:
+        try:
+            stats = await backfill_phone_keys(collection_name)
+        except Exception as e:
+            print(f"⚠️  Phone key backfill of {collection_name} failed: {e}")
+            complete = False
+            continue
+        if any(stats.values()):
+            print(f"📞 {collection_name}: {stats['updated']} phone keys set, "
+                  f"{stats['invalid']} invalid, {stats['duplicates']} duplicates")
+    if complete:
+        # Every write path sets phoneE164 since, so there is nothing left to scan for
+        await migrations.update_one(
+            {"id": BACKFILL_MARKER},
+            {"$set": {"id": BACKFILL_MARKER, "completedAt": datetime.now().isoformat()}},
+            upsert=True,
+        )
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["backfill"]:
+        sys.exit("usage: python phone_utils.py backfill")
+    from database import Database
+
+    async def main():
+        await Database.connect_async()
+        await backfill_all(force=True)
+        await Database.close_async()
+
+    asyncio.run(main())
@@ -0,0 +1,134 @@
+"""
+MongoDB connection pool instrumentation
+
+A pymongo ConnectionPoolListener that keeps per-server counters for the
+connection pools of the sync and async clients: connections created, open
+and checked out, requests waiting for a checkout, checkout failures and
+the recent distribution of checkout wait times. Exposed by
+GET /admin/db/pool.
+"""
+import threading
+from collections import deque
+from typing import Dict, Any
+
+from pymongo import monitoring
+
+# Checkout wait samples kept per server for the percentiles
+WAIT_SAMPLES = 1024
+
+
+class _ServerPool:
+    def __init__(self):
+        self.created = 0
+        self.closed = 0
+        self.checkouts_started = 0
+        self.checked_out = 0
+        self.checked_in = 0
+        self.cleared = 0
+        self.failures: Dict[str, int] = {}
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+        self.waits = deque(maxlen=WAIT_SAMPLES)
+
+    def snapshot(self) -> Dict[str, Any]:
+        waits = sorted(self.waits)
+
+        def percentile(p):
+            return round(waits[min(len(waits) - 1, int(len(waits) * p))], 3) if waits else 0.0
+
+        completed = self.checked_out + sum(self.failures.values())
+        return {
+            "connections": {
+                "created": self.created,
+                "closed": self.closed,
+                "open": self.created - self.closed,
+                "in_use": self.checked_out - self.checked_in,
+            },
+            "checkouts": {
+                "total": self.checked_out,
+                # Requests currently queued for a connection
+                "waiting": self.checkouts_started - completed,
+                "failed": dict(self.failures),
+            },
+            "wait_ms": {
+                "avg": round(self.wait_total_ms / self.checked_out, 3) if self.checked_out else 0.0,
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "max": round(self.wait_max_ms, 3),
+                "samples": len(waits),
+            },
+            "cleared": self.cleared,
+        }
+
+
+class PoolStatsCollector(monitoring.ConnectionPoolListener):
+    """Aggregates pool events per server address (events arrive from driver threads)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._servers: Dict[str, _ServerPool] = {}
+
+    def _server(self, event) -> _ServerPool:
+        address = "%s:%s" % event.address
+        if address not in self._servers:
+            self._servers[address] = _ServerPool()
+        return self._servers[address]
+
+    def pool_created(self, event):
+        with self._lock:
+            self._server(event)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._server(event).cleared += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self._server(event).created += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self._server(event).closed += 1
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self._server(event).checkouts_started += 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            failures = self._server(event).failures
+            failures[event.reason] = failures.get(event.reason, 0) + 1
+
+    def connection_checked_out(self, event):
+        wait_ms = (event.duration or 0.0) * 1000
+        with self._lock:
+            server = self._server(event)
+            server.checked_out += 1
+            server.wait_total_ms += wait_ms
+            server.wait_max_ms = max(server.wait_max_ms, wait_ms)
+            server.waits.append(wait_ms)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self._server(event).checked_in += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {address: server.snapshot() for address, server in self._servers.items()}
+
+
+# One collector per client so sync (scripts) and async (handlers) pools stay apart
+collectors = {
+    "sync": PoolStatsCollector(),
+    "async": PoolStatsCollector(),
+}
@@ -0,0 +1,203 @@
+"""
+Repositories: collection reads with server-side projections
+
+Each repository lists the fields its list endpoints show (LIST_FIELDS) and
+asks the database for only those, with _id excluded, instead of fetching
+whole documents and stripping them in Python. List endpoints accept a
+`fields=` sparse fieldset (comma-separated, a subset of LIST_FIELDS) to
+narrow that further; "id" is always returned.
+"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+
+import count_cache
+from database import get_async_collection
+from pagination import after_filter, decode_cursor, encode_cursor
+from phone_utils import normalize_phone
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """`fields=name,phone` query parameter -> ["name", "phone"] (None when absent)"""
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    return names or None
+
+
+class Repository:
+    collection_name = ""
+    # Fields list endpoints return when no sparse fieldset is requested
+    LIST_FIELDS: Sequence[str] = ()
+    # Sorts backed by a (user_id, <field>, id) index, usable with keyset_page()
+    KEYSET_SORTS: Sequence[str] = ()
+
+    @property
+    def collection(self):
+        return get_async_collection(self.collection_name)
+
+    def projection(self, fields: Optional[List[str]] = None) -> Dict[str, int]:
+        """Projection for a list view, or for a sparse fieldset (400 on unknown fields)"""
+        if fields is None:
+            fields = self.LIST_FIELDS
+        else:
+            unknown = [name for name in fields if name not in self.LIST_FIELDS]
+            if unknown:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Unknown fields: {', '.join(unknown)} (allowed: {', '.join(self.LIST_FIELDS)})",
+                )
+        projection = {"_id": 0, "id": 1}
+        projection.update((name, 1) for name in fields)
+        return projection
+
+    async def list(
+        self,
+        query: Dict[str, Any],
+        sort: Optional[List[Tuple[str, int]]] = None,
+        skip: int = 0,
+        limit: int = 0,
+        fields: Optional[List[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        cursor = self.collection.find(query, self.projection(fields))
+        if sort:
+            cursor = cursor.sort(sort)
+        return await cursor.skip(skip).limit(limit).to_list(length=None)
+
+    async def keyset_page(
+        self,
+        query: Dict[str, Any],
+        sort_field: str,
+        direction: int,
+        limit: int,
+        cursor: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Next `limit` documents in (sort_field, id) order after `cursor`, and the cursor for the page after"""
+        if sort_field not in self.KEYSET_SORTS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Cursor pagination supports sort_by: {', '.join(self.KEYSET_SORTS)}",
+            )
+        if limit < 1:
+            raise HTTPException(status_code=400, detail="limit must be at least 1")
+        after = after_filter(sort_field, direction, decode_cursor(cursor, sort_field, direction) if cursor else None)
+        if after is not None:
+            query = {**query, "$and": query.get("$and", []) + [after]}
+
+        projection = self.projection(fields)
+        # The next cursor needs the sort key even when `fields` leaves it out
+        hidden = sort_field not in projection
+        projection[sort_field] = 1
+        # One extra document tells whether there is a next page
+        docs = await (
+            self.collection.find(query, projection)
+            .sort([(sort_field, direction), ("id", direction)])
+            .limit(limit + 1)
+            .to_list(length=None)
+        )
+        next_cursor = encode_cursor(sort_field, direction, docs[limit - 1]) if len(docs) > limit else None
+        docs = docs[:limit]
+        if hidden:
+            for doc in docs:
+                doc.pop(sort_field, None)
+        return docs, next_cursor
+
+    async def get(self, query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Whole document (detail views), without _id"""
+        return await self.collection.find_one(query, {"_id": 0})
+
+    async def count(self, query: Dict[str, Any], estimate: bool = False) -> Tuple[int, bool]:
+        """Cached total for `query` (count_cache.py), and whether it is an estimate"""
+        return await count_cache.count(self.collection_name, self.collection, query, estimate=estimate)
+
+
+class ContactRepository(Repository):
+    collection_name = "contacts"
+    LIST_FIELDS = (
+        "id", "name", "phone", "email", "tags", "status", "avatar",
+        "lastMessage", "lastMessageTime", "unreadCount", "online", "createdAt",
+    )
+    KEYSET_SORTS = ("name", "createdAt", "lastMessageTime")
+
+    async def ranked_page(
+        self,
+        ids: List[str],
+        query: Dict[str, Any],
+        skip: int = 0,
+        limit: int = 0,
+        fields: Optional[List[str]] = None,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Page of the contacts `ids` (best first) that also match `query`, and how many match"""
+        if set(query) - {"user_id"}:
+            # Status / tag filters on top of the search
+            matching = await self.collection.find({**query, "id": {"$in": ids}}, {"_id": 0, "id": 1}).to_list(length=None)
+            keep = {doc["id"] for doc in matching}
+            ids = [contact_id for contact_id in ids if contact_id in keep]
+        page_ids = ids[skip:skip + limit] if limit else ids[skip:]
+        docs = await self.list({**query, "id": {"$in": page_ids}}, fields=fields)
+        rank = {contact_id: i for i, contact_id in enumerate(page_ids)}
+        docs.sort(key=lambda doc: rank[doc["id"]])
+        return docs, len(ids)
+
+    @staticmethod
+    def phone_query(phone: str, user_id: Optional[str] = None) -> Dict[str, Any]:
+        """Filter for contacts with the same phone: by E.164 key, or by the
+        raw text for phones that can't be normalized ("911", "12345")"""
+        key = normalize_phone(phone)
+        query: Dict[str, Any] = {"phoneE164": key} if key is not None else {"phone": phone}
+        if user_id is not None:
+            query["user_id"] = user_id
+        return query
+
+    async def name_for_phone(self, phone: str) -> Optional[str]:
+        contact = await self.collection.find_one(self.phone_query(phone), {"_id": 0, "name": 1})
+        return contact.get("name") if contact else None
+
+    async def find_by_phone(self, phone: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Contact with the same phone (of `user_id`, when given)"""
+        return await self.get(self.phone_query(phone, user_id))
+
+
+class MessageRepository(Repository):
+    collection_name = "messages"
+    LIST_FIELDS = (
+        "id", "phoneNumber", "text", "timestamp", "sent", "status", "type",
+        "template", "mediaUrl", "mediaType", "agent_reply",
+    )
+
+    async def history(self, phone: str, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        key = normalize_phone(phone)
+        query = {"phoneE164": key} if key else {"phoneNumber": phone}
+        return await self.list(query, sort=[("timestamp", 1)], fields=fields)
+
+
+class CampaignRepository(Repository):
+    collection_name = "campaigns"
+    LIST_FIELDS = (
+        "id", "name", "description", "status", "template", "contactSource", "contactTags",
+        "recipients", "sent", "delivered", "read", "readRate", "deliveryRate",
+        "createdAt", "scheduledAt",
+    )
+
+
+class TemplateRepository(Repository):
+    collection_name = "templates"
+    LIST_FIELDS = (
+        "id", "name", "category", "status", "language", "content",
+        "parameters", "usageCount", "createdAt",
+    )
+
+
+class UserRepository(Repository):
+    collection_name = "users"
+    LIST_FIELDS = (
+        "id", "name", "email", "role", "status", "lastActive", "joinedDate", "avatar",
+    )
+
+
+contacts = ContactRepository()
+messages = MessageRepository()
+campaigns = CampaignRepository()
+templates = TemplateRepository()
+users = UserRepository()
@@ -0,0 +1,239 @@
+"""
+Indexed contact search
+
+/contacts?search= used to run three unanchored case-insensitive $regex
+clauses over name, phone and email, which can't use an index and scan the
+whole tenant. Instead each contact has a document in `contact_search`
+holding prefix tokens:
+
+    n:<prefix of the full name>            "n:sarah jo"
+    w:<prefix of any word of the name>     "w:jo"
+    e:<prefix of the email>                "e:sarah.j"
+    p:<3+ phone digits from a group start> "p:5551234"
+    p:<last 3+ phone digits>               "p:4567"
+
+Names and emails are lowercased with whitespace collapsed; phones are
+reduced to digits, so "555-1234", "(555) 1234" and "5551234" all match.
+Phone tokens are prefixes of the digits from the start of each group
+of the number as written ("+1 (555) 123-4567": 1555..., 555..., 123...,
+4567) and of its E.164 and national forms, plus the trailing digits: the number with
+or without country or area code, and its last digits, but not any digit
+run in the middle (that took ~120 tokens per contact).
+The (user_id, t, name, id) index makes every lookup an index-only
+equality scan. Results are ranked by tier: full name prefix, then word
+prefixes, email and phone. Within a tier they are ordered by name.
+
+Contact writes in main.py call index_contacts() / unindex_contacts().
+Existing contacts are indexed by ensure_built() at startup when
+`contact_search` is empty, or explicitly:
+
+    python search_index.py rebuild
+
+Indexes built before the phone tokens changed are replaced by a rebuild.
+"""
+import re
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ReplaceOne
+
+from database import get_async_collection
+from phone_utils import DEFAULT_COUNTRY_CODE, normalize_phone
+
+SEARCH_COLLECTION = "contact_search"
+# Longest indexed prefix; longer queries are checked against the stored values
+MAX_PREFIX = 20
+MIN_PHONE_DIGITS = 3
+# Ranked matches considered per search (also the largest `total` reported,
+# with `truncated` set when there were more)
+MAX_RESULTS = 1000
+BATCH_SIZE = 1000
+
+_PHONE_LIKE = re.compile(r"^[\d\s()+.\-]+$")
+_DIGIT_GROUP = re.compile(r"\d+")
+
+
+def normalize_text(value: Any) -> str:
+    return " ".join(str(value or "").lower().split())
+
+
+def phone_digits(value: Any) -> str:
+    return "".join(ch for ch in str(value or "") if ch.isdigit())
+
+
+def _prefixes(text: str) -> List[str]:
+    return [text[:i] for i in range(1, min(len(text), MAX_PREFIX) + 1)]
+
+
+def tokens_for(contact: Dict[str, Any]) -> List[str]:
+    name = normalize_text(contact.get("name"))
+    tokens = {"n:" + prefix for prefix in _prefixes(name)}
+    for word in name.split():
+        tokens.update("w:" + prefix for prefix in _prefixes(word))
+    tokens.update("e:" + prefix for prefix in _prefixes(normalize_text(contact.get("email"))))
+    tokens.update("p:" + digits for digits in phone_tokens(contact.get("phone")))
+    return sorted(tokens)
+
+
+def phone_tokens(phone: Any) -> set:
+    """Digit prefixes from each group start (and of the E.164 and national
+    forms), and digit suffixes"""
+    text = str(phone or "")
+    digits = phone_digits(text)
+    starts = {0}
+    position = 0
+    for group in _DIGIT_GROUP.findall(text):
+        starts.add(position)
+        position += len(group)
+    runs = {digits[start:] for start in starts}
+    key = normalize_phone(phone)
+    if key:
+        runs.add(key[1:])
+        if key[1:].startswith(DEFAULT_COUNTRY_CODE):
+            # National number of bare digits ("15551234567": 555...)
+            runs.add(key[1 + len(DEFAULT_COUNTRY_CODE):])
+    tokens = {run[:end] for run in runs for end in range(MIN_PHONE_DIGITS, len(run) + 1)}
+    tokens.update(digits[-end:] for end in range(MIN_PHONE_DIGITS, len(digits) + 1))
+    return tokens
+
+
+def search_document(contact: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": contact["id"],
+        "user_id": contact.get("user_id"),
+        "name": normalize_text(contact.get("name")),
+        "email": normalize_text(contact.get("email")),
+        "t": tokens_for(contact),
+    }
+
+
+def _tiers(query: str) -> List[Dict[str, Any]]:
+    """Filters for each ranking tier, best first"""
+    text = normalize_text(query)
+    words = text.split()
+    tiers = []
+    if text:
+        name_prefix = {"t": "n:" + text[:MAX_PREFIX]}
+        if len(text) > MAX_PREFIX:
+            name_prefix["name"] = {"$regex": "^" + re.escape(text)}
+        tiers.append(name_prefix)
+
+        # Every word must prefix a word of the name; the first one drives the index
+        word_prefixes = {"t": "w:" + words[0][:MAX_PREFIX]}
+        others = [{"t": "w:" + word[:MAX_PREFIX]} for word in words[1:]]
+        others += [{"name": {"$regex": "(^| )" + re.escape(word)}} for word in words if len(word) > MAX_PREFIX]
+        if others:
+            word_prefixes["$and"] = others
+        tiers.append(word_prefixes)
+
+        email_prefix = {"t": "e:" + text[:MAX_PREFIX]}
+        if len(text) > MAX_PREFIX:
+            email_prefix["email"] = {"$regex": "^" + re.escape(text)}
+        tiers.append(email_prefix)
+
+    digits = phone_digits(query)
+    if len(digits) >= MIN_PHONE_DIGITS:
+        phone = {"t": "p:" + digits}
+        # A query that looks like a phone number ranks phone matches first
+        if _PHONE_LIKE.match(query.strip()):
+            tiers.insert(0, phone)
+        else:
+            tiers.append(phone)
+    return tiers
+
+
+async def search(user_id: str, query: str, limit: int = MAX_RESULTS) -> Tuple[List[str], bool]:
+    """Ids of the user's contacts matching `query`, best first, and whether
+    more than `limit` matched (only the first `limit` are returned)"""
+    collection = get_async_collection(SEARCH_COLLECTION)
+    ranked: Dict[str, None] = {}
+    for tier in _tiers(query):
+        if len(ranked) > limit:
+            break
+        # One more than needed tells whether the results were cut off
+        docs = await (
+            collection.find({"user_id": user_id, **tier}, {"_id": 0, "id": 1})
+            .sort("name", 1)
+            .limit(limit + 1)
+            .to_list(length=None)
+        )
+        for doc in docs:
+            ranked.setdefault(doc["id"], None)
+    return list(ranked)[:limit], len(ranked) > limit
+
+
+async def index_contacts(contacts: Iterable[Optional[Dict[str, Any]]], new: bool = False):
+    """(Re)index contacts after they were inserted or changed
+
+    `new`: the contacts were just created, so plain inserts will do.
+    """
+    if new:
+        docs = [search_document(contact) for contact in contacts if contact and contact.get("id")]
+        if docs:
+            await get_async_collection(SEARCH_COLLECTION).insert_many(docs, ordered=False)
+        return
+    requests = [
+        ReplaceOne({"id": contact["id"]}, search_document(contact), upsert=True)
+        for contact in contacts if contact and contact.get("id")
+    ]
+    if requests:
+        await get_async_collection(SEARCH_COLLECTION).bulk_write(requests, ordered=False)
+
+
+async def reindex(query: Dict[str, Any]):
+    """Reindex the contacts matching `query` (after a partial update)"""
+    contacts = await get_async_collection("contacts").find(query, {"_id": 0}).to_list(length=None)
+    await index_contacts(contacts)
+
+
+async def unindex_contacts(ids: Iterable[str], user_id: Optional[str] = None):
+    query: Dict[str, Any] = {"id": {"$in": list(ids)}}
+    if user_id is not None:
+        query["user_id"] = user_id
+    await get_async_collection(SEARCH_COLLECTION).delete_many(query)
+
+
+async def ensure_built():
+    """Index all contacts if the search collection is empty (first start after upgrade)"""
+    search_collection = get_async_collection(SEARCH_COLLECTION)
+    contacts = get_async_collection("contacts")
+    if await search_collection.count_documents({}, limit=1) or not await contacts.count_documents({}, limit=1):
+        return
+    print("🔎 Building the contact search index")
+    indexed = 0
+    batch = []
+    async for contact in contacts.find({}, {"_id": 0, "id": 1, "user_id": 1, "name": 1, "email": 1, "phone": 1}):
+        batch.append(contact)
+        if len(batch) >= BATCH_SIZE:
+            await index_contacts(batch)
+            indexed += len(batch)
+            batch = []
+    await index_contacts(batch)
+    print(f"🔎 Indexed {indexed + len(batch)} contacts for search")
+
+
+def rebuild(db) -> int:
+    """Drop and rebuild the search index from all contacts (sync, for scripts)"""
+    search_collection = db[SEARCH_COLLECTION]
+    search_collection.delete_many({})
+    indexed = 0
+    batch = []
+    for contact in db["contacts"].find({}, {"_id": 0, "id": 1, "user_id": 1, "name": 1, "email": 1, "phone": 1}):
+        if contact.get("id"):
+            batch.append(search_document(contact))
+        if len(batch) >= BATCH_SIZE:
+            search_collection.insert_many(batch, ordered=False)
+            indexed += len(batch)
+            batch = []
+    if batch:
+        search_collection.insert_many(batch, ordered=False)
+    return indexed + len(batch)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python search_index.py rebuild")
+    from database import Database
+    Database.connect()
+    print(f"🔎 Indexed {rebuild(Database.get_database())} contacts for search")
+    Database.close()
@@ -4,6 +4,8 @@ Seed MongoDB with realistic data for WhatsApp Business Platform
 from database import Database, get_contacts_collection, get_messages_collection, get_campaigns_collection, get_templates_collection
 from datetime import datetime, timedelta
 import random
+import search_index
+from phone_utils import normalize_phone
 
 def seed_contacts():
     """Seed contacts collection with realistic data"""
@@ -214,8 +216,11 @@ def seed_contacts():
         }
     ]
     
+    for contact in contacts:
+        contact["phoneE164"] = normalize_phone(contact["phone"])
     contacts_collection.insert_many(contacts)
     print(f"✅ Seeded {len(contacts)} contacts")
+    search_index.rebuild(Database.get_database())
 
 def seed_messages():
     """Seed messages collection with chat history"""
@@ -286,6 +291,7 @@ def seed_messages():
             all_messages.append({
                 "id": str(message_id),
                 "phoneNumber": conv["phoneNumber"],
+                "phoneE164": normalize_phone(conv["phoneNumber"]),
                 "text": msg["text"],
                 "timestamp": (datetime.now() - timedelta(hours=msg["hours_ago"])).isoformat(),
                 "sent": msg["sent"],
@@ -0,0 +1,72 @@
+"""
+Fast JSON responses for MongoDB documents
+
+BSONJSONResponse encodes handler results with orjson in a single pass.
+ObjectId and other BSON values are converted by a default hook while
+encoding; datetimes and UUIDs are handled by orjson natively. Documents no
+longer have to be rebuilt in Python first.
+
+FastAPI runs every returned value through jsonable_encoder before the
+response class sees it, which is a second full copy. BSONJSONRoute skips
+that step for handlers that return plain data. It is installed as the
+app's route class in main.py.
+"""
+import asyncio
+import functools
+from collections.abc import Mapping
+from typing import Any
+
+import orjson
+from bson import Decimal128, ObjectId
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.dependencies.utils import get_typed_return_annotation
+from fastapi.responses import ORJSONResponse
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+from starlette.responses import Response
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, Mapping):
+        return dict(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class BSONJSONResponse(ORJSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class BSONJSONRoute(APIRoute):
+    """Route whose handler results go straight to BSONJSONResponse"""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        response_model = kwargs.get("response_model")
+        if isinstance(response_model, DefaultPlaceholder):
+            response_model = get_typed_return_annotation(endpoint)
+        # Validated responses and sync handlers keep FastAPI's own path
+        if response_model is None and asyncio.iscoroutinefunction(endpoint):
+            endpoint = self._respond_directly(endpoint, kwargs.get("status_code"))
+        super().__init__(path, endpoint, **kwargs)
+
+    @staticmethod
+    def _respond_directly(endpoint, status_code):
+        @functools.wraps(endpoint)
+        async def run(*args, **kwargs):
+            result = await endpoint(*args, **kwargs)
+            if isinstance(result, Response):
+                return result
+            return BSONJSONResponse(result, status_code=status_code or 200)
+        return run
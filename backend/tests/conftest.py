@@ -0,0 +1,36 @@
+"""
+Shared fixtures: an empty in-memory mock database behind the Database handlers
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from indexes import ensure_indexes
+from mock_db import AsyncMockClient, MockClient
+
+
+@pytest.fixture
+def db():
+    """Sync view of an unseeded (never persisted) mock; async handlers
+    (get_async_collection) see the same data"""
+    client = MockClient(seed=False)
+    database = client["test"]
+    ensure_indexes(database)
+    Database._swap_clients(client, AsyncMockClient(client))
+    yield database
+    Database._swap_clients(None, None)
+
+
+@pytest.fixture
+def api(db, monkeypatch):
+    """TestClient on the `db` mock, authenticated as DEBUG mode's default_user;
+    the lifespan (connect, background workers) is not run"""
+    from fastapi.testclient import TestClient
+    import main
+
+    monkeypatch.setattr(main, "DEBUG", True)
+    return TestClient(main.app)
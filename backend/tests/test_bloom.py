@@ -0,0 +1,128 @@
+"""
+Phone Bloom filters: scalable layers, error rate, and when they are used
+"""
+import asyncio
+import sys
+import types
+
+import pytest
+
+import bloom
+from bloom import BloomFilter, PhoneFilters
+
+
+def test_filters_grow_without_false_negatives():
+    bloom_filter = BloomFilter(capacity=100, error_rate=0.01)
+    keys = [f"+1555{i:07d}" for i in range(1000)]
+    for key in keys:
+        bloom_filter.add(key)
+    count = len(bloom_filter)
+    # Keys the filter (falsely) reports as present are not added again
+    assert 980 <= count <= 1000
+    bloom_filter.add(keys[0])
+    assert len(bloom_filter) == count
+    assert all(key in bloom_filter for key in keys)
+    assert [layer.capacity for layer in bloom_filter.layers] == [100, 200, 400, 800]
+    # Each layer gets a tighter share of the error rate
+    assert bloom_filter.layers[1].bits / 200 < bloom_filter.layers[2].bits / 400
+
+
+def test_error_rate():
+    bloom_filter = BloomFilter(capacity=500, error_rate=0.01)
+    for i in range(5000):
+        bloom_filter.add(f"+1555{i:07d}")
+    assert bloom_filter.false_positive_rate() <= 0.01
+    absent = 20000
+    false_positives = sum(f"+4420{i:07d}" in bloom_filter for i in range(absent))
+    assert false_positives / absent <= 0.015
+
+
+@pytest.fixture
+def filters(db):
+    db["contacts"].insert_many([
+        {"id": "1", "user_id": "u", "phoneE164": "+15550000001"},
+        {"id": "2", "user_id": "v", "phoneE164": "+15550000002"},
+        # Not backfilled yet: normalized while building
+        {"id": "3", "user_id": "u", "phone": "(555) 000-0003"},
+    ])
+    return PhoneFilters(enabled=True)
+
+
+def test_everything_might_exist_until_built(filters):
+    assert not filters.answers("+15559999999")
+    assert filters.might_exist("u", "+15559999999")
+    assert filters.checks == 0
+
+    asyncio.run(filters.rebuild())
+    assert filters.ready
+    assert filters.might_exist("u", "+15550000001")
+    assert filters.might_exist("u", "+15550000003")
+    assert not filters.might_exist("u", "+15559999999")
+    # Tenants are separate; None covers every tenant (webhook)
+    assert not filters.might_exist("u", "+15550000002")
+    assert filters.might_exist(None, "+15550000002")
+    assert not filters.might_exist("nobody", "+15550000001")
+    # Phones without a key are always looked up
+    assert filters.might_exist("u", None)
+    assert filters.stats()["lookupsSaved"] == 3
+
+    filters.add("u", "+15559999999")
+    assert filters.might_exist("u", "+15559999999")
+
+    filters.invalidate()
+    assert not filters.ready and filters.might_exist("u", "+15558888888")
+
+
+def test_writes_during_a_build_are_kept(filters):
+    async def build():
+        task = asyncio.create_task(filters.rebuild())
+        await asyncio.sleep(0)
+        filters.add("u", "+15557777777")
+        await task
+
+    asyncio.run(build())
+    assert filters.might_exist("u", "+15557777777")
+
+
+def test_disabled_filters_let_everything_through(filters):
+    filters.enabled = False
+    asyncio.run(filters.rebuild())
+    assert filters.might_exist("u", "+15559999999")
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """Pretend to be served by uvicorn, in a single process"""
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    monkeypatch.setitem(sys.modules, "uvicorn", types.ModuleType("uvicorn"))
+    monkeypatch.delitem(sys.modules, "gunicorn", raising=False)
+    return monkeypatch
+
+
+def started(enabled=None):
+    filters = PhoneFilters(enabled=enabled)
+    filters.start()   # no event loop: decides without building
+    return filters.enabled
+
+
+def test_auto_mode_needs_a_single_uvicorn_process(server):
+    assert started()
+    server.setenv("WEB_CONCURRENCY", "4")
+    assert not started()
+    server.delenv("WEB_CONCURRENCY")
+    # Gunicorn workers are forked and don't know how many siblings they have
+    server.setitem(sys.modules, "gunicorn", types.ModuleType("gunicorn"))
+    assert not started()
+    assert not started(True)
+    server.delitem(sys.modules, "gunicorn")
+    # Not served by uvicorn (scripts, other servers): only when asked for
+    server.delitem(sys.modules, "uvicorn")
+    assert not started()
+    assert started(True)
+    assert not started(False)
+
+
+def test_uvicorn_workers_are_several_processes(server):
+    server.setattr(bloom.multiprocessing, "parent_process", lambda: object())
+    assert bloom.app_processes() == 2
+    assert not started() and not started(True)
@@ -0,0 +1,71 @@
+"""
+Streamed contact export: the same contacts as /contacts, as CSV, NDJSON or JSON
+"""
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+import contact_export
+
+
+@pytest.fixture
+def contacts(db, monkeypatch):
+    # Small chunks, so the responses are streamed in several pieces
+    monkeypatch.setattr(contact_export, "CHUNK_SIZE", 256)
+    docs = [
+        {"id": f"c{i:02d}", "user_id": "default_user", "name": f"Name, {i}", "phone": f"+1555000{i:04d}",
+         "email": f"c{i}@example.com", "tags": ["VIP", "New"] if i % 2 else [], "status": "Active",
+         "notes": 'says "hi"\nthen leaves' if i == 3 else None, "createdAt": f"2024-01-{i % 28 + 1:02d}T00:00:00"}
+        for i in range(30)
+    ]
+    db["contacts"].insert_many([dict(doc) for doc in docs])
+    db["contacts"].insert_one({"id": "other", "user_id": "someone_else", "name": "Hidden"})
+    return docs
+
+
+def listed(api):
+    return {doc["id"]: doc for doc in api.get("/contacts", params={"limit": 100}).json()["contacts"]}
+
+
+def test_csv_matches_the_contact_list(api, contacts):
+    response = api.get("/contacts/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.headers["content-disposition"].startswith('attachment; filename="contacts-')
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert list(rows[0]) == contact_export.EXPORT_FIELDS
+    expected = listed(api)
+    assert sorted(row["id"] for row in rows) == sorted(expected)
+    for row in rows:
+        contact = expected[row["id"]]
+        assert (row["name"], row["phone"], row["email"], row["status"]) == (
+            contact["name"], contact["phone"], contact["email"], contact["status"])
+        assert row["tags"] == ",".join(contact["tags"])
+    assert next(row for row in rows if row["id"] == "c03")["notes"] == 'says "hi"\nthen leaves'
+
+
+def test_ndjson_and_json(api, contacts):
+    expected = listed(api)
+    lines = api.get("/contacts/export", params={"format": "ndjson"}).text.splitlines()
+    docs = [json.loads(line) for line in lines]
+    assert sorted(doc["id"] for doc in docs) == sorted(expected)
+    for doc in docs:
+        assert {key: doc[key] for key in expected[doc["id"]]} == expected[doc["id"]]
+    assert api.get("/contacts/export", params={"format": "json"}).json() == docs
+
+
+def test_gzip(api, contacts):
+    plain = api.get("/contacts/export", params={"format": "ndjson"}).content
+    response = api.get("/contacts/export", params={"format": "ndjson", "compression": "gzip"})
+    assert response.headers["content-type"] == "application/gzip"
+    assert 'filename="contacts-' in response.headers["content-disposition"]
+    assert response.headers["content-disposition"].endswith('.ndjson.gz"')
+    assert gzip.decompress(response.content) == plain
+
+
+def test_bad_options(api, contacts):
+    assert api.get("/contacts/export", params={"format": "xml"}).status_code == 400
+    assert api.get("/contacts/export", params={"compression": "br"}).status_code == 400
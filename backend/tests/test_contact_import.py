@@ -0,0 +1,154 @@
+"""
+Contact import: duplicate checks per chunk, per-row errors and CSV uploads
+"""
+import asyncio
+import io
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+from contact_import import (
+    ImportResult, csv_columns, csv_contact, header_columns, import_contacts, prepare_rows, read_csv, write_contacts,
+)
+from database import get_async_collection
+
+
+def contact(name, phone, **fields):
+    return {"name": name, "phone": phone, **fields}
+
+
+def test_rows_are_reported_with_their_reason(db):
+    db["contacts"].insert_one({"id": "old", "user_id": "default_user", "name": "Old", "phone": "+1 555 000 0001",
+                               "phoneE164": "+15550000001"})
+    rows = [
+        contact("A", "(555) 000-0001"),          # the user already has it
+        contact("B", "+1 555 000 0002"),
+        contact("C", "15550000002"),             # same E.164 key as B
+        {"name": "D"},                           # no phone
+        "not an object",
+        contact("E", "911"),                     # no E.164 key: compared as text
+        contact("F", "911"),
+        contact("G", "+1 555 000 0003", tags=["VIP"]),
+    ]
+    result = asyncio.run(import_contacts("default_user", rows, chunk_size=3))
+    assert (result.imported, result.skipped) == (3, 5)
+    assert sorted((error["row"], error["name"], error["reason"]) for error in result.row_errors) == [
+        (0, "A", "phone already exists"),
+        (2, "C", "phone repeated in the import"),
+        (3, "D", "missing name or phone"),
+        (4, None, "not a contact object"),
+        (6, "F", "phone already exists"),      # next chunk: found by the pre-check
+    ]
+    assert sorted(doc["name"] for doc in db["contacts"].find({"user_id": "default_user"})) == ["B", "E", "G", "Old"]
+
+
+def test_endpoint_response(api, db):
+    response = api.post("/contacts/import", json={"contacts": [contact("A", "+15550000001"), {"phone": "+1555"}]})
+    body = response.json()
+    assert (body["imported"], body["skipped"]) == (1, 1)
+    assert body["rowErrors"] == [{"row": 1, "name": None, "reason": "missing name or phone"}]
+    assert body["errors"] == ["Skipped contact (row 2): missing name or phone"]
+    assert api.post("/contacts/import", json={"contacts": []}).status_code == 400
+
+
+class NoPreCheck:
+    """Contacts collection whose lookups find nothing, as if the duplicate
+    was inserted between the pre-check and insert_many"""
+
+    def __init__(self, collection, errors=()):
+        self._collection = collection
+        self._errors = list(errors)
+
+    def find(self, *args, **kwargs):
+        return self._collection.find({"id": None})
+
+    async def insert_many(self, docs, ordered=True):
+        try:
+            return await self._collection.insert_many(docs, ordered=ordered)
+        except BulkWriteError as e:
+            e.details["writeErrors"] += self._errors
+            raise
+
+    def __getattr__(self, attr):
+        return getattr(self._collection, attr)
+
+
+def test_unique_index_races_are_row_errors(db):
+    db["contacts"].insert_one({"id": "old", "user_id": "u", "name": "Old", "phoneE164": "+15550000001"})
+    collection = get_async_collection("contacts")
+    candidates, _ = prepare_rows([contact("A", "+15550000001"), contact("B", "+15550000002"),
+                                  contact("C", "+15550000003")], 10, "u", "now")
+    result = ImportResult()
+    validation = {"index": 2, "code": 121, "errmsg": "Document failed validation"}
+    asyncio.run(write_contacts(NoPreCheck(collection, [validation]), "u", candidates, result))
+    # ordered=False: the rows after the duplicate still went in
+    assert result.imported == 1
+    assert [(error["row"], error["reason"]) for error in result.row_errors] == [
+        (10, "phone already exists"), (12, "Document failed validation"),
+    ]
+    assert db["contacts"].find_one({"phoneE164": "+15550000002"})["name"] == "B"
+
+
+def test_row_errors_are_capped(db, monkeypatch):
+    import contact_import
+    monkeypatch.setattr(contact_import, "MAX_ROW_ERRORS", 3)
+    result = asyncio.run(import_contacts("u", [{"name": "x"}] * 5))
+    assert result.skipped == 5 and len(result.row_errors) == 3
+    assert result.to_dict()["message"] == "Imported 0 contacts, skipped 5"
+
+
+def test_csv_header_aliases():
+    header = ["Full Name", "WhatsApp Number", "E-mail", "Email Address", "labels", "Note", "id", "createdAt", "Company", ""]
+    assert csv_columns(header) == [
+        "name", "phone", "email",
+        "customFields.Email Address",      # the field already has a column
+        "tags", "notes", None, None, "customFields.Company", None,
+    ]
+    assert csv_contact([" Ann ", "+1 555", "", "a@b.c", "VIP; New,,", "", "x", "y", "Acme", "z"],
+                       csv_columns(header)) == {
+        "name": "Ann", "phone": "+1 555", "tags": ["VIP", "New"],
+        "customFields": {"Email Address": "a@b.c", "Company": "Acme"},
+    }
+    with pytest.raises(ValueError):
+        header_columns(["Name", "Email"])
+    with pytest.raises(ValueError):
+        header_columns(None)
+
+
+def test_read_csv_in_chunks():
+    data = "\ufeffName,Phone,Tags\r\nAnn,+15550000001,\"VIP,New\"\r\n,,\r\n\"Bob\nJr\",+15550000002,\r\nCy,555 000 0003,x\r\n"
+
+    async def read():
+        return [row async for row in read_csv(io.BytesIO(data.encode()), chunk_size=1)]
+
+    assert asyncio.run(read()) == [
+        {"name": "Ann", "phone": "+15550000001", "tags": ["VIP", "New"]},
+        {"name": "Bob\nJr", "phone": "+15550000002"},
+        {"name": "Cy", "phone": "555 000 0003", "tags": ["x"]},
+    ]
+
+
+@pytest.fixture
+def serial(monkeypatch):
+    import import_pool
+    monkeypatch.setattr(import_pool, "IMPORT_WORKERS", 1)
+
+
+def test_upload(api, db, serial):
+    data = b"Name,Mobile,Email\nAnn,+15550000001,ann@example.com\nBob,+15550000001,\nCy,,\n"
+    body = api.post("/contacts/import/upload", files={"file": ("contacts.csv", data, "text/csv")}).json()
+    assert (body["imported"], body["skipped"]) == (1, 2)
+    assert [(error["row"], error["reason"]) for error in body["rowErrors"]] == [
+        (1, "phone repeated in the import"), (2, "missing name or phone"),
+    ]
+    assert db["contacts"].find_one({"name": "Ann"})["email"] == "ann@example.com"
+
+
+def test_upload_errors(api, db, serial):
+    def upload(data):
+        return api.post("/contacts/import/upload", files={"file": ("contacts.csv", data, "text/csv")})
+
+    response = upload(b"Name,Email\nAnn,a@b.c\n")
+    assert response.status_code == 400 and "name and a phone column" in response.json()["detail"]
+    response = upload(b"Name,Phone\nAnn,+15550000001\nB\xe9b,+15550000002\n")
+    assert response.status_code == 400 and response.json()["detail"].startswith("Invalid CSV")
@@ -0,0 +1,117 @@
+"""
+Cached list totals: invalidation by write generation, TTL and the estimate cap
+"""
+import asyncio
+import re
+
+import pytest
+
+import count_cache
+from count_cache import CountCache, count, counts, normalize_filter, page_totals
+
+
+def test_filters_are_normalized():
+    assert normalize_filter({"a": 1, "b": 2}) == normalize_filter({"b": 2, "a": 1})
+    assert normalize_filter({"name": re.compile("x", re.I)}) != normalize_filter({"name": re.compile("x")})
+
+
+def test_writes_invalidate_their_tenant():
+    cache = CountCache()
+    for tenant in ("u", "v"):
+        cache.put("contacts", {"user_id": tenant, "status": "Active"}, 5, cache.stamp("contacts", {"user_id": tenant}))
+    cache.put("contacts", {}, 10, cache.stamp("contacts", {}))
+
+    cache.invalidate("contacts", "u")
+    assert cache.get("contacts", {"user_id": "u", "status": "Active"}) is None
+    assert cache.get("contacts", {"user_id": "v", "status": "Active"}) == 5
+    # Queries across tenants see every tenant's writes
+    assert cache.get("contacts", {}) is None
+
+
+def test_writes_of_unknown_tenants_bump_the_epoch():
+    cache = CountCache()
+    for tenant in ("u", "v"):
+        cache.put("templates", {"user_id": tenant}, 3, cache.stamp("templates", {"user_id": tenant}))
+    cache.put("contacts", {"user_id": "u"}, 3, cache.stamp("contacts", {"user_id": "u"}))
+    cache.invalidate("templates")
+    assert cache.get("templates", {"user_id": "u"}) is None and cache.get("templates", {"user_id": "v"}) is None
+    assert cache.get("contacts", {"user_id": "u"}) == 3
+
+
+def test_counts_racing_a_write_are_stale():
+    cache = CountCache()
+    stamp = cache.stamp("contacts", {"user_id": "u"})
+    cache.invalidate("contacts", "u")   # lands while the count runs
+    cache.put("contacts", {"user_id": "u"}, 7, stamp)
+    assert cache.get("contacts", {"user_id": "u"}) is None
+    assert cache.get("contacts", {"user_id": "u"}, stale=True) == 7
+
+
+def test_adjust_keeps_unfiltered_totals():
+    cache = CountCache()
+    for query, total in (({}, 10), ({"user_id": "u"}, 4), ({"user_id": "v"}, 6), ({"user_id": "u", "status": "Active"}, 2)):
+        cache.put("contacts", query, total, cache.stamp("contacts", query))
+    cache.adjust("contacts", "u", -1)
+    assert cache.get("contacts", {}) == 9
+    assert cache.get("contacts", {"user_id": "u"}) == 3
+    assert cache.get("contacts", {"user_id": "v"}) == 6
+    assert cache.get("contacts", {"user_id": "u", "status": "Active"}) is None
+
+
+def test_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(count_cache.time, "monotonic", lambda: now[0])
+    cache = CountCache(ttl=60)
+    cache.put("contacts", {"user_id": "u"}, 1, cache.stamp("contacts", {"user_id": "u"}))
+    now[0] += 59
+    assert cache.get("contacts", {"user_id": "u"}) == 1
+    now[0] += 2
+    assert cache.get("contacts", {"user_id": "u"}) is None
+    assert cache.get("contacts", {"user_id": "u"}, max_age=120) == 1
+
+
+def test_lru_capacity():
+    cache = CountCache(capacity=2)
+    for tenant in "abc":
+        cache.put("contacts", {"user_id": tenant}, 1, (0, 0))
+    assert cache.stats()["entries"] == 2
+    assert cache.get("contacts", {"user_id": "a"}) is None
+
+
+@pytest.fixture
+def capped(db, monkeypatch):
+    monkeypatch.setattr(count_cache, "COUNT_ESTIMATE_LIMIT", 5)
+    counts.clear()
+    db["contacts"].insert_many([{"id": str(i), "user_id": "u" if i < 8 else "v"} for i in range(10)])
+    yield db["contacts"]
+    counts.clear()
+
+
+def test_estimates_stop_at_the_limit(capped):
+    from database import get_async_collection
+    contacts = get_async_collection("contacts")
+    # Under the limit: exact, and cached
+    assert asyncio.run(count("contacts", contacts, {"user_id": "v"}, estimate=True)) == (2, False)
+    # Over the limit, nothing known: unknown total
+    assert asyncio.run(count("contacts", contacts, {"user_id": "u"}, estimate=True)) == (None, True)
+    assert page_totals(None, True, 20) == {"total": None, "totalEstimated": True, "totalAtLeast": 5, "pages": None}
+    # Unfiltered: collection stats
+    assert asyncio.run(count("contacts", contacts, {}, estimate=True)) == (10, True)
+    # A last known count (even from before later writes) is used as the estimate
+    assert asyncio.run(count("contacts", contacts, {"user_id": "u"})) == (8, False)
+    counts.invalidate("contacts", "u")
+    assert asyncio.run(count("contacts", contacts, {"user_id": "u"}, estimate=True)) == (8, True)
+    assert page_totals(8, True, 5) == {"total": 8, "totalEstimated": True, "pages": 2}
+
+
+def test_deleting_a_template_keeps_other_tenants_totals(db):
+    import main
+
+    counts.clear()
+    db["templates"].insert_many([{"id": "t1", "user_id": "u"}, {"id": "t2", "user_id": "u"}, {"id": "t3", "user_id": "v"}])
+    for tenant in ("u", "v"):
+        counts.put("templates", {"user_id": tenant}, 2 if tenant == "u" else 1, counts.stamp("templates", {"user_id": tenant}))
+    asyncio.run(main.delete_template("t1", user={"user_id": "u"}))
+    assert counts.get("templates", {"user_id": "u"}) == 1
+    assert counts.get("templates", {"user_id": "v"}) == 1
+    counts.clear()
@@ -0,0 +1,124 @@
+"""
+Background export jobs: claiming, stale restarts and resumable downloads
+"""
+import asyncio
+import gzip
+import time
+
+import pytest
+
+import export_jobs
+from export_jobs import ExportWorker
+
+
+@pytest.fixture
+def jobs(api, db, tmp_path, monkeypatch):
+    monkeypatch.setattr(export_jobs, "EXPORT_DIR", str(tmp_path))
+    db["contacts"].insert_many([
+        {"id": f"c{i}", "user_id": "default_user", "name": f"N{i}", "phone": f"+1555000{i:04d}"}
+        for i in range(50)
+    ])
+    db["contacts"].insert_one({"id": "other", "user_id": "someone_else", "name": "Hidden"})
+    return db[export_jobs.JOBS_COLLECTION]
+
+
+def run_next(worker):
+    """Claim and run one job, as the worker loop does"""
+    async def run():
+        job = await worker._claim()
+        if job is not None:
+            await worker._export(job)
+        return job
+    return asyncio.run(run())
+
+
+def test_job_runs_and_downloads(api, jobs):
+    response = api.post("/contacts/export/jobs", json={"format": "ndjson"})
+    assert response.status_code == 202
+    job = response.json()
+    assert (job["status"], job["compression"], job["progress"]) == ("queued", "gzip", 0.0)
+
+    assert run_next(ExportWorker())["id"] == job["id"]
+    job = api.get(f"/contacts/export/jobs/{job['id']}").json()
+    assert (job["status"], job["processed"], job["total"], job["progress"]) == ("done", 50, 50, 100.0)
+    assert [listed["id"] for listed in api.get("/contacts/export/jobs").json()["jobs"]] == [job["id"]]
+
+    response = api.get(job["downloadUrl"])
+    assert response.status_code == 200 and len(response.content) == job["size"]
+    lines = gzip.decompress(response.content).decode().splitlines()
+    assert len(lines) == 50 and "Hidden" not in lines
+
+
+def test_range_requests_resume_downloads(api, jobs):
+    job = api.post("/contacts/export/jobs", json={"format": "csv", "compression": None}).json()
+    run_next(ExportWorker())
+    url = f"/contacts/export/jobs/{job['id']}/download"
+    whole = api.get(url).content
+
+    response = api.get(url, headers={"Range": "bytes=100-"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 100-{len(whole) - 1}/{len(whole)}"
+    assert whole[:100] + response.content == whole
+
+
+class Interleaved:
+    """Jobs collection whose reads yield to the event loop, so two claims overlap"""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def find(self, *args, **kwargs):
+        cursor = self._collection.find(*args, **kwargs)
+        to_list = cursor.to_list
+
+        async def yielding(length=None):
+            docs = await to_list(length)
+            await asyncio.sleep(0)
+            return docs
+
+        cursor.to_list = yielding
+        return cursor
+
+    def __getattr__(self, attr):
+        return getattr(self._collection, attr)
+
+
+def test_claims_are_compare_and_set(jobs, monkeypatch):
+    worker, other = ExportWorker(), ExportWorker()
+    job = asyncio.run(worker.submit("default_user"))
+    collection = export_jobs._collection()
+    monkeypatch.setattr(export_jobs, "_collection", lambda: Interleaved(collection))
+
+    async def race():
+        # Both workers see the job queued before either claims it
+        return await asyncio.gather(worker._claim(), other._claim())
+
+    claimed = [claim for claim in asyncio.run(race()) if claim is not None]
+    assert [claim["id"] for claim in claimed] == [job["id"]]
+    assert jobs.find_one({"id": job["id"]})["status"] == "running"
+    # Running with a fresh heartbeat: nobody else takes it
+    assert asyncio.run(other._claim()) is None
+
+
+def test_stale_jobs_are_restarted(api, jobs):
+    job = asyncio.run(ExportWorker().submit("default_user", "csv", None))
+    # Claimed by a worker that died before finishing
+    jobs.update_one({"id": job["id"]}, {"$set": {
+        "status": "running", "processed": 20, "heartbeat": time.time() - export_jobs.EXPORT_STALE_AFTER - 1,
+    }})
+    assert run_next(ExportWorker())["id"] == job["id"]
+    done = jobs.find_one({"id": job["id"]})
+    assert (done["status"], done["processed"]) == ("done", 50)
+    assert api.get(f"/contacts/export/jobs/{job['id']}/download").text.count("\n") == 51
+
+
+def test_download_errors(api, jobs):
+    job = api.post("/contacts/export/jobs", json={}).json()
+    url = f"/contacts/export/jobs/{job['id']}/download"
+    assert api.get(url).status_code == 409
+    run_next(ExportWorker())
+    export_jobs._remove(export_jobs.file_path(jobs.find_one({"id": job["id"]})))
+    assert api.get(url).status_code == 410
+    assert api.get("/contacts/export/jobs/nope").status_code == 404
+    assert api.delete(f"/contacts/export/jobs/{job['id']}").json() == {"success": True}
+    assert api.get(url).status_code == 404
@@ -0,0 +1,167 @@
+"""
+Failover supervisor: demote to the mock after failed probes, serve cached
+reads, buffer writes and replay them in order on promote
+"""
+import asyncio
+
+import pytest
+
+from database import Database, get_async_collection
+from failover import FailoverSupervisor, JournalingCollection, WriteBufferFull
+from mock_db import AsyncMockClient, MockClient
+
+
+class FakeMotor:
+    """Stands in for the real cluster: an unseeded mock whose ping can fail"""
+
+    def __init__(self):
+        self.up = True
+        self.pings = 0
+        self.store = AsyncMockClient(MockClient(seed=False))
+        self.admin = self
+
+    async def command(self, name):
+        self.pings += 1
+        if not self.up:
+            raise ConnectionError("down")
+
+    def __getitem__(self, name):
+        return self.store[name]
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def real(monkeypatch):
+    monkeypatch.setenv("MONGODB_DB_NAME", "test")
+    client = FakeMotor()
+    contacts = client["test"]["contacts"]
+    for i in range(1, 4):
+        asyncio.run(contacts.insert_one({"id": f"c{i}", "name": f"N{i}", "user_id": "u", "phone": f"+{i}"}))
+    Database._swap_clients(None, client)
+    Database.supervisor = FailoverSupervisor(Database, client)
+    yield client
+    Database.supervisor = None
+    Database._swap_clients(None, None)
+
+
+def stored(client):
+    docs = asyncio.run(client["test"]["contacts"].find({}, {"_id": 0}).to_list(None))
+    return {doc["id"]: doc["name"] for doc in docs}
+
+
+def test_demotes_after_the_threshold(real):
+    supervisor = Database.supervisor
+    supervisor.interval, supervisor.threshold = 0.01, 3
+
+    async def outage():
+        supervisor.start()
+        real.up = False
+        for _ in range(200):
+            if supervisor.degraded:
+                break
+            await asyncio.sleep(0.01)
+        await supervisor.stop()
+
+    asyncio.run(outage())
+    assert supervisor.degraded and Database.is_mock()
+    assert supervisor.failovers == 1 and real.pings >= 3 and supervisor.failures >= 3
+
+
+def test_outage_reads_come_from_the_cache(real):
+    supervisor = Database.supervisor
+
+    async def read():
+        contacts = get_async_collection("contacts")
+        await contacts.find_one({"id": "c1"})
+        # Projected: cached as a partial document, with user_id fetched along
+        await contacts.find({"id": "c2"}, {"name": 1}).to_list(None)
+        supervisor.demote(ConnectionError("down"))
+        contacts = get_async_collection("contacts")
+        return await contacts.find({"user_id": "u"}, {"_id": 0}).sort("id", 1).to_list(None)
+
+    assert asyncio.run(read()) == [
+        {"id": "c1", "name": "N1", "user_id": "u", "phone": "+1"},
+        {"id": "c2", "name": "N2", "user_id": "u"},
+    ]
+    assert supervisor.status()["partial_cached_documents"] == 1
+
+
+def test_buffer_limit(real):
+    supervisor = Database.supervisor
+    supervisor.max_buffered = 2
+    supervisor.demote(ConnectionError("down"))
+
+    async def write():
+        contacts = get_async_collection("contacts")
+        assert isinstance(contacts, JournalingCollection)
+        await contacts.insert_one({"id": "c4", "user_id": "u"})
+        await contacts.insert_one({"id": "c5", "user_id": "u"})
+        with pytest.raises(WriteBufferFull):
+            await contacts.insert_one({"id": "c6", "user_id": "u"})
+        return await contacts.count_documents({})
+
+    assert asyncio.run(write()) == 2
+    assert len(supervisor.buffered) == 2
+
+
+def test_promote_replays_writes_in_order(real):
+    supervisor = Database.supervisor
+    supervisor.demote(ConnectionError("down"))
+
+    async def write():
+        contacts = get_async_collection("contacts")
+        # Each write depends on the one before it
+        await contacts.insert_one({"id": "c4", "name": "N4", "user_id": "u"})
+        await contacts.update_one({"id": "c4"}, {"$set": {"name": "renamed"}})
+        await contacts.delete_one({"id": "c1"})
+        await contacts.update_one({"id": "c3"}, {"$set": {"name": "N3b"}})
+        await supervisor.promote()
+
+    asyncio.run(write())
+    assert not supervisor.degraded and not Database.is_mock()
+    assert stored(real) == {"c2": "N2", "c3": "N3b", "c4": "renamed"}
+    assert supervisor.status()["buffered_writes"] == 0
+    assert supervisor.replayed == 4 and supervisor.rejected == 0
+
+
+def test_writes_invalidate_the_cache_in_every_state(real):
+    supervisor = Database.supervisor
+
+    async def run():
+        contacts = get_async_collection("contacts")
+        await contacts.find({}).to_list(None)
+        assert len(supervisor.cache) == 3
+        supervisor.demote(ConnectionError("down"))
+        journaling = get_async_collection("contacts")
+        await journaling.update_one({"id": "c1"}, {"$set": {"name": "during"}})
+        assert ("contacts", "c1") not in dict(supervisor.cache.items())
+        await supervisor.promote()
+        # A handle fetched during the outage now writes to MongoDB
+        await journaling.update_one({"id": "c2"}, {"$set": {"name": "after"}})
+        return sorted(key for (_, key), _ in supervisor.cache.items())
+
+    assert asyncio.run(run()) == ["c3"]
+    assert stored(real) == {"c1": "during", "c2": "after", "c3": "N3"}
+
+
+def test_startup_on_the_mock_never_buffers(monkeypatch):
+    monkeypatch.setenv("MONGODB_URL", "mongodb://127.0.0.1:1/")
+    monkeypatch.setenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "200")
+    monkeypatch.setenv("MONGODB_FAILOVER", "True")
+    monkeypatch.delenv("MOCK_DB_PATH", raising=False)
+
+    async def start():
+        await Database.connect_async(ensure_indexes=False)
+        try:
+            contacts = get_async_collection("contacts")
+            await contacts.insert_one({"id": "new", "user_id": "u"})
+            return Database.supervisor, contacts, await contacts.count_documents({"id": "new"})
+        finally:
+            await Database.close_async()
+
+    supervisor, contacts, count = asyncio.run(start())
+    assert supervisor is None
+    assert not isinstance(contacts, JournalingCollection)
+    assert count == 1
@@ -0,0 +1,97 @@
+"""
+Parallel CSV import: byte ranges parsed in worker processes, with the
+serial fallback for quoted line breaks on a range boundary
+"""
+import asyncio
+import csv
+import io
+
+import pytest
+
+import import_pool
+from contact_import import ImportResult, header_columns
+
+HEADER = ["Name", "Phone", "Notes"]
+
+
+def csv_file(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(HEADER)
+    writer.writerows(rows)
+    return buffer.getvalue().encode()
+
+
+def rows(count, notes=lambda i: f"note {i}"):
+    # Every 10th phone repeats an earlier one, every 17th row has no phone
+    return [
+        [f"Contact {i}", "" if i % 17 == 5 else f"+1555{i - i % 10 if i % 10 == 9 else i:07d}", notes(i)]
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def pool(db, monkeypatch):
+    monkeypatch.setattr(import_pool, "IMPORT_RANGE_BYTES", 512)
+    yield
+    import_pool.shutdown()
+
+
+def run_import(user_id, data, workers):
+    return asyncio.run(import_pool.import_csv(user_id, io.BytesIO(data), ImportResult(), workers=workers))
+
+
+def skipped(result):
+    """Skipped rows in row order; a repeat in a later range is found by the
+    existing-phone check instead of within its chunk"""
+    return sorted(
+        (error["row"], "duplicate" if error["reason"].startswith("phone ") else error["reason"])
+        for error in result.row_errors
+    )
+
+
+def imported(db, user_id):
+    return sorted((doc["name"], doc["phoneE164"], doc["notes"]) for doc in db["contacts"].find({"user_id": user_id}))
+
+
+def test_ranges_end_at_line_breaks():
+    file = io.BytesIO(b"a,b\n" + b"1234567,x\n" * 3)
+    file.readline()
+    assert import_pool.read_range(file, 5) == (4, b"1234567,x\n")
+    assert import_pool.read_range(file, 20) == (14, b"1234567,x\n1234567,x\n")
+    assert import_pool.read_range(file, 20) == (34, b"")
+
+
+def test_parse_range():
+    columns = header_columns(HEADER)
+    data = csv_file(rows(20)).split(b"\n", 1)[1]
+    candidates, skipped, count, _ = import_pool.parse_range(data, columns, "u", "now")
+    assert count == 20 and len(candidates) + len(skipped) == 20
+    assert [(row, reason) for row, _, reason in skipped] == [
+        (5, "missing name or phone"), (9, "phone repeated in the import"), (19, "phone repeated in the import"),
+    ]
+    # Cut inside a quoted field
+    with pytest.raises(csv.Error):
+        import_pool.parse_range(b'Ann,+15550000001,"first line\n', columns, "u", "now")
+
+
+def test_parallel_import_matches_serial(db, pool):
+    data = csv_file(rows(200))
+    parallel = run_import("p", data, workers=2)
+    serial = run_import("s", data, workers=1)
+    assert parallel.stages["workers"] == 2 and "serial" not in parallel.stages
+    assert parallel.stages["rows"] == 200
+    assert (parallel.imported, parallel.skipped) == (serial.imported, serial.skipped)
+    assert skipped(parallel) == skipped(serial)
+    assert imported(db, "p") == imported(db, "s")
+
+
+def test_quoted_line_breaks_fall_back_to_serial(db, pool):
+    data = csv_file(rows(200, notes=lambda i: f"line one of {i}\nline two"))
+    parallel = run_import("p", data, workers=2)
+    serial = run_import("s", data, workers=1)
+    assert "serial" in parallel.stages
+    assert (parallel.imported, parallel.skipped) == (serial.imported, serial.skipped)
+    assert skipped(parallel) == skipped(serial)
+    assert imported(db, "p") == imported(db, "s")
+    assert db["contacts"].find_one({"user_id": "p", "name": "Contact 150"})["notes"] == "line one of 150\nline two"
@@ -0,0 +1,70 @@
+"""
+Lazy mock cursors and counts: sorted pages, count_documents and distinct against a full scan
+"""
+import pytest
+
+from benchmarks.data import make_contacts
+from indexes import INDEX_SPECS
+from mock_db import MockCollection
+
+
+def indexed_contacts(docs):
+    collection = MockCollection("contacts", docs)
+    for spec in INDEX_SPECS["contacts"]:
+        collection.create_index(spec["keys"], **{k: v for k, v in spec.items() if k != "keys"})
+    return collection
+
+
+@pytest.fixture(scope="module")
+def contacts():
+    return make_contacts(2000)
+
+
+@pytest.mark.parametrize("sort, skip, limit", [
+    ([("createdAt", -1)], 0, 50),      # heap top-k, unindexed sort field
+    ([("createdAt", 1)], 30, 20),
+    ([("name", 1), ("id", 1)], 100, 50),
+    ([("lastMessageTime", -1), ("id", -1)], 0, 0),
+])
+def test_sorted_pages_match_a_full_sort(contacts, sort, skip, limit):
+    collection = indexed_contacts(contacts)
+    query = {"user_id": "user_2"}
+    expected = [doc for doc in contacts if doc["user_id"] == "user_2"]
+    for field, direction in reversed(sort):
+        expected.sort(key=lambda doc: doc[field], reverse=direction == -1)
+    expected = expected[skip:skip + limit] if limit else expected[skip:]
+    cursor = collection.find(query).sort(sort).skip(skip)
+    if limit:
+        cursor = cursor.limit(limit)
+    assert [doc["id"] for doc in cursor] == [doc["id"] for doc in expected]
+
+
+def test_cursor_is_lazy(contacts):
+    collection = indexed_contacts(contacts)
+    cursor = collection.find({"user_id": "user_2"}).sort("createdAt", -1).limit(5)
+    # Inserted before iteration starts, so the cursor sees it
+    collection.insert_one({"id": "newest", "user_id": "user_2", "createdAt": "9999"})
+    assert next(iter(cursor))["id"] == "newest"
+
+
+def test_count_documents(contacts):
+    collection = indexed_contacts(contacts)
+    assert collection.count_documents({}) == collection.estimated_document_count() == 2000
+    assert collection.count_documents({"user_id": "user_0"}) == 200
+    assert collection.count_documents({"user_id": "user_0"}, limit=10) == 10
+    assert collection.count_documents({"user_id": "user_0"}, skip=195) == 5
+    assert collection.count_documents({"user_id": "user_0", "status": "Active"}) == sum(
+        doc["user_id"] == "user_0" and doc["status"] == "Active" for doc in contacts
+    )
+
+
+def test_distinct(contacts):
+    collection = indexed_contacts(contacts)
+    assert sorted(collection.distinct("user_id")) == sorted({doc["user_id"] for doc in contacts})
+    # Filtered and unwound across array fields
+    expected = {tag for doc in contacts if doc["user_id"] == "user_4" for tag in doc["tags"]}
+    assert sorted(collection.distinct("tags", {"user_id": "user_4"})) == sorted(expected)
+    # Documents missing the field are skipped
+    collection = MockCollection("things", [{"a": 1}, {"a": None}, {"b": 2}])
+    collection.create_index([("a", 1)])
+    assert sorted(collection.distinct("a"), key=str) == [1, None]
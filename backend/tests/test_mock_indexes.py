@@ -0,0 +1,71 @@
+"""
+MockCollection secondary indexes: same results as a scan, kept up to date by writes
+"""
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from benchmarks.data import make_contacts
+from indexes import INDEX_SPECS
+from mock_db import MockCollection
+
+
+def indexed(docs):
+    collection = MockCollection("contacts", docs)
+    for spec in INDEX_SPECS["contacts"]:
+        collection.create_index(spec["keys"], **{k: v for k, v in spec.items() if k != "keys"})
+    return collection
+
+
+def ids(cursor):
+    return sorted(doc["id"] for doc in cursor)
+
+
+@pytest.fixture(scope="module")
+def contacts():
+    return make_contacts(2000)
+
+
+@pytest.mark.parametrize("query", [
+    {"user_id": "user_3"},
+    {"id": "17", "user_id": "user_6"},
+    {"id": {"$in": ["1", "2", "3", "nope"]}},
+    {"user_id": "user_3", "status": "Active"},
+    {"user_id": {"$in": ["user_1", "user_2"]}, "tags": "VIP"},
+    {"user_id": "nobody"},
+])
+def test_indexed_lookups_match_a_scan(contacts, query):
+    assert ids(indexed(contacts).find(query)) == ids(MockCollection("contacts", contacts).find(query))
+
+
+def test_indexes_follow_updates_and_deletes():
+    collection = indexed([{"id": str(i), "user_id": "a", "tags": ["x"]} for i in range(10)])
+    collection.update_many({"id": {"$in": ["1", "2"]}}, {"$set": {"user_id": "b", "tags": ["y", "z"]}})
+    collection.delete_one({"id": "3"})
+    assert ids(collection.find({"user_id": "b"})) == ["1", "2"]
+    assert ids(collection.find({"user_id": "a"})) == ["0", "4", "5", "6", "7", "8", "9"]
+    # Arrays are indexed per element
+    assert ids(collection.find({"tags": "z"})) == ["1", "2"]
+    assert ids(collection.find({"tags": "x"})) == ["0", "4", "5", "6", "7", "8", "9"]
+
+def test_sorted_scans_follow_writes():
+    collection = indexed([{"id": str(i), "user_id": "a", "name": f"n{i:04d}"}
+                          for i in range(MockCollection.SORTED_INDEX_MIN_SIZE)])
+    first = [doc["id"] for doc in collection.find({}).sort("name", 1).limit(3)]
+    collection.insert_one({"id": "new", "user_id": "a", "name": "a first"})
+    collection.delete_one({"id": first[0]})
+    assert [doc["id"] for doc in collection.find({}).sort("name", 1).limit(3)] == ["new", *first[1:]]
+
+
+def test_unique_index():
+    collection = MockCollection("users", [])
+    collection.create_index([("id", 1)], unique=True)
+    collection.insert_one({"id": "1"})
+    with pytest.raises(DuplicateKeyError):
+        collection.insert_one({"id": "1"})
+    collection.insert_one({"id": "2"})
+    with pytest.raises(DuplicateKeyError):
+        collection.update_one({"id": "2"}, {"$set": {"id": "1"}})
+    assert ids(collection.find({})) == ["1", "2"]
+    # Existing duplicates refuse the index
+    with pytest.raises(DuplicateKeyError):
+        MockCollection("users", [{"id": "1"}, {"id": "1"}]).create_index([("id", 1)], unique=True)
@@ -0,0 +1,56 @@
+"""
+Mock query compiler: compiled predicates against the legacy per-document loop
+"""
+import pytest
+
+from benchmarks.bench_mock_query import legacy_find, search_query
+from benchmarks.data import make_contacts
+from mock_db import MockCollection
+from mock_query import compile_query, compile_regex
+
+
+@pytest.fixture(scope="module")
+def contacts():
+    return make_contacts(2000)
+
+
+def matching_ids(docs, query):
+    matches = compile_query(query)
+    return [doc["id"] for doc in docs if matches(doc)]
+
+
+@pytest.mark.parametrize("query", [
+    {"user_id": "user_3"},
+    {"user_id": "user_3", "status": "Active"},
+    {"status": "Blocked"},
+    search_query("garcia", "user_3"),
+    search_query(r"\(555\) 00", "user_1"),
+    {"name": {"$regex": "^sarah", "$options": "i"}},
+])
+def test_compiled_queries_match_the_legacy_loop(contacts, query):
+    expected = [doc["id"] for doc in legacy_find(contacts, query)]
+    assert matching_ids(contacts, query) == expected
+    # MockCollection.find goes through the same predicates
+    assert [doc["id"] for doc in MockCollection("contacts", contacts).find(query)] == expected
+
+
+@pytest.mark.parametrize("query, matches", [
+    ({"tags": "VIP"}, lambda doc: "VIP" in doc["tags"]),
+    ({"tags": {"$in": ["VIP", "New"]}}, lambda doc: {"VIP", "New"} & set(doc["tags"])),
+    ({"status": {"$ne": "Active"}}, lambda doc: doc["status"] != "Active"),
+    ({"status": {"$nin": ["Active", "Blocked"]}}, lambda doc: doc["status"] == "Inactive"),
+    ({"createdAt": {"$gte": "2000", "$lt": "9999"}}, lambda doc: True),
+    ({"missing": None}, lambda doc: True),
+    ({"missing": {"$exists": True}}, lambda doc: False),
+    ({"$or": [{"status": "Blocked"}, {"tags": "VIP"}]}, lambda doc: doc["status"] == "Blocked" or "VIP" in doc["tags"]),
+    ({"$and": [{"status": "Active"}, {"tags": {"$ne": "VIP"}}]},
+     lambda doc: doc["status"] == "Active" and "VIP" not in doc["tags"]),
+])
+def test_operators(contacts, query, matches):
+    assert matching_ids(contacts, query) == [doc["id"] for doc in contacts if matches(doc)]
+
+
+def test_regexes_are_compiled_once():
+    assert compile_regex("garcia", "i") is compile_regex("garcia", "i")
+    assert compile_query({"name": {"$regex": "GARCIA", "$options": "i"}})({"name": "Maria Garcia"})
+    assert not compile_query({"name": {"$regex": "GARCIA"}})({"name": "Maria Garcia"})
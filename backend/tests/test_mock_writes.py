@@ -0,0 +1,66 @@
+"""
+Mock bulk writes and update operators: pymongo's errors and result shapes
+"""
+import pytest
+from pymongo import DeleteOne, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, WriteError
+
+
+def test_inc_and_add_to_set(db):
+    db["things"].insert_one({"id": "1", "n": 1, "tags": ["a"]})
+    db["things"].update_one({"id": "1"}, {"$inc": {"n": 2, "m": 1}, "$addToSet": {"tags": {"$each": ["a", "b"]}}})
+    assert db["things"].find_one({"id": "1"}, {"_id": 0}) == {"id": "1", "n": 3, "m": 1, "tags": ["a", "b"]}
+
+
+def test_inc_type_errors(db):
+    db["things"].insert_one({"id": "1", "name": "x"})
+    with pytest.raises(WriteError) as error:
+        db["things"].update_one({"id": "1"}, {"$inc": {"name": 1}})
+    assert error.value.code == 14
+    with pytest.raises(WriteError) as error:
+        db["things"].update_one({"id": "1"}, {"$inc": {"n": "1"}})
+    assert error.value.code == 14
+    # The failed update left the document alone
+    assert db["things"].find_one({"id": "1"}, {"_id": 0}) == {"id": "1", "name": "x"}
+
+
+def test_add_to_set_on_a_non_array(db):
+    db["things"].insert_one({"id": "1", "tags": "VIP"})
+    with pytest.raises(WriteError) as error:
+        db["things"].update_one({"id": "1"}, {"$addToSet": {"tags": "New"}})
+    assert error.value.code == 2
+
+
+def test_insert_many_duplicates_raise_bulk_write_error(db):
+    db["things"].create_index([("id", 1)], unique=True)
+    db["things"].insert_one({"id": "2"})
+    with pytest.raises(BulkWriteError) as error:
+        db["things"].insert_many([{"id": "1"}, {"id": "2"}, {"id": "3"}], ordered=False)
+    details = error.value.details
+    assert details["nInserted"] == 2
+    assert [(e["index"], e["code"]) for e in details["writeErrors"]] == [(1, 11000)]
+    assert details["writeErrors"][0]["op"]["id"] == "2"
+
+    # Ordered inserts stop at the first error
+    with pytest.raises(BulkWriteError) as error:
+        db["things"].insert_many([{"id": "4"}, {"id": "1"}, {"id": "5"}])
+    assert error.value.details["nInserted"] == 1
+    assert db["things"].count_documents({"id": "5"}) == 0
+
+
+def test_bulk_write_error_shape(db):
+    db["things"].create_index([("id", 1)], unique=True)
+    db["things"].insert_one({"id": "1", "name": "x"})
+    requests = [
+        InsertOne({"id": "2"}),
+        UpdateOne({"id": "1"}, {"$inc": {"name": 1}}),
+        InsertOne({"id": "1"}),
+        DeleteOne({"id": "2"}),
+    ]
+    with pytest.raises(BulkWriteError) as error:
+        db["things"].bulk_write(requests, ordered=False)
+    details = error.value.details
+    assert [(e["index"], e["code"]) for e in details["writeErrors"]] == [(1, 14), (2, 11000)]
+    assert (details["nInserted"], details["nRemoved"]) == (1, 1)
+    assert set(details) >= {"writeErrors", "writeConcernErrors", "nInserted", "nUpserted",
+                            "nMatched", "nModified", "nRemoved", "upserted"}
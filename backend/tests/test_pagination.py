@@ -0,0 +1,79 @@
+"""
+Keyset pagination: cursors and pages over ties and missing sort values
+"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import repositories
+from pagination import decode_cursor, encode_cursor
+
+
+def all_pages(sort_field, direction, limit):
+    async def walk():
+        ids, cursor = [], ""
+        while cursor is not None:
+            page, cursor = await repositories.contacts.keyset_page(
+                {"user_id": "u"}, sort_field, direction, limit, cursor=cursor or None
+            )
+            assert len(page) <= limit
+            ids += [doc["id"] for doc in page]
+        return ids
+    return asyncio.run(walk())
+
+
+@pytest.fixture
+def contacts(db):
+    docs = []
+    for i in range(47):
+        doc = {"id": f"{i:03d}", "user_id": "u", "name": ["Ann", "Bob", "Cy"][i % 3], "createdAt": f"2024-01-{i % 5 + 1:02d}"}
+        # Missing and null sort values sort before everything else
+        if i % 11 == 0:
+            del doc["createdAt"]
+        elif i % 13 == 0:
+            doc["createdAt"] = None
+        docs.append(doc)
+    db["contacts"].insert_many([dict(doc) for doc in docs])
+    db["contacts"].insert_one({"id": "other", "user_id": "v", "name": "Ann"})
+    return docs
+
+
+@pytest.mark.parametrize("sort_field", ["name", "createdAt"])
+@pytest.mark.parametrize("direction", [1, -1])
+@pytest.mark.parametrize("limit", [1, 4, 10, 100])
+def test_pages_cover_every_row_once(contacts, sort_field, direction, limit):
+    expected = sorted(
+        contacts,
+        key=lambda doc: ((doc.get(sort_field) is not None, doc.get(sort_field) or ""), doc["id"]),
+        reverse=direction == -1,
+    )
+    ids = all_pages(sort_field, direction, limit)
+    assert len(ids) == len(set(ids))
+    assert ids == [doc["id"] for doc in expected]
+
+
+def test_hidden_sort_field_is_dropped(contacts):
+    async def first_page():
+        return await repositories.contacts.keyset_page({"user_id": "u"}, "createdAt", 1, 5, fields=["name"])
+    page, cursor = asyncio.run(first_page())
+    assert all(set(doc) == {"id", "name"} for doc in page)
+    assert decode_cursor(cursor, "createdAt", 1)["id"] == page[-1]["id"]
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("name", -1, {"id": "7", "name": "Émile"})
+    assert decode_cursor(cursor, "name", -1) == {"s": "name", "d": -1, "v": "Émile", "id": "7"}
+
+
+@pytest.mark.parametrize("cursor", ["", "not-base64!", "e30", encode_cursor("createdAt", 1, {"id": "1"})])
+def test_bad_cursors_are_refused(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, "name", 1)
+    assert error.value.status_code == 400
+
+
+def test_unsupported_sort_is_refused(db):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(repositories.contacts.keyset_page({"user_id": "u"}, "email", 1, 10))
+    assert error.value.status_code == 400
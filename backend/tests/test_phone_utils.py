@@ -0,0 +1,76 @@
+"""
+E.164 phone keys: normalize_phone and the startup backfill
+"""
+import asyncio
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from phone_utils import BACKFILL_MARKER, MIGRATIONS_COLLECTION, backfill_all, backfill_phone_keys, normalize_phone
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("+1 (555) 123-4567", "+15551234567"),
+    ("15551234567", "+15551234567"),           # WhatsApp `from`: digits with the country code
+    ("0044 20 7946 0958", "+442079460958"),     # "00" international prefix
+    ("+44 (0)20 7946 0958", "+4402079460958"),  # only the length is checked
+    ("555-123-4567 ext. 12", "+15551234567"),
+    ("555 123 4567 x12", "+15551234567"),
+    (5551234567, "+15551234567"),
+])
+def test_normalize_phone(raw, expected):
+    assert normalize_phone(raw) == expected
+
+
+def test_default_country_code():
+    assert normalize_phone("(555) 123-4567") == "+15551234567"
+    assert normalize_phone("(555) 123-4567", country_code="44") == "+445551234567"
+    # A trunk "0" is replaced by the country code
+    assert normalize_phone("020 7946 0958", country_code="44") == "+442079460958"
+
+
+@pytest.mark.parametrize("raw", [None, "", "911", "12345", "+1 911", "not a phone", "+1234567890123456", "+0123456789"])
+def test_short_codes_and_junk_have_no_key(raw):
+    assert normalize_phone(raw) is None
+
+
+def test_backfill_leaves_duplicates_null(db):
+    db["contacts"].insert_many([
+        {"id": "1", "user_id": "u", "phone": "+1 555 123 4567"},
+        {"id": "2", "user_id": "u", "phone": "(555) 123-4567"},   # same number, same user
+        {"id": "3", "user_id": "v", "phone": "555.123.4567"},     # another user may have it
+        {"id": "4", "user_id": "u", "phone": "911"},
+        {"id": "5", "user_id": "u", "phone": "+44 20 7946 0958", "phoneE164": "+442079460958"},
+    ])
+    stats = asyncio.run(backfill_phone_keys("contacts", batch_size=2))
+    assert stats == {"updated": 2, "invalid": 1, "duplicates": 1}
+    keys = {doc["id"]: doc["phoneE164"] for doc in db["contacts"].find({}, {"_id": 0})}
+    assert keys == {"1": "+15551234567", "2": None, "3": "+15551234567", "4": None, "5": "+442079460958"}
+    # Nothing left to scan
+    assert asyncio.run(backfill_phone_keys("contacts")) == {"updated": 0, "invalid": 0, "duplicates": 0}
+
+
+def test_backfill_all_writes_the_marker(db):
+    db["messages"].insert_one({"id": "m1", "phoneNumber": "15551234567"})
+    asyncio.run(backfill_all())
+    assert db["messages"].find_one({"id": "m1"})["phoneE164"] == "+15551234567"
+    assert db[MIGRATIONS_COLLECTION].find_one({"id": BACKFILL_MARKER})["completedAt"]
+
+    # Later startups skip the scan; force runs it anyway
+    db["messages"].insert_one({"id": "m2", "phoneNumber": "15550000000"})
+    asyncio.run(backfill_all())
+    assert "phoneE164" not in db["messages"].find_one({"id": "m2"})
+    asyncio.run(backfill_all(force=True))
+    assert db["messages"].find_one({"id": "m2"})["phoneE164"] == "+15550000000"
+
+
+def test_partial_unique_index(db):
+    db["things"].create_index([("user_id", 1), ("key", 1)], unique=True,
+                              partialFilterExpression={"key": {"$type": "string"}})
+    db["things"].insert_one({"user_id": "u", "key": "a"})
+    db["things"].insert_one({"user_id": "v", "key": "a"})
+    # Left out of the partial index
+    db["things"].insert_one({"user_id": "u", "key": None})
+    db["things"].insert_one({"user_id": "u", "key": None})
+    with pytest.raises(DuplicateKeyError):
+        db["things"].insert_one({"user_id": "u", "key": "a"})
@@ -0,0 +1,65 @@
+"""
+Contact search tokens and ranking
+"""
+import asyncio
+
+import pytest
+
+import search_index
+from search_index import phone_tokens, search, tokens_for
+
+
+def test_name_and_email_tokens():
+    tokens = tokens_for({"name": "Sarah  JOHNSON", "email": "S.J@x.io", "phone": ""})
+    assert {"n:s", "n:sarah j", "n:sarah johnson", "w:jo", "w:johnson", "e:s.j@"} <= set(tokens)
+    assert "w:ohn" not in tokens
+    assert not any(token.startswith("p:") for token in tokens)
+
+
+@pytest.mark.parametrize("phone", ["+1 (555) 123-4567", "15551234567", "555.123.4567"])
+@pytest.mark.parametrize("query", ["15551234567", "5551234567", "555", "5551234", "4567", "234567"])
+def test_phone_matches_from_group_starts_and_the_end(phone, query):
+    assert query in phone_tokens(phone)
+
+
+def test_phone_tokens_skip_middle_runs():
+    tokens = phone_tokens("+1 (555) 123-4567")
+    assert "5512" not in tokens
+    assert "345" not in tokens
+    assert len(tokens) < 40
+    assert not phone_tokens("12") and not phone_tokens(None)
+
+
+@pytest.fixture
+def indexed(db):
+    contacts = [
+        {"id": "1", "user_id": "u", "name": "Sam Lee", "email": "sam@x.io", "phone": "+1 555 000 0001"},
+        {"id": "2", "user_id": "u", "name": "Ann Samson", "email": "ann@x.io", "phone": "+1 555 000 0002"},
+        {"id": "3", "user_id": "u", "name": "Bob", "email": "samuel@x.io", "phone": "+1 555 000 0003"},
+        {"id": "4", "user_id": "u", "name": "Abe Samuels", "email": "abe@x.io", "phone": "+1 555 000 0004"},
+        {"id": "5", "user_id": "v", "name": "Sam Other", "email": "sam@y.io", "phone": "+1 555 000 0005"},
+    ]
+    db["contacts"].insert_many(contacts)
+    asyncio.run(search_index.index_contacts(contacts, new=True))
+    return contacts
+
+
+def test_tiers_rank_name_then_words_then_email(indexed):
+    # Full name prefix, then word prefixes by name, then email; each id once
+    assert asyncio.run(search("u", "sam")) == (["1", "4", "2", "3"], False)
+
+
+def test_phone_like_queries_rank_phone_matches_first(indexed):
+    assert asyncio.run(search("u", "0003")) == (["3"], False)
+    assert asyncio.run(search("u", "(555) 000"))[0] == ["4", "2", "3", "1"]
+
+
+def test_search_is_tenant_scoped_and_reports_truncation(indexed):
+    assert asyncio.run(search("v", "sam")) == (["5"], False)
+    assert asyncio.run(search("u", "sam", limit=2)) == (["1", "4"], True)
+    assert asyncio.run(search("u", "sam", limit=4)) == (["1", "4", "2", "3"], False)
+
+
+def test_unindex(indexed):
+    asyncio.run(search_index.unindex_contacts(["1"], "u"))
+    assert asyncio.run(search("u", "sam"))[0] == ["4", "2", "3"]
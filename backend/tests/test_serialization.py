@@ -0,0 +1,95 @@
+"""
+BSONJSONRoute/BSONJSONResponse against the old mongo_to_dict + jsonable_encoder output
+"""
+import json
+import uuid
+from datetime import datetime, timezone
+
+from bson import Decimal128, ObjectId
+from fastapi import APIRouter, FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from benchmarks.bench_serialization import legacy_mongo_to_dict, strip_id
+from serialization import BSONJSONResponse, BSONJSONRoute, dumps
+
+DOC = {
+    "_id": ObjectId(),
+    "id": "c1",
+    "owner": ObjectId(),
+    "createdAt": datetime(2024, 5, 1, 12, 30, 15, 123456),
+    "sentAt": datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc),
+    "tags": ["VIP", ObjectId()],
+    "profile": {"_id": ObjectId(), "seen": datetime(2023, 1, 2), "links": [{"_id": ObjectId(), "ref": ObjectId()}]},
+    "count": 3,
+    "score": 1.5,
+    "missing": None,
+}
+
+
+class Item(BaseModel):
+    name: str
+
+
+def legacy(content):
+    return json.loads(JSONResponse(jsonable_encoder(legacy_mongo_to_dict(content))).body)
+
+
+def app():
+    app = FastAPI(default_response_class=BSONJSONResponse)
+    app.router.route_class = BSONJSONRoute
+    router = APIRouter(route_class=BSONJSONRoute)
+
+    @router.get("/doc")
+    async def doc():
+        return strip_id(DOC)
+
+    @router.get("/list")
+    async def listing():
+        return strip_id([DOC, DOC])
+
+    @router.post("/created", status_code=201)
+    async def created():
+        return {"id": ObjectId("65f000000000000000000000")}
+
+    @router.get("/validated", response_model=Item)
+    async def validated():
+        return {"name": "x", "dropped": True}
+
+    @router.get("/sync")
+    def sync():
+        return {"when": datetime(2024, 1, 1)}
+
+    @router.get("/text")
+    async def text():
+        return PlainTextResponse("ok")
+
+    app.include_router(router)
+    return TestClient(app)
+
+
+def test_documents_encode_like_jsonable_encoder():
+    client = app()
+    assert client.get("/doc").json() == legacy(DOC)
+    assert client.get("/list").json() == legacy([DOC, DOC])
+
+
+def test_bson_values():
+    oid = ObjectId()
+    assert json.loads(dumps({"a": oid, "b": Decimal128("1.10"), "c": {1, 2} - {2}, "d": (1,)})) == {
+        "a": str(oid), "b": "1.10", "c": [1], "d": [1],
+    }
+    value = uuid.uuid4()
+    assert json.loads(dumps({"u": value, 1: Item(name="x")})) == {"u": str(value), "1": {"name": "x"}}
+
+
+def test_routes_keep_status_codes_and_fastapi_paths():
+    client = app()
+    response = client.post("/created")
+    assert response.status_code == 201 and response.json() == {"id": "65f000000000000000000000"}
+    # response_model and sync handlers still go through FastAPI's validation/encoding
+    assert client.get("/validated").json() == {"name": "x"}
+    assert client.get("/sync").json() == {"when": "2024-01-01T00:00:00"}
+    assert client.get("/text").text == "ok"